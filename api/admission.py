@@ -0,0 +1,300 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, List, Optional
+
+from agents import Model, ModelProvider, ModelResponse
+
+from api.metrics import Histogram
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Overloaded(Exception):
+    """
+    A request was shed instead of run: 429 when the wait queue is full (slow down),
+    503 when it could not start within its deadline. `retry_after` is in seconds.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Caps the agent runs in flight in this worker at `max_concurrency`.
+
+    Further requests wait in a FIFO queue of at most `max_queue` entries for at most
+    `max_wait` seconds. Requests are shed early instead of queueing when:
+
+    - the queue is full (429);
+    - the expected wait, from the queue position and the recent average run time, is
+      already past the deadline (503).
+
+    A request still queued when its deadline passes is dropped with 503. Retry-After is the
+    time the current queue should take to drain.
+    """
+
+    def __init__(self, max_concurrency: int = 32, max_queue: int = 64, max_wait: float = 15.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.timed_out = 0
+        self.run_seconds = 0.0  # moving average of admitted run durations
+        self.wait_seconds = Histogram("shoe_store_admission_wait_seconds", "Time a request waited for an agent run slot",
+                                      WAIT_BUCKETS)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _expected_wait(self, position: int) -> float:
+        return math.ceil(position / self.max_concurrency) * self.run_seconds
+
+    def check(self):
+        """Raises Overloaded if a request arriving now would be shed; admits nothing."""
+        if self.in_flight < self.max_concurrency and not self.queued:
+            return
+        if self.queued >= self.max_queue:
+            self.rejected_full += 1
+            raise Overloaded(429, "Too many requests waiting for the assistant, please retry shortly",
+                             self._expected_wait(self.queued + 1))
+        expected = self._expected_wait(self.queued + 1)
+        if expected > self.max_wait:
+            self.rejected_deadline += 1
+            raise Overloaded(503, "The assistant is busy, please retry shortly", expected)
+
+    def _release(self):
+        # Hand the slot straight to the next live waiter, so it can't be taken by a newcomer
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _acquire(self):
+        self.check()
+        if self.in_flight < self.max_concurrency and not self.queued:
+            self.in_flight += 1
+            self.wait_seconds.observe((), 0.0)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise Overloaded(503, "The assistant is busy, please retry shortly", self._expected_wait(self.queued))
+        except BaseException:
+            # Cancelled (client went away) after the slot was already handed over: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            self.queued -= 1
+        self.wait_seconds.observe((), time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Holds an agent run slot for the duration of the block, waiting or shedding as configured."""
+        await self._acquire()
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.run_seconds = elapsed if not self.run_seconds else 0.9 * self.run_seconds + 0.1 * elapsed
+            self._release()
+
+    def stats(self) -> dict:
+        counts, total = self.wait_seconds.values.get((), ([0], 0.0))
+        waits = sum(counts)
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "timed_out": self.timed_out,
+            "average_wait_seconds": total / waits if waits else 0.0,
+            "average_run_seconds": self.run_seconds,
+        }
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP shoe_store_admission_in_flight Agent runs in progress",
+            "# TYPE shoe_store_admission_in_flight gauge",
+            f"shoe_store_admission_in_flight {self.in_flight}",
+            "# HELP shoe_store_admission_queued Requests waiting for an agent run slot",
+            "# TYPE shoe_store_admission_queued gauge",
+            f"shoe_store_admission_queued {self.queued}",
+            "# HELP shoe_store_admission_rejected_total Requests shed by admission control",
+            "# TYPE shoe_store_admission_rejected_total counter",
+        ]
+        for reason, count in (("queue_full", self.rejected_full), ("deadline", self.rejected_deadline),
+                              ("timed_out", self.timed_out)):
+            lines.append(f'shoe_store_admission_rejected_total{{reason="{reason}"}} {count}')
+        return lines + self.wait_seconds.render()
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` per second up to `capacity`. Waiters are served in order;
+    `debit` may drive the balance negative (tokens known only after a call), which makes
+    the next callers wait until it has been paid back.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Takes `amount` tokens, waiting for them if needed; returns the seconds waited."""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return time.monotonic() - start
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def debit(self, amount: float):
+        self._refill()
+        self._tokens -= amount
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class ModelPacer:
+    """
+    Paces model calls across the worker under a requests-per-minute and a tokens-per-minute
+    budget. A call waits for a request token and for the token balance to be non-negative;
+    its actual usage is debited once the response is in.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        # One second's worth of burst, so a quiet worker can't fire a minute of calls at once
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60)) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60) if tokens_per_minute else None
+        self.calls = 0
+        self.paced_calls = 0
+        self.pacing_seconds = 0.0
+        self._wrapped: Optional[tuple] = None
+
+    async def before_call(self):
+        waited = 0.0
+        if self.requests:
+            waited += await self.requests.acquire(1)
+        if self.tokens:
+            waited += await self.tokens.acquire(0)
+        self.calls += 1
+        if waited > 0.001:
+            self.paced_calls += 1
+            self.pacing_seconds += waited
+
+    def after_call(self, total_tokens: int):
+        if self.tokens and total_tokens:
+            self.tokens.debit(total_tokens)
+
+    def wrap(self, provider: ModelProvider) -> ModelProvider:
+        """The provider with paced models; reused while the same provider is passed in."""
+        if self._wrapped is None or self._wrapped[0] is not provider:
+            self._wrapped = (provider, PacedModelProvider(provider, self))
+        return self._wrapped[1]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "paced_calls": self.paced_calls,
+            "pacing_seconds": self.pacing_seconds,
+            "request_tokens": self.requests.tokens if self.requests else None,
+            "token_balance": self.tokens.tokens if self.tokens else None,
+        }
+
+
+class PacedModel(Model):
+    def __init__(self, model: Model, pacer: ModelPacer):
+        self.model = model
+        self.pacer = pacer
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        await self.pacer.before_call()
+        response = await self.model.get_response(*args, **kwargs)
+        self.pacer.after_call(response.usage.total_tokens)
+        return response
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+        await self.pacer.before_call()
+        async for event in self.model.stream_response(*args, **kwargs):
+            if event.type == "response.completed" and event.response.usage:
+                self.pacer.after_call(event.response.usage.total_tokens)
+            yield event
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self):
+        await self.model.close()
+
+
+class PacedModelProvider(ModelProvider):
+    def __init__(self, provider: ModelProvider, pacer: ModelPacer):
+        self.provider = provider
+        self.pacer = pacer
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return PacedModel(self.provider.get_model(model_name), self.pacer)
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+def admission_from_env() -> Optional[AdmissionController]:
+    """
+    An AdmissionController when ADMISSION_MAX_CONCURRENCY is set (in-flight agent runs per
+    worker), with ADMISSION_MAX_QUEUE waiting requests and ADMISSION_MAX_WAIT seconds.
+    """
+    max_concurrency = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0"))
+    if max_concurrency <= 0:
+        return None
+    return AdmissionController(
+        max_concurrency,
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+        max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "15")),
+    )
+
+
+def model_pacer_from_env() -> Optional[ModelPacer]:
+    """A ModelPacer when MODEL_RPM and/or MODEL_TPM (per-worker budgets per minute) are set."""
+    rpm = float(os.getenv("MODEL_RPM", "0"))
+    tpm = float(os.getenv("MODEL_TPM", "0"))
+    if rpm <= 0 and tpm <= 0:
+        return None
+    return ModelPacer(rpm or None, tpm or None)
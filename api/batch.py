@@ -0,0 +1,190 @@
+"""
+Bulk replay of customer messages through the chat pipeline.
+
+Input is JSONL, one object per line with a `user_id`, an optional `email` and either a
+`message` or a list of `messages` (optionally a `request_id`):
+
+    {"user_id": "u1", "email": "u1@example.com", "message": "What shoes do you sell?"}
+    {"user_id": "u1", "email": "u1@example.com", "messages": ["Add 2 medium running shoes", "Checkout please"]}
+    {"user_id": "u2", "message": "Where is my order ORD1003?"}
+
+Lines with the same user_id and email form one session, whose turns run in file order;
+different sessions run concurrently. Results come back as JSONL in completion order.
+
+    python -m api.batch history.jsonl --url http://localhost:8000 --concurrency 8 --rate 5 > results.jsonl
+    python -m api.batch history.jsonl --local --concurrency 8     # in-process, no server needed
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class BatchTurn:
+    line: int
+    message: str
+    request_id: Optional[str] = None
+
+
+@dataclass
+class BatchSession:
+    user_id: str
+    email: Optional[str]
+    turns: List[BatchTurn] = field(default_factory=list)
+
+
+def parse_batch(lines: Iterable[str]) -> List[BatchSession]:
+    """Groups JSONL lines into sessions by (user_id, email), keeping turns in file order."""
+    sessions: Dict[Tuple[str, Optional[str]], BatchSession] = {}
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e.msg})")
+        if not isinstance(entry, dict) or not isinstance(entry.get("user_id"), str):
+            raise ValueError(f"line {number}: expected an object with a user_id")
+        messages = entry.get("messages", [entry["message"]] if "message" in entry else None)
+        if not messages or not all(isinstance(message, str) for message in messages):
+            raise ValueError(f"line {number}: expected a message or a list of messages")
+
+        key = (entry["user_id"], entry.get("email"))
+        session = sessions.setdefault(key, BatchSession(*key))
+        request_id = entry.get("request_id")
+        for index, message in enumerate(messages):
+            turn_id = request_id if request_id is None or len(messages) == 1 else f"{request_id}-{index}"
+            session.turns.append(BatchTurn(number, message, turn_id))
+    return list(sessions.values())
+
+
+class RateLimiter:
+    """Spaces calls to `wait` at least 1/rate seconds apart; a rate of 0 means unlimited."""
+
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def run_batch(sessions: List[BatchSession],
+                    run_turn: Callable[[BatchSession, BatchTurn], Awaitable[str]],
+                    concurrency: int = 4, rate: float = 0.0,
+                    end_session: Optional[Callable[[BatchSession], Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs every session's turns in order, at most `concurrency` turns at a time and at most
+    `rate` turn starts per second, yielding one result per turn as it completes. A failed
+    turn is reported with an `error` and the session carries on with its next turn.
+    Closing the iterator early cancels whatever is still running.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    async def run_session(session: BatchSession):
+        for index, turn in enumerate(session.turns):
+            result = {"line": turn.line, "user_id": session.user_id, "email": session.email, "turn": index,
+                      "message": turn.message}
+            async with semaphore:
+                await limiter.wait()
+                start = time.perf_counter()
+                try:
+                    result["response"] = await run_turn(session, turn)
+                except Exception as e:
+                    result["error"] = str(e) or type(e).__name__
+                result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            result["request_id"] = turn.request_id
+            await results.put(result)
+        if end_session is not None:
+            end_session(session)
+
+    tasks = [asyncio.create_task(run_session(session)) for session in sessions]
+    try:
+        for _ in range(sum(len(session.turns) for session in sessions)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _post_batch(path: str, url: str, params: dict, out) -> Dict[str, int]:
+    import httpx
+
+    with open(path, "rb") as f:
+        body = f.read()
+    counts = {"turns": 0, "errors": 0}
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        async with client.stream("POST", "/chat/batch", content=body, params=params,
+                                 headers={"Content-Type": "application/x-ndjson"}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise SystemExit(f"❌ {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if line:
+                    counts["turns"] += 1
+                    counts["errors"] += "error" in json.loads(line)
+                    out.write(line + "\n")
+                    out.flush()
+    return counts
+
+
+async def _run_local(path: str, params: dict, out) -> Dict[str, int]:
+    from api.main import batch_results, email_worker
+
+    with open(path) as f:
+        sessions = parse_batch(f)
+    counts = {"turns": 0, "errors": 0}
+    email_worker.start()
+    try:
+        async for result in batch_results(sessions, **params):
+            counts["turns"] += 1
+            counts["errors"] += "error" in result
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        await email_worker.stop()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL file of messages to replay")
+    parser.add_argument("--url", default="http://localhost:8000", help="API to send the batch to")
+    parser.add_argument("--local", action="store_true", help="Run the agent in this process instead of calling the API")
+    parser.add_argument("--concurrency", type=int, default=4, help="Turns in flight at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="Max turn starts per second (0 = unlimited)")
+    parser.add_argument("--shared", action="store_true",
+                        help="Use the real user ids' carts and histories instead of isolated replay sessions")
+    parser.add_argument("--output", "-o", help="Write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    params = {"concurrency": args.concurrency, "rate": args.rate, "isolate": not args.shared}
+    out = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        if args.local:
+            counts = asyncio.run(_run_local(args.path, params, out))
+        else:
+            counts = asyncio.run(_post_batch(args.path, args.url, params, out))
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"✅ {counts['turns']} turns in {elapsed:.1f}s ({counts['turns'] / elapsed if elapsed else 0:.1f}/s), "
+          f"{counts['errors']} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
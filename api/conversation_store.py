@@ -0,0 +1,453 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+TOOL_ITEM_TYPES = ("function_call", "function_call_output")
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def _item_size(item: Dict[str, Any]) -> int:
+    return len(json.dumps(item, default=str))
+
+
+def estimate_tokens(item: Dict[str, Any]) -> int:
+    """Rough token estimate for an input item (~4 characters per token)."""
+    return _item_size(item) // 4 + 1
+
+
+def _describe(item: Dict[str, Any], limit: int = 120) -> str:
+    """One short summary line for an item that is dropped from the history."""
+    if item.get("type") == "function_call_output":
+        text = f"tool result: {item.get('output')}"
+    elif item.get("type") == "function_call":
+        text = f"called {item.get('name')}"
+    else:
+        content = item.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        text = f"{item.get('role', 'item')}: {content}"
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _is_summary(item: Dict[str, Any]) -> bool:
+    return item.get("role") == "system" and str(item.get("content", "")).startswith(SUMMARY_PREFIX)
+
+
+def _with_summary(summary: List[str], messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if summary:
+        return [{"role": "system", "content": "\n".join([SUMMARY_PREFIX] + summary)}] + messages
+    return list(messages)
+
+
+def compact_history(messages: List[Dict[str, Any]], summary: List[str], token_budget: int,
+                    max_summary_lines: int = 20, target: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[str], int]:
+    """
+    Shrinks a history that is over the token budget down to `target` tokens (default: the
+    budget). Old tool calls and tool outputs are dropped first and then the oldest
+    messages; everything dropped is rolled into the summary lines.
+
+    A target below the budget leaves headroom, so the next few turns fit without another
+    compaction.
+
+    Returns the kept messages, the new summary lines and the number of dropped items.
+    """
+    sizes = [estimate_tokens(m) for m in messages]
+    total = sum(sizes)
+    if total <= token_budget:
+        return messages, summary, 0
+    token_budget = token_budget if target is None else min(target, token_budget)
+
+    keep = [True] * len(messages)
+    dropped = []
+
+    def drop(index: int):
+        nonlocal total
+        keep[index] = False
+        total -= sizes[index]
+        dropped.append(index)
+
+    # 1. Old tool calls and their outputs (never the current turn's last item)
+    call_ids = {}
+    for i, m in enumerate(messages[:-1]):
+        if m.get("type") in TOOL_ITEM_TYPES:
+            call_ids.setdefault(m.get("call_id"), []).append(i)
+    for indexes in call_ids.values():
+        if total <= token_budget:
+            break
+        for i in indexes:
+            drop(i)
+
+    # 2. Oldest messages, keeping at least the latest item
+    for i in range(len(messages) - 1):
+        if total <= token_budget:
+            break
+        if keep[i]:
+            drop(i)
+
+    # A tool output whose call was dropped (or the other way round) is rejected upstream
+    remaining_calls = {m.get("call_id") for i, m in enumerate(messages) if keep[i] and m.get("type") == "function_call"}
+    remaining_outputs = {m.get("call_id") for i, m in enumerate(messages) if keep[i] and m.get("type") == "function_call_output"}
+    for i, m in enumerate(messages):
+        if keep[i] and m.get("type") in TOOL_ITEM_TYPES and m.get("call_id") not in remaining_calls & remaining_outputs:
+            drop(i)
+
+    summary = summary + [_describe(messages[i]) for i in sorted(dropped) if messages[i].get("type") != "function_call"]
+    return [m for i, m in enumerate(messages) if keep[i]], summary[-max_summary_lines:], len(dropped)
+
+
+class ConversationBackend(ABC):
+    """
+    Storage for per-session conversation histories.
+
+    `get` returns the history to send with the next turn (with the running summary first, if any)
+    and `set` stores the full history returned by the run, i.e. what `get` returned plus the
+    items appended by the turn.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, messages: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.get(key))
+
+
+class _Session:
+    __slots__ = ("messages", "summary", "size", "last_access")
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self.summary: List[str] = []
+        self.size = 0
+        self.last_access = time.monotonic()
+
+
+class ConversationStore(ConversationBackend):
+    """
+    Bounded in-memory conversation history (the default backend).
+
+    Keeps at most `max_sessions` live sessions (least recently used are evicted first),
+    drops sessions idle for more than `idle_ttl` seconds, and keeps each session's history
+    under `token_budget` tokens using `compact_history`, trimming it to `compact_to` of the
+    budget whenever it goes over.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 3600, token_budget: int = 4000,
+                 max_summary_lines: int = 20, compact_to: float = 0.75):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.max_summary_lines = max_summary_lines
+        self.compact_to = compact_to
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+        self.compacted_items = 0
+        self.bytes_held = 0
+
+    def __contains__(self, key: str) -> bool:
+        return self._live_session(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _live_session(self, key: str) -> Optional[_Session]:
+        session = self._sessions.get(key)
+        if session is not None and time.monotonic() - session.last_access > self.idle_ttl:
+            self._drop(key)
+            self.ttl_evictions += 1
+            return None
+        return session
+
+    def _drop(self, key: str):
+        session = self._sessions.pop(key)
+        self.bytes_held -= session.size
+
+    def get(self, key: str) -> List[Dict[str, Any]]:
+        """Returns the session's history (summary first), or an empty list for a new session."""
+        session = self._live_session(key)
+        if session is None:
+            return []
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(key)
+        return _with_summary(session.summary, session.messages)
+
+    def set(self, key: str, messages: List[Dict[str, Any]]):
+        """Stores a session's full history, compacting it to the token budget."""
+        session = self._live_session(key) or _Session()
+        messages = [m for m in messages if not _is_summary(m)]
+        session.messages, session.summary, dropped = compact_history(
+            messages, session.summary, self.token_budget, self.max_summary_lines,
+            target=int(self.token_budget * self.compact_to))
+        self.compacted_items += dropped
+
+        self.bytes_held -= session.size
+        session.size = sum(_item_size(m) for m in session.messages) + sum(len(line) for line in session.summary)
+        self.bytes_held += session.size
+        session.last_access = time.monotonic()
+
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        self.evict_expired()
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)))
+            self.lru_evictions += 1
+
+    def delete(self, key: str):
+        if key in self._sessions:
+            self._drop(key)
+
+    def evict_expired(self):
+        """Drops every session idle for longer than the TTL (oldest sessions are at the front)."""
+        now = time.monotonic()
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.idle_ttl:
+                break
+            self._drop(key)
+            self.ttl_evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes_held": self.bytes_held,
+            "lru_evictions": self.lru_evictions,
+            "ttl_evictions": self.ttl_evictions,
+            "compacted_items": self.compacted_items,
+        }
+
+
+class SQLiteConversationStore(ConversationBackend):
+    """
+    Durable conversation history in a SQLite database in WAL mode.
+
+    Each turn only inserts the items it appended to the history; the session is rewritten
+    only when it goes over the token budget, and is then compacted to `compact_to` of it,
+    so the turns after a compaction are appends again. Idle and least recently used
+    sessions are evicted with the same limits as the in-memory store.
+    """
+
+    def __init__(self, path: str = "conversations.db", max_sessions: int = 1000, idle_ttl: float = 3600,
+                 token_budget: int = 4000, max_summary_lines: int = 20, compact_to: float = 0.75):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.max_summary_lines = max_summary_lines
+        self.compact_to = compact_to
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+        self.compacted_items = 0
+        self.rewrites = 0
+        self.items_written = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '[]',
+                item_count INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+            CREATE TABLE IF NOT EXISTS items (
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                PRIMARY KEY (key, seq)
+            ) WITHOUT ROWID;
+        """)
+
+    def _session(self, key: str):
+        row = self._db.execute(
+            "SELECT summary, item_count, size, last_access FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is not None and time.time() - row[3] > self.idle_ttl:
+            self._delete(key)
+            self.ttl_evictions += 1
+            return None
+        return row
+
+    def _delete(self, key: str):
+        self._db.execute("DELETE FROM items WHERE key = ?", (key,))
+        self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def get(self, key: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            row = self._session(key)
+            if row is None:
+                return []
+            self._db.execute("UPDATE sessions SET last_access = ? WHERE key = ?", (time.time(), key))
+            items = [json.loads(item) for (item,) in self._db.execute(
+                "SELECT item FROM items WHERE key = ? ORDER BY seq", (key,))]
+            return _with_summary(json.loads(row[0]), items)
+
+    def set(self, key: str, messages: List[Dict[str, Any]]):
+        messages = [m for m in messages if not _is_summary(m)]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._session(key)
+                summary, stored = (json.loads(row[0]), row[1]) if row else ([], 0)
+                kept, new_summary, dropped = compact_history(messages, summary, self.token_budget, self.max_summary_lines,
+                                                             target=int(self.token_budget * self.compact_to))
+
+                if dropped or stored > len(messages):
+                    # Compacted (or not a continuation of the stored history): rewrite the session
+                    self.compacted_items += dropped
+                    self.rewrites += 1
+                    self._db.execute("DELETE FROM items WHERE key = ?", (key,))
+                    appended, start = kept, 0
+                else:
+                    appended, start = messages[stored:], stored
+
+                encoded = [json.dumps(m, default=str) for m in appended]
+                self.items_written += len(encoded)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO items (key, seq, item) VALUES (?, ?, ?)",
+                    [(key, start + i, item) for i, item in enumerate(encoded)])
+                size = (row[2] if row and start else 0) + sum(len(item) for item in encoded)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (key, summary, item_count, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(new_summary), start + len(encoded), size, time.time()))
+                self._evict()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        expired = [key for (key,) in self._db.execute(
+            "SELECT key FROM sessions WHERE last_access < ?", (time.time() - self.idle_ttl,))]
+        for key in expired:
+            self._delete(key)
+        self.ttl_evictions += len(expired)
+
+        (count,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        if count > self.max_sessions:
+            oldest = [key for (key,) in self._db.execute(
+                "SELECT key FROM sessions ORDER BY last_access LIMIT ?", (count - self.max_sessions,))]
+            for key in oldest:
+                self._delete(key)
+            self.lru_evictions += len(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions, bytes_held = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {
+            "sessions": sessions,
+            "bytes_held": bytes_held,
+            "lru_evictions": self.lru_evictions,
+            "ttl_evictions": self.ttl_evictions,
+            "compacted_items": self.compacted_items,
+            "rewrites": self.rewrites,
+            "items_written": self.items_written,
+        }
+
+
+class SessionLocks:
+    """
+    Per-session asyncio locks: turns for the same conversation key run one at a time,
+    different keys run fully in parallel. Locks are dropped once nobody holds or waits on them.
+
+    With a `lock_dir`, the turn also holds an flock on one of `stripes` lock files picked by
+    hashing the key, so turns of one conversation are serialized across worker processes
+    too. Keys that share a stripe wait on each other, which only costs time when two such
+    turns run at the same moment.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, stripes: int = 4096):
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    async def _lock_file(self, key: str) -> int:
+        """Opens and flocks the key's stripe file, polling so a cancelled turn never leaves it locked."""
+        import fcntl
+
+        path = os.path.join(self.lock_dir, f"session-{zlib.crc32(key.encode()) % self.stripes}.lock")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        delay = 0.001
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                fd = await self._lock_file(key) if self.lock_dir else None
+                try:
+                    yield
+                finally:
+                    if fd is not None:
+                        os.close(fd)
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+def conversation_store_from_env() -> ConversationBackend:
+    """
+    Builds the backend selected by CONVERSATION_BACKEND ("memory" or "sqlite").
+    CONVERSATION_COMPACT_TO is the fraction of CONVERSATION_TOKEN_BUDGET a history is trimmed
+    to once it goes over (default 0.75; 1.0 trims just under the budget, compacting every turn).
+    """
+    limits = dict(
+        max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+        idle_ttl=float(os.getenv("CONVERSATION_IDLE_TTL", "3600")),
+        token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "4000")),
+        compact_to=float(os.getenv("CONVERSATION_COMPACT_TO", "0.75")),
+    )
+    backend = os.getenv("CONVERSATION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.getenv("CONVERSATION_DB_PATH", "conversations.db"), **limits)
+    if backend != "memory":
+        raise ValueError(f"Unknown CONVERSATION_BACKEND: {backend}")
+    return ConversationStore(**limits)
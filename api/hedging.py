@@ -0,0 +1,289 @@
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from agents import Model, ModelProvider, ModelResponse
+
+from api.metrics import Histogram
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)
+
+
+class LatencyWindow:
+    """The last `size` latencies of one model and call kind, for a running percentile."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class ModelHedger:
+    """
+    Hedged model calls with a fallback model.
+
+    A call still running after the `percentile` latency of recent calls to the same model
+    (never less than `min_delay`, and only once `min_samples` calls have been seen) gets a
+    duplicate request; the first successful response wins and the other is cancelled.
+    Streams are hedged on the time to their first event. Hedges are capped at `max_ratio`
+    of all calls, so a slow upstream can't double the load on it.
+
+    When every attempt fails, or none has answered within `timeout`, the call goes to the
+    `fallback` model instead (once, with the same timeout). Without a fallback the error
+    is raised as is.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_delay: float = 0.5, min_samples: int = 20,
+                 max_ratio: float = 0.1, timeout: Optional[float] = 30.0, fallback: Optional[str] = None):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.timeout = timeout
+        self.fallback = fallback
+        self.latencies: Dict[Tuple[str, str], LatencyWindow] = defaultdict(LatencyWindow)
+        self.latency_seconds = Histogram("shoe_store_model_latency_seconds",
+                                         "Model call latency (time to first event for streams)", LATENCY_BUCKETS)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.fallback_errors = 0
+        self._wrapped: Optional[tuple] = None
+
+    def hedge_delay(self, model_name: str, kind: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, or None while there is too little history or no budget."""
+        window = self.latencies[model_name, kind]
+        if not self.percentile or len(window.samples) < self.min_samples:
+            return None
+        if self.hedges >= self.max_ratio * self.calls:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def observe(self, model_name: str, kind: str, seconds: float):
+        self.latencies[model_name, kind].add(seconds)
+        self.latency_seconds.observe((("kind", kind), ("model", model_name)), seconds)
+
+    async def call(self, model_name: str, kind: str, model: Model, fallback: Optional[Model],
+                   attempt: Callable[[Model], Awaitable[Any]], discard: Optional[Callable[[Any], Awaitable]] = None):
+        """
+        Runs `attempt(model)`, hedged, then `attempt(fallback)` if it failed. `discard`
+        releases the result of an attempt that finished but lost the race (e.g. closes a stream).
+        """
+        self.calls += 1
+        start = time.perf_counter()
+        deadline = start + self.timeout if self.timeout else None
+        delay = self.hedge_delay(model_name, kind)
+        launched: Dict[asyncio.Task, float] = {asyncio.ensure_future(attempt(model)): start}
+        pending = set(launched)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = time.perf_counter()
+                hedge_at = start + delay if delay is not None and len(launched) == 1 else None
+                wake_at = min((t for t in (hedge_at, deadline) if t is not None), default=None)
+                done, pending = await asyncio.wait(pending, timeout=None if wake_at is None else max(0.0, wake_at - now),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    self.observe(model_name, kind, time.perf_counter() - launched[winner])
+                    if len(launched) > 1 and winner is not next(iter(launched)):
+                        self.hedge_wins += 1
+                    for task in done:
+                        if task is not winner and task.exception() is None and discard:
+                            await discard(task.result())
+                    return winner.result()
+                for task in done:
+                    error = task.exception()
+                    self.errors += 1
+                if done and not pending:
+                    break
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    self.timeouts += 1
+                    error = asyncio.TimeoutError(f"{model_name} did not answer within {self.timeout:g}s")
+                    break
+                if hedge_at is not None and now >= hedge_at:
+                    self.hedges += 1
+                    hedge = asyncio.ensure_future(attempt(model))
+                    launched[hedge] = now
+                    pending.add(hedge)
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    result = await task
+                except BaseException:
+                    continue
+                if discard:
+                    await discard(result)
+
+        if fallback is None:
+            raise error
+        self.fallbacks += 1
+        try:
+            return await asyncio.wait_for(attempt(fallback), self.timeout)
+        except Exception:
+            self.fallback_errors += 1
+            raise
+
+    def wrap(self, provider: ModelProvider) -> ModelProvider:
+        """The provider with hedged models; reused while the same provider is passed in."""
+        if self._wrapped is None or self._wrapped[0] is not provider:
+            self._wrapped = (provider, HedgedModelProvider(provider, self))
+        return self._wrapped[1]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+            "fallback_errors": self.fallback_errors,
+            "fallback_model": self.fallback,
+            "hedge_delay": {f"{model}:{kind}": self.hedge_delay(model, kind) for model, kind in self.latencies},
+        }
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP shoe_store_model_calls_total Model calls through the hedger, by outcome",
+            "# TYPE shoe_store_model_calls_total counter",
+        ]
+        for outcome, count in (("all", self.calls), ("hedged", self.hedges), ("hedge_won", self.hedge_wins),
+                               ("timed_out", self.timeouts), ("fallback", self.fallbacks)):
+            lines.append(f'shoe_store_model_calls_total{{outcome="{outcome}"}} {count}')
+        return lines + self.latency_seconds.render()
+
+
+_DONE = object()
+
+
+class _StreamAttempt:
+    """
+    Runs one model stream in its own task and queues its events. The stream starts and ends
+    in that task, so the tracing span it opens is closed in the context it was opened in.
+    """
+
+    def __init__(self, model: Model, args: tuple, kwargs: dict):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._pump(model, args, kwargs))
+
+    async def _pump(self, model: Model, args: tuple, kwargs: dict):
+        try:
+            async for event in model.stream_response(*args, **kwargs):
+                self.queue.put_nowait(event)
+        except Exception as e:
+            self.queue.put_nowait(e)
+        finally:
+            self.queue.put_nowait(_DONE)
+
+    async def next(self) -> Any:
+        """The next event, _DONE at the end; a failed stream raises its error."""
+        item = await self.queue.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except BaseException:
+            pass
+
+
+async def _start_stream(model: Model, args: tuple, kwargs: dict) -> Tuple[_StreamAttempt, Any]:
+    """Starts a stream and waits for its first event."""
+    attempt = _StreamAttempt(model, args, kwargs)
+    try:
+        return attempt, await attempt.next()
+    except BaseException:
+        await attempt.close()
+        raise
+
+
+async def _close_stream(started: Tuple[_StreamAttempt, Any]):
+    await started[0].close()
+
+
+class HedgedModel(Model):
+    def __init__(self, model_name: str, model: Model, fallback: Optional[Model], hedger: ModelHedger):
+        self.model_name = model_name
+        self.model = model
+        self.fallback = fallback
+        self.hedger = hedger
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        return await self.hedger.call(self.model_name, "response", self.model, self.fallback,
+                                      lambda model: model.get_response(*args, **kwargs))
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+        # Only the start of a stream is hedged: once an event has been passed on it can't be taken back
+        stream, event = await self.hedger.call(self.model_name, "stream", self.model, self.fallback,
+                                               lambda model: _start_stream(model, args, kwargs), _close_stream)
+        try:
+            while event is not _DONE:
+                yield event
+                event = await stream.next()
+        finally:
+            await stream.close()
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request)
+
+    async def close(self):
+        await self.model.close()
+        if self.fallback is not None:
+            await self.fallback.close()
+
+
+class HedgedModelProvider(ModelProvider):
+    def __init__(self, provider: ModelProvider, hedger: ModelHedger):
+        self.provider = provider
+        self.hedger = hedger
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        fallback = self.hedger.fallback
+        return HedgedModel(
+            model_name or "default",
+            self.provider.get_model(model_name),
+            self.provider.get_model(fallback) if fallback and fallback != model_name else None,
+            self.hedger,
+        )
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+def model_hedger_from_env() -> Optional[ModelHedger]:
+    """
+    A ModelHedger when MODEL_HEDGING is on: hedge after MODEL_HEDGE_PERCENTILE (default 95,
+    0 for fallback only) of recent latency but never before MODEL_HEDGE_MIN_DELAY seconds, at
+    most MODEL_HEDGE_MAX_RATIO of calls; MODEL_TIMEOUT seconds per call; MODEL_FALLBACK names
+    the alternate model.
+    """
+    if os.getenv("MODEL_HEDGING", "false").lower() not in ("1", "true", "yes"):
+        return None
+    timeout = float(os.getenv("MODEL_TIMEOUT", "30"))
+    return ModelHedger(
+        percentile=float(os.getenv("MODEL_HEDGE_PERCENTILE", "95")),
+        min_delay=float(os.getenv("MODEL_HEDGE_MIN_DELAY", "0.5")),
+        min_samples=int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20")),
+        max_ratio=float(os.getenv("MODEL_HEDGE_MAX_RATIO", "0.1")),
+        timeout=timeout if timeout > 0 else None,
+        fallback=os.getenv("MODEL_FALLBACK") or None,
+    )
@@ -1,24 +1,111 @@
-
+import asyncio
+import dataclasses
+import json
+import os
+import time
+import uuid
+from contextlib import aclosing, asynccontextmanager, nullcontext
 from pydantic import BaseModel, Field
-from fastapi import FastAPI, HTTPException
-from typing import Dict, List, Optional, Any
-from agents import Runner, TResponseInputItem, MessageOutputItem, ItemHelpers
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, Dict, List, Optional, Any
+from agents import Runner, RunConfig, TResponseInputItem, MessageOutputItem, ItemHelpers
+from openai import RateLimitError
+from openai.types.responses import ResponseTextDeltaEvent
+from dotenv import load_dotenv
+
+# Environment from .env, before the store and catalog modules below read their settings
+load_dotenv()
 
+from api.admission import Overloaded, admission_from_env, model_pacer_from_env
+from api.batch import BatchSession, BatchTurn, parse_batch, run_batch
+from api.conversation_store import SessionLocks, conversation_store_from_env
+from api.hedging import model_hedger_from_env
+from api.metrics import metrics_processor_from_env
+from api.upstream import upstream_client_from_env
 from cases.shoe_store_case.context import UserContext
-from cases.shoe_store_case.main import ShoeStoreAgent, voice_pipeline
+from cases.shoe_store_case.graph import AGENT_ROLES, agent_models_from_env, shoe_store_agent_from_env
+from cases.shoe_store_case.response_cache import ResponseCache
+from cases.shoe_store_case.router import IntentRouter
+from cases.shoe_store_case.tools import cart_store, catalog, email_worker
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Receipt emails are sent in the background, off the checkout path
+    email_worker.start()
+    # One pooled model API client per worker for every agent, warmed up before the first request
+    if upstream:
+        await upstream.start()
+    if os.getenv("VOICE_PRELOAD", "false").lower() in ("1", "true", "yes"):
+        _voice_config()
+    yield
+    await email_worker.stop()
+    if upstream:
+        await upstream.close()
+    if metrics_processor:
+        metrics_processor.shutdown()
+
 
 app = FastAPI(title="Agentic Cases API",
               description="API for Agentic Cases.",
-              version="1.0.0")
+              version="1.0.0",
+              lifespan=lifespan)
+
+# Agent graph for MODEL_CHOICE / AGENT_TOPOLOGY
+ShoeStoreAgent = shoe_store_agent_from_env()
+
+# Voice pipeline config, built on the first voice session (or at startup with VOICE_PRELOAD) so
+# text-only workers never import numpy and the agents.voice stack
+voice_pipeline_config = None
+
+# Hold back silence between utterances instead of streaming it to speech to text
+VOICE_SPEECH_GATE = os.getenv("VOICE_SPEECH_GATE", "false").lower() in ("1", "true", "yes")
+
+# In-memory storage for conversations, bounded by session count, idle TTL and token budget
+conversations = conversation_store_from_env()
+
+# Serializes turns of the same conversation so concurrent requests don't overwrite each other's history;
+# SESSION_LOCK_DIR extends that across worker processes
+session_locks = SessionLocks(lock_dir=os.getenv("SESSION_LOCK_DIR"))
+
+# Optional deterministic fast path for trivial intents (order status, cart total, show cart)
+router = IntentRouter() if os.getenv("FAST_PATH_ROUTER", "false").lower() in ("1", "true", "yes") else None
+
+# Optional cache of answers to stateless product questions, invalidated when the catalog reloads
+response_cache = ResponseCache(
+    catalog,
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+) if os.getenv("RESPONSE_CACHE", "false").lower() in ("1", "true", "yes") else None
+
+# Upper bound on the turns one /chat/batch request may run at once
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Run configuration shared by every endpoint; benchmarks swap in a fake model provider here
+run_config = RunConfig()
+
+# Optional cap on in-flight agent runs with a bounded, deadline-aware wait queue (ADMISSION_MAX_CONCURRENCY)
+admission = admission_from_env()
+
+# Optional pacing of model calls under per-worker MODEL_RPM / MODEL_TPM budgets
+model_pacer = model_pacer_from_env()
+
+# Optional hedged model calls with a fallback model on errors and timeouts (MODEL_HEDGING, MODEL_FALLBACK)
+model_hedger = model_hedger_from_env()
+
+# Shared model API client with connection pool limits, keep-alive, timeouts and warmup (UPSTREAM_*),
+# created by the lifespan handler
+upstream = upstream_client_from_env()
 
-# In-memory storage for conversations
-conversations = {}
+# Optional span metrics for /metrics (TRACE_METRICS), with JSONL span export (TRACE_EXPORT_PATH)
+metrics_processor = metrics_processor_from_env()
 
 # Pydantic models for request/response
 class TextMessageRequest(BaseModel):
     message: str = Field(..., description="User's text message")
     user_id: str = Field(..., description="Unique user identifier")
     email: Optional[str] = Field(..., description="User's email address")
+    request_id: Optional[str] = Field(None, description="Correlates the turn's trace spans; generated when omitted")
 
 class TextMessageResponse(BaseModel):
     response: str = Field(..., description="Agent's text response")
@@ -26,6 +113,7 @@ class TextMessageResponse(BaseModel):
 class VoiceSessionRequest(BaseModel):
     user_id: str = Field(..., description="Unique user identifier")
     email: str = Field(..., description="User's email address")
+    sample_rate: int = Field(24000, ge=8000, le=96000, description="Sample rate of the int16 PCM frames the client sends")
 
 class HealthResponse(BaseModel):
     status: str
@@ -35,40 +123,411 @@ class ConversationState(BaseModel):
     messages: List[dict]
 
 
-@app.post("/chat/text", response_model=TextMessageResponse)
-async def text_chat(request: TextMessageRequest):
+def _conversation_key(request: TextMessageRequest) -> str:
+    return f"{request.user_id}:{request.email}"
+
+
+def _prepare_turn(request: TextMessageRequest):
+    """Builds the user context, conversation key and full input list for one chat turn."""
+    context = UserContext(user_id=request.user_id, email=request.email)
+    input_items: List[TResponseInputItem] = [{"content": request.message, "role": "user"}]
+
+    # Get or create conversation state
+    conversation_key = _conversation_key(request)
+    input_items = conversations.get(conversation_key) + input_items
+
+    return context, conversation_key, input_items
+
+
+def _turn_run_config(request: TextMessageRequest) -> RunConfig:
+    """The shared run config, with the request id in the trace metadata so spans can be traced back to it."""
+    if request.request_id is None:
+        request.request_id = uuid.uuid4().hex
+    # Hedges and fallbacks go through the pacer too, so they count against the same budget
+    model_provider = model_pacer.wrap(run_config.model_provider) if model_pacer else run_config.model_provider
+    if model_hedger:
+        model_provider = model_hedger.wrap(model_provider)
+    return dataclasses.replace(
+        run_config,
+        trace_metadata={**(run_config.trace_metadata or {}), "request_id": request.request_id},
+        model_provider=model_provider,
+    )
+
+
+@asynccontextmanager
+async def _agent_run_slot():
+    """Admission control around one agent run; upstream rate limiting is reported as Overloaded too."""
+    try:
+        async with admission.admit() if admission else nullcontext():
+            yield
+    except RateLimitError as e:
+        try:
+            retry_after = float(e.response.headers.get("retry-after", 1))
+        except ValueError:
+            retry_after = 1.0
+        raise Overloaded(503, "The assistant is rate limited upstream, please retry shortly", retry_after) from e
+
+
+def _overloaded_response(e: Overloaded, request_id: Optional[str]) -> JSONResponse:
+    return JSONResponse({"detail": e.detail}, status_code=e.status_code,
+                        headers={"Retry-After": str(e.retry_after), "X-Request-ID": request_id or ""})
+
+
+def _voice_config():
+    global voice_pipeline_config
+    if voice_pipeline_config is None:
+        from cases.shoe_store_case.voice import shoe_store_voice_config
+        voice_pipeline_config = shoe_store_voice_config()
+    return voice_pipeline_config
+
+
+def _fast_reply(message: str, context: UserContext, input_items: List[TResponseInputItem]) -> Optional[str]:
+    """Answers from the fast-path router or the response cache when enabled, skipping the agent."""
+    routed = router.route(message, context) if router else None
+    if routed:
+        return routed.response
+    return response_cache.get(message, has_history=len(input_items) > 1) if response_cache else None
+
+
+def _record_agent_run(message: str, response_text: str, result, seconds: float, input_items: List[TResponseInputItem]):
+    """Feeds a finished agent run to the router's latency estimate and the response cache."""
+    if router:
+        router.record_agent_latency(seconds)
+    if response_cache:
+        tools_called = [item.raw_item.name for item in result.new_items if item.type in ("tool_call_item", "handoff_call_item")]
+        response_cache.put(message, response_text, tools_called, seconds, has_history=len(input_items) > 1)
+
+
+async def _stream_chat_events(request: TextMessageRequest) -> AsyncIterator[Dict[str, Any]]:
     """
-    Text-based chat endpoint for the shoe store agent
+    Drives one streamed agent run and yields events as they happen:
+    text deltas, tool call start/finish and the final message.
+    The conversation state is updated once the run has finished; the session lock is held until then.
     """
-    try:
-        context = UserContext(user_id=request.user_id, email=request.email)
-        input_items: List[TResponseInputItem] = [{"content": request.message, "role": "user"}]
-        
-        # Get or create conversation state
-        conversation_key = f"{request.user_id}:{request.email}"
-        if conversation_key in conversations:
-            input_items = conversations[conversation_key]["messages"] + input_items
-        
-        result = await Runner.run(ShoeStoreAgent, input_items, context=context)
-        
+    async with session_locks.lock(_conversation_key(request)):
+        context, conversation_key, input_items = _prepare_turn(request)
+        response_text = _fast_reply(request.message, context, input_items)
+        if response_text is not None:
+            conversations.set(conversation_key, input_items + [{"role": "assistant", "content": response_text}])
+            yield {"event": "delta", "data": {"delta": response_text}}
+        else:
+            async with _agent_run_slot():
+                start = time.perf_counter()
+                result = Runner.run_streamed(ShoeStoreAgent, input_items, context=context, run_config=_turn_run_config(request))
+
+                response_text = ""
+                tool_names = {}
+
+                try:
+                    async for event in result.stream_events():
+                        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                            yield {"event": "delta", "data": {"delta": event.data.delta}}
+                        elif event.type == "run_item_stream_event":
+                            if event.name == "tool_called":
+                                raw_item = event.item.raw_item
+                                tool_name = getattr(raw_item, "name", None)
+                                tool_names[getattr(raw_item, "call_id", None)] = tool_name
+                                yield {"event": "tool_call", "data": {"name": tool_name}}
+                            elif event.name == "tool_output":
+                                call_id = event.item.raw_item.get("call_id")
+                                yield {"event": "tool_output", "data": {"name": tool_names.get(call_id), "output": str(event.item.output)}}
+                            elif event.name == "message_output_created":
+                                response_text += ItemHelpers.text_message_output(event.item)
+                finally:
+                    # The client went away (the generator is closed or cancelled at a yield): stop
+                    # the run so its model and tool calls don't keep going for nobody
+                    if not result.is_complete:
+                        result.cancel()
+
+            _record_agent_run(request.message, response_text, result, time.perf_counter() - start, input_items)
+
+            # Update conversation state
+            conversations.set(conversation_key, result.to_input_list())
+
+    yield {"event": "message", "data": {"response": response_text}}
+
+
+async def _chat_turn(request: TextMessageRequest) -> str:
+    """Runs one non-streamed chat turn under the session lock and returns the reply text."""
+    async with session_locks.lock(_conversation_key(request)):
+        context, conversation_key, input_items = _prepare_turn(request)
+
+        response_text = _fast_reply(request.message, context, input_items)
+        if response_text is not None:
+            conversations.set(conversation_key, input_items + [{"role": "assistant", "content": response_text}])
+            return response_text
+
+        async with _agent_run_slot():
+            start = time.perf_counter()
+            result = await Runner.run(ShoeStoreAgent, input_items, context=context, run_config=_turn_run_config(request))
+
         # Extract response
         response_text = ""
-        
+
         for new_item in result.new_items:
             if isinstance(new_item, MessageOutputItem):
                 response_text += ItemHelpers.text_message_output(new_item)
                 # agent_name = new_item.agent.name
-        
+
+        _record_agent_run(request.message, response_text, result, time.perf_counter() - start, input_items)
+
         # Update conversation state
-        conversations[conversation_key] = {
-            "messages": result.to_input_list()
-        }
-        
-        return TextMessageResponse(response=response_text)
-        
+        conversations.set(conversation_key, result.to_input_list())
+
+    return response_text
+
+
+@app.post("/chat/text", response_model=TextMessageResponse)
+async def text_chat(request: TextMessageRequest, response: Response):
+    """
+    Text-based chat endpoint for the shoe store agent
+    """
+    request.request_id = request.request_id or uuid.uuid4().hex
+    response.headers["X-Request-ID"] = request.request_id
+    try:
+        return TextMessageResponse(response=await _chat_turn(request))
+    except Overloaded as e:
+        return _overloaded_response(e, request.request_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+
+def batch_results(sessions: List[BatchSession], concurrency: int = 4, rate: float = 0.0,
+                  isolate: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Replays batch sessions through the /chat/text pipeline (see api.batch). With `isolate`,
+    each session gets its own cart and history under a batch-scoped user id, dropped when
+    the session ends; checkouts still create orders and queue receipt emails.
+    """
+    prefix = f"batch-{uuid.uuid4().hex[:8]}:" if isolate else ""
+
+    def turn_request(session: BatchSession, turn: BatchTurn) -> TextMessageRequest:
+        return TextMessageRequest(message=turn.message, user_id=prefix + session.user_id, email=session.email,
+                                  request_id=turn.request_id)
+
+    async def run_turn(session: BatchSession, turn: BatchTurn) -> str:
+        request = turn_request(session, turn)
+        # Offline replay backs off instead of failing when the worker is overloaded
+        while True:
+            try:
+                response_text = await _chat_turn(request)
+                break
+            except Overloaded as e:
+                await asyncio.sleep(e.retry_after)
+        turn.request_id = request.request_id
+        return response_text
+
+    def end_session(session: BatchSession):
+        if isolate:
+            conversations.delete(_conversation_key(turn_request(session, session.turns[0])))
+            cart_store.clear(prefix + session.user_id)
+
+    return run_batch(sessions, run_turn, max(1, min(concurrency, BATCH_MAX_CONCURRENCY)), rate, end_session)
+
+
+@app.post("/chat/batch")
+async def batch_chat(request: Request, concurrency: int = 4, rate: float = 0.0, isolate: bool = True):
+    """
+    Replays a JSONL body of {user_id, email, message | messages} lines (see api.batch).
+    Sessions run concurrently, up to `concurrency` turns at a time (capped by
+    BATCH_MAX_CONCURRENCY) and `rate` turn starts per second; turns within a session stay
+    in order. Results stream back as JSONL as turns complete.
+    """
+    try:
+        sessions = parse_batch((await request.body()).decode().splitlines())
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        async for result in batch_results(sessions, concurrency, rate, isolate):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/conversations/stats")
+async def conversation_stats():
+    """
+    Counters for the conversation store: live sessions, bytes held, evictions and compacted items
+    """
+    return conversations.stats()
+
+
+@app.get("/router/stats")
+async def router_stats():
+    """
+    Fast-path router counters: hit rate per intent and estimated latency saved
+    """
+    if router is None:
+        return {"enabled": False}
+    return {"enabled": True, **router.stats()}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Response cache counters: hit ratio, evictions, expirations, invalidations and estimated latency saved
+    """
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+
+@app.get("/voice/tts_cache/stats")
+async def tts_cache_stats():
+    """
+    Synthesized speech cache counters: hit rate (memory and disk), entries and audio served
+    without a TTS call. Empty until the first voice session loads the voice stack.
+    """
+    cache = getattr(voice_pipeline_config.model_provider, "cache", None) if voice_pipeline_config else None
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics from the agent traces: agent run, model call and tool call latency
+    histograms, token counters and handoffs (empty unless TRACE_METRICS is set)
+    """
+    body = metrics_processor.render() if metrics_processor else ""
+    if admission:
+        body += "\n".join(admission.render()) + "\n"
+    if model_hedger:
+        body += "\n".join(model_hedger.render()) + "\n"
+    if upstream:
+        body += "\n".join(upstream.render()) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    Admission control: runs in flight, queue depth, requests shed (queue full, deadline,
+    timed out), average wait and run time, plus model call pacing when MODEL_RPM/TPM are set
+    """
+    stats = {"enabled": admission is not None, **(admission.stats() if admission else {})}
+    if model_pacer:
+        stats["model_pacing"] = model_pacer.stats()
+    return stats
+
+
+@app.get("/models/stats")
+async def model_stats():
+    """
+    Models per agent, and when MODEL_HEDGING is on: calls, hedges sent and won, errors,
+    timeouts, fallbacks and the current hedge delay per model
+    """
+    main_model, agent_models = os.getenv("MODEL_CHOICE", "gpt-4o-mini"), agent_models_from_env()
+    return {
+        "agents": {role: agent_models.get(role, main_model) for role in AGENT_ROLES},
+        "hedging": model_hedger.stats() if model_hedger else None,
+    }
+
+
+@app.get("/upstream/stats")
+async def upstream_stats():
+    """
+    Shared model API client: requests sent and in flight, connections opened and reused,
+    pool size and idle connections, and the startup warmup (empty with UPSTREAM_POOL=false)
+    """
+    return {"enabled": upstream is not None, **(upstream.stats() if upstream else {})}
+
+
+@app.get("/outbox/stats")
+async def outbox_stats():
+    """
+    Receipt email outbox counters: pending, sent, retried, failed and SMTP connections opened
+    """
+    return email_worker.stats()
+
+
+@app.get("/catalog/stats")
+async def catalog_stats():
+    """
+    Product catalog: source file, snapshot version, product/variant/index sizes and hot reloads
+    """
+    return catalog.stats()
+
+
+@app.post("/chat/stream")
+async def stream_chat(request: TextMessageRequest):
+    """
+    Streaming variant of /chat/text. Sends text deltas, tool call events and
+    the final message as Server-Sent Events.
+    """
+    request.request_id = request.request_id or uuid.uuid4().hex
+    if admission:
+        # Shed before the stream starts, while a status code can still be sent
+        try:
+            admission.check()
+        except Overloaded as e:
+            return _overloaded_response(e, request.request_id)
+
+    async def event_source():
+        try:
+            # Closed right away when the client disconnects, which cancels the agent run
+            async with aclosing(_stream_chat_events(request)) as events:
+                async for event in events:
+                    yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Overloaded as e:
+            yield f"event: error\ndata: {json.dumps({'detail': e.detail, 'retry_after': e.retry_after})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-ID": request.request_id})
+
+
+@app.websocket("/chat/ws")
+async def websocket_chat(websocket: WebSocket):
+    """
+    WebSocket variant of /chat/stream. Each received JSON message is a TextMessageRequest;
+    the same events are sent back as JSON objects, ending with a "message" event per turn.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            # A malformed frame (not JSON, not an object, missing fields) gets an error event, not a dropped socket
+            try:
+                request = TextMessageRequest(**await websocket.receive_json())
+            except (ValueError, TypeError, KeyError) as e:
+                # KeyError: a binary frame has no text
+                await websocket.send_json({"event": "error", "data": {"detail": f"Invalid message: {e!r}"}})
+                continue
+            try:
+                async with aclosing(_stream_chat_events(request)) as events:
+                    async for event in events:
+                        await websocket.send_json(event)
+            except Exception as e:
+                await websocket.send_json({"event": "error", "data": {"detail": str(e)}})
+    except WebSocketDisconnect:
+        pass
+
+
+@app.websocket("/voice/ws")
+async def voice_chat(websocket: WebSocket):
+    """
+    Realtime voice chat. The first message is a JSON VoiceSessionRequest; after that the client
+    streams int16 PCM frames and receives synthesized speech chunks as they are produced.
+    Turns share the user's conversation state with the text endpoints.
+    """
+    from api.voice import ConversationVoiceWorkflow, serve_voice_session
+
+    await websocket.accept()
+    try:
+        session = VoiceSessionRequest(**await websocket.receive_json())
+
+        def run_turn(transcription: str):
+            return _stream_chat_events(TextMessageRequest(message=transcription, user_id=session.user_id, email=session.email))
+
+        await serve_voice_session(websocket, ConversationVoiceWorkflow(run_turn), _voice_config(),
+                                  sample_rate=session.sample_rate, speech_gate=VOICE_SPEECH_GATE)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,225 @@
+import json
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.tracing import Span, Trace, TracingProcessor
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: Optional[str]) -> Labels:
+    return tuple(sorted((name, str(value) if value is not None else "") for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, le: Optional[str] = None) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, labels: Labels, amount: float = 1.0):
+        self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(labels)} {value:g}" for labels, value in sorted(self.values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # Per label set: [count per bucket (plus +Inf), sum]
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, labels: Labels, value: float):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class SpanExporter:
+    """Appends finished spans to a JSONL file from a background thread, one request's spans together."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[List[dict]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, records: List[dict]):
+        self._queue.put(records)
+
+    def _run(self):
+        with open(self.path, "a", buffering=1) as f:
+            while True:
+                records = self._queue.get()
+                if records is None:
+                    return
+                f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class MetricsTraceProcessor(TracingProcessor):
+    """
+    Turns agents SDK spans into Prometheus histograms and counters: agent runs, model calls
+    (with token counts), function tools and handoffs, labelled by agent or tool name.
+
+    Nested `as_tool` runs show up as their own agent spans, so a slow turn can be split into
+    the main agent's model calls, the specialist's run and the tool that blocked. With an
+    exporter, each trace's spans are also written as JSONL tagged with the request id the
+    API puts in the trace metadata.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        self.exporter = exporter
+        self._lock = threading.Lock()
+        self._started: Dict[str, float] = {}
+        self._agents: Dict[str, str] = {}  # span id -> agent name, for agent and turn spans
+        self._traces: Dict[str, Tuple[float, Optional[str], List[dict]]] = {}
+
+        self.trace_seconds = Histogram("shoe_store_trace_seconds", "Duration of a whole agent workflow (one chat turn)")
+        self.agent_seconds = Histogram("shoe_store_agent_run_seconds", "Duration of an agent run, including nested runs")
+        self.model_seconds = Histogram("shoe_store_model_call_seconds", "Duration of a model call")
+        self.tool_seconds = Histogram("shoe_store_tool_call_seconds", "Duration of a function tool call")
+        self.input_tokens = Counter("shoe_store_model_input_tokens_total", "Input tokens sent to the model")
+        self.output_tokens = Counter("shoe_store_model_output_tokens_total", "Output tokens received from the model")
+        self.handoffs = Counter("shoe_store_handoffs_total", "Handoffs between agents")
+        self.errors = Counter("shoe_store_span_errors_total", "Spans that finished with an error")
+        self._metrics = [self.trace_seconds, self.agent_seconds, self.model_seconds, self.tool_seconds,
+                         self.input_tokens, self.output_tokens, self.handoffs, self.errors]
+
+    def on_trace_start(self, trace: Trace):
+        metadata = getattr(trace, "metadata", None) or {}
+        with self._lock:
+            self._traces[trace.trace_id] = (time.perf_counter(), metadata.get("request_id"), [])
+
+    def on_trace_end(self, trace: Trace):
+        with self._lock:
+            started, request_id, records = self._traces.pop(trace.trace_id, (None, None, []))
+            if started is not None:
+                self.trace_seconds.observe(_labels(workflow=trace.name), time.perf_counter() - started)
+        if self.exporter and records:
+            self.exporter.export(records)
+
+    def on_span_start(self, span: Span[Any]):
+        data = span.span_data
+        with self._lock:
+            self._started[span.span_id] = time.perf_counter()
+            if data.type == "agent":
+                self._agents[span.span_id] = data.name
+            elif data.type == "turn":
+                self._agents[span.span_id] = data.agent_name
+
+    def on_span_end(self, span: Span[Any]):
+        data = span.span_data
+        with self._lock:
+            started = self._started.pop(span.span_id, None)
+            duration = time.perf_counter() - started if started is not None else 0.0
+            agent = self._agents.get(span.parent_id) if span.parent_id else None
+            record = None
+
+            if data.type == "agent":
+                agent = self._agents.pop(span.span_id, data.name)
+                self.agent_seconds.observe(_labels(agent=data.name), duration)
+                record = {"name": data.name}
+            elif data.type == "turn":
+                self._agents.pop(span.span_id, None)
+            elif data.type in ("response", "generation"):
+                usage = data.usage or {}
+                labels = _labels(agent=agent)
+                self.model_seconds.observe(labels, duration)
+                self.input_tokens.inc(labels, usage.get("input_tokens", 0))
+                self.output_tokens.inc(labels, usage.get("output_tokens", 0))
+                record = {"name": agent, "input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens")}
+            elif data.type == "function":
+                self.tool_seconds.observe(_labels(tool=data.name), duration)
+                record = {"name": data.name}
+            elif data.type == "handoff":
+                self.handoffs.inc(_labels(from_agent=data.from_agent, to_agent=data.to_agent))
+                record = {"name": f"{data.from_agent} -> {data.to_agent}"}
+
+            if span.error:
+                self.errors.inc(_labels(type=data.type, name=(record or {}).get("name")))
+
+            trace = self._traces.get(span.trace_id)
+            if self.exporter and record is not None and trace is not None:
+                trace[2].append({
+                    "request_id": trace[1],
+                    "trace_id": span.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "type": data.type,
+                    "agent": agent,
+                    "duration_ms": round(duration * 1000, 3),
+                    "error": span.error,
+                    **record,
+                })
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [line for metric in self._metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self):
+        if self.exporter:
+            self.exporter.close()
+
+    def force_flush(self):
+        pass
+
+
+def metrics_processor_from_env() -> Optional[MetricsTraceProcessor]:
+    """
+    Registers a MetricsTraceProcessor when TRACE_METRICS is set, exporting spans to
+    TRACE_EXPORT_PATH (JSONL) when given. OPENAI_TRACE_EXPORT=false drops the SDK's default
+    export to the OpenAI dashboard so only local metrics are kept.
+    """
+    if os.getenv("TRACE_METRICS", "false").lower() not in ("1", "true", "yes"):
+        return None
+    from agents import add_trace_processor, set_trace_processors
+
+    export_path = os.getenv("TRACE_EXPORT_PATH")
+    processor = MetricsTraceProcessor(SpanExporter(export_path) if export_path else None)
+    if os.getenv("OPENAI_TRACE_EXPORT", "true").lower() in ("1", "true", "yes"):
+        add_trace_processor(processor)
+    else:
+        set_trace_processors([processor])
+    return processor
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+import httpx
+from agents import set_default_openai_client
+from openai import AsyncOpenAI, OpenAIError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx's pooled transport, counting requests, requests in flight and the connections and
+    TLS handshakes the pool had to open for them.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.errors = 0
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        outer = request.extensions.get("trace")
+
+        async def trace(event: str, info: dict):
+            await self._trace(event, info)
+            if outer is not None:
+                await outer(event, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().handle_async_request(request)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            # Counts until the response head arrives; a streamed body keeps its connection a while longer
+            self.in_flight -= 1
+
+    def pool_stats(self) -> dict:
+        # httpx keeps the httpcore pool private; its connections are httpcore's public API
+        connections = list(getattr(getattr(self, "_pool", None), "connections", []))
+        return {
+            "open": len(connections),
+            "idle": sum(1 for connection in connections if connection.is_idle()),
+            "http2": sum(1 for connection in connections if "HTTP/2" in connection.info()),
+        }
+
+
+class UpstreamClient:
+    """
+    The one model API client of a worker: an AsyncOpenAI client over a shared httpx
+    connection pool with `max_connections` (`max_keepalive` of them kept open for
+    `keepalive_expiry` seconds after use), `timeout` seconds per call (`connect_timeout` to
+    connect) and optional HTTP/2 (needs `pip install httpx[http2]`).
+
+    start() creates it, opens `warmup_connections` connections ahead of the first request
+    and makes it the agents SDK's default client, so every agent, built with a model name,
+    is served through it. If the client can't be created (no OPENAI_API_KEY), start() logs
+    a warning and leaves the SDK's default client, which only fails once a model is called.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_connections: int = 100, max_keepalive: int = 20,
+                 keepalive_expiry: float = 60.0, timeout: float = 60.0, connect_timeout: float = 5.0,
+                 max_retries: int = 2, http2: bool = False, warmup_connections: int = 0):
+        self.base_url = base_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.http2 = http2
+        self.warmup_connections = warmup_connections
+        self.transport: Optional[PoolTransport] = None
+        self.client: Optional[AsyncOpenAI] = None
+        self.warmed = 0
+        self.warmup_errors = 0
+        self.warmup_seconds: Optional[float] = None
+
+    async def start(self) -> Optional[AsyncOpenAI]:
+        transport = PoolTransport(limits=self.limits, http2=self.http2)
+        http_client = httpx.AsyncClient(transport=transport, timeout=self.timeout, follow_redirects=True)
+        try:
+            self.client = AsyncOpenAI(base_url=self.base_url, timeout=self.timeout, max_retries=self.max_retries,
+                                      http_client=http_client)
+        except OpenAIError as e:
+            await http_client.aclose()
+            logger.warning("Shared upstream client not started, using the agents SDK's default client: %s", e)
+            return None
+        self.transport = transport
+        set_default_openai_client(self.client, use_for_tracing=False)
+        if self.warmup_connections:
+            await self.warmup(self.warmup_connections)
+        return self.client
+
+    async def warmup(self, connections: int):
+        """
+        Opens up to `connections` connections (TCP and TLS setup) with concurrent model list
+        requests, so the first turns don't pay for them. Failures are counted, not raised.
+        """
+        start = time.perf_counter()
+        probe = self.client.with_options(max_retries=0)
+        results = await asyncio.gather(*(probe.models.list() for _ in range(connections)), return_exceptions=True)
+        self.warmed += sum(1 for result in results if not isinstance(result, BaseException))
+        self.warmup_errors += sum(1 for result in results if isinstance(result, BaseException))
+        self.warmup_seconds = time.perf_counter() - start
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+
+    def stats(self) -> dict:
+        transport = self.transport
+        requests = transport.requests if transport else 0
+        opened = transport.connections_opened if transport else 0
+        return {
+            "started": self.client is not None,
+            "base_url": str(self.client.base_url) if self.client else self.base_url,
+            "limits": {"max_connections": self.limits.max_connections,
+                       "max_keepalive": self.limits.max_keepalive_connections,
+                       "keepalive_expiry": self.limits.keepalive_expiry},
+            "http2": self.http2,
+            "requests": requests,
+            "in_flight": transport.in_flight if transport else 0,
+            "peak_in_flight": transport.peak_in_flight if transport else 0,
+            "errors": transport.errors if transport else 0,
+            "connections_opened": opened,
+            "tls_handshakes": transport.tls_handshakes if transport else 0,
+            "reuse_ratio": round(1 - opened / requests, 3) if requests else None,
+            "pool": transport.pool_stats() if transport else {"open": 0, "idle": 0, "http2": 0},
+            "warmup": {"connections": self.warmup_connections, "warmed": self.warmed, "errors": self.warmup_errors,
+                       "seconds": self.warmup_seconds},
+        }
+
+    def render(self) -> List[str]:
+        stats = self.stats()
+        return [
+            "# HELP shoe_store_upstream_requests_total Model API requests sent through the shared client",
+            "# TYPE shoe_store_upstream_requests_total counter",
+            f"shoe_store_upstream_requests_total {stats['requests']}",
+            "# HELP shoe_store_upstream_connections_opened_total Connections the shared pool opened",
+            "# TYPE shoe_store_upstream_connections_opened_total counter",
+            f"shoe_store_upstream_connections_opened_total {stats['connections_opened']}",
+            "# HELP shoe_store_upstream_in_flight Model API requests waiting for a response",
+            "# TYPE shoe_store_upstream_in_flight gauge",
+            f"shoe_store_upstream_in_flight {stats['in_flight']}",
+            "# HELP shoe_store_upstream_connections Connections in the shared pool",
+            "# TYPE shoe_store_upstream_connections gauge",
+            f'shoe_store_upstream_connections{{state="open"}} {stats["pool"]["open"]}',
+            f'shoe_store_upstream_connections{{state="idle"}} {stats["pool"]["idle"]}',
+        ]
+
+
+def upstream_client_from_env() -> Optional[UpstreamClient]:
+    """
+    The shared model API client, unless UPSTREAM_POOL=false leaves the agents SDK's default
+    one. UPSTREAM_BASE_URL (default OPENAI_BASE_URL or api.openai.com), UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE, UPSTREAM_KEEPALIVE_EXPIRY, UPSTREAM_TIMEOUT, UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_MAX_RETRIES, UPSTREAM_HTTP2 and UPSTREAM_WARMUP_CONNECTIONS (default 0) configure it.
+    """
+    if os.getenv("UPSTREAM_POOL", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return UpstreamClient(
+        base_url=os.getenv("UPSTREAM_BASE_URL") or None,
+        max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100")),
+        max_keepalive=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60")),
+        timeout=float(os.getenv("UPSTREAM_TIMEOUT", "60")),
+        connect_timeout=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5")),
+        max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "2")),
+        http2=os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes"),
+        warmup_connections=int(os.getenv("UPSTREAM_WARMUP_CONNECTIONS", "0")),
+    )
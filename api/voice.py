@@ -0,0 +1,71 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import numpy as np
+from fastapi import WebSocket
+from agents.voice import StreamedAudioInput, VoicePipeline, VoicePipelineConfig, VoiceWorkflowBase
+
+from cases.shoe_store_case.audio import REALTIME_SAMPLE_RATE, SpeechGate, resample
+
+
+class ConversationVoiceWorkflow(VoiceWorkflowBase):
+    """
+    Voice workflow that sends every transcribed turn through the same chat pipeline as
+    /chat/stream, so voice and text share the user's context, history and session lock.
+    """
+
+    def __init__(self, run_turn: Callable[[str], AsyncIterator[Dict[str, Any]]]):
+        self._run_turn = run_turn
+
+    async def run(self, transcription: str) -> AsyncIterator[str]:
+        async for event in self._run_turn(transcription):
+            if event["event"] == "delta":
+                yield event["data"]["delta"]
+
+
+async def serve_voice_session(websocket: WebSocket, workflow: VoiceWorkflowBase, config: VoicePipelineConfig,
+                              sample_rate: int = REALTIME_SAMPLE_RATE, speech_gate: bool = False):
+    """
+    Runs one realtime voice session over an accepted WebSocket.
+
+    Binary messages from the client are mono int16 PCM frames at `sample_rate`, resampled to
+    24kHz if needed and fed into a StreamedAudioInput; with `speech_gate`, idle audio between
+    utterances is held back instead of being uploaded to the transcription session.
+    A {"event": "end"} text message (or disconnecting) ends the input.
+    Synthesized speech is sent back as binary int16 PCM chunks as soon as each one is produced,
+    with lifecycle and error events sent as JSON text messages.
+    """
+    audio_input = StreamedAudioInput()
+    pipeline = VoicePipeline(workflow=workflow, config=config)
+    result = await pipeline.run(audio_input)
+    gate: Optional[SpeechGate] = SpeechGate(REALTIME_SAMPLE_RATE) if speech_gate else None
+
+    async def receive_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    frames = resample(np.frombuffer(message["bytes"], dtype=np.int16), sample_rate, REALTIME_SAMPLE_RATE)
+                    if gate is not None:
+                        frames = gate.feed(frames)
+                    if frames is not None:
+                        await audio_input.add_audio(frames)
+                elif message.get("text") and json.loads(message["text"]).get("event") == "end":
+                    break
+        finally:
+            await audio_input.add_audio(None)
+
+    receiver = asyncio.create_task(receive_audio())
+    try:
+        async for event in result.stream():
+            if event.type == "voice_stream_event_audio":
+                await websocket.send_bytes(event.data.tobytes())
+            elif event.type == "voice_stream_event_lifecycle":
+                await websocket.send_json({"event": event.event})
+            elif event.type == "voice_stream_event_error":
+                await websocket.send_json({"event": "error", "data": {"detail": str(event.error)}})
+    finally:
+        receiver.cancel()
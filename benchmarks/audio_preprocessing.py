@@ -0,0 +1,183 @@
+"""
+Voice input preprocessing benchmark.
+
+Replays WAV recordings (16-bit PCM, any rate and channel count) through the microphone path
+of the voice CLI in 10ms blocks, as sounddevice would deliver them, and compares what used
+to be uploaded (the whole recording at the device rate) with what is uploaded now (the
+utterance, silence trimmed, 16kHz mono). Reports per recording:
+
+- where speech was detected and when recording stopped by itself
+- upload size before and after
+- preprocessing time, and the time spent per audio callback
+- how much of the stream the /voice/ws speech gate holds back
+
+    python -m benchmarks.audio_preprocessing recordings/*.wav
+    python -m benchmarks.audio_preprocessing --write-fixtures benchmarks/fixtures   # synthetic recordings
+    python -m benchmarks.audio_preprocessing recordings/*.wav --stt    # also time real transcriptions (OPENAI_API_KEY)
+
+Without recordings it synthesizes a few: speech-like bursts with room noise and silence
+around them, at 48kHz and 44.1kHz. They exercise the code, but real recordings are what
+the thresholds should be judged on.
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+import wave
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cases.shoe_store_case.audio import (
+    REALTIME_SAMPLE_RATE,
+    STT_SAMPLE_RATE,
+    SpeechGate,
+    SpeechRecorder,
+    resample,
+    to_mono,
+)
+
+BLOCK_MS = 10
+
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """Samples as (frames, channels) int16, and the sample rate."""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise SystemExit(f"❌ {path}: only 16-bit PCM WAV files are supported")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        return samples.reshape(-1, f.getnchannels()), f.getframerate()
+
+
+def wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1 if samples.ndim == 1 else samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_recordings(seed: int = 1) -> Dict[str, Tuple[np.ndarray, int]]:
+    """Speech-like audio: voiced harmonics under a syllable-rate envelope, between stretches of room noise."""
+    rng = np.random.default_rng(seed)
+
+    def recording(rate: int, lead: float, speech: float, tail: float, noise: float, channels: int = 1) -> np.ndarray:
+        t = np.arange(int(speech * rate)) / rate
+        envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)) ** 2
+        voiced = np.sin(2 * np.pi * 160 * t) + 0.5 * np.sin(2 * np.pi * 320 * t) + 0.3 * rng.standard_normal(len(t))
+        audio = np.concatenate([rng.standard_normal(int(lead * rate)) * noise, voiced * envelope * 5000,
+                                rng.standard_normal(int(tail * rate)) * noise])
+        return np.repeat(audio.astype(np.int16)[:, None], channels, axis=1)
+
+    return {
+        "short_question_48k": (recording(48000, 1.0, 1.5, 3.0, 40), 48000),
+        "long_request_48k_stereo": (recording(48000, 0.5, 6.0, 2.0, 80, channels=2), 48000),
+        "noisy_room_44k": (recording(44100, 2.0, 3.0, 2.0, 200), 44100),
+    }
+
+
+def replay(samples: np.ndarray, sample_rate: int) -> dict:
+    """Feeds a recording to a SpeechRecorder block by block, like a live input stream."""
+    block = sample_rate * BLOCK_MS // 1000
+    recorder = SpeechRecorder(sample_rate)
+    callback_seconds = []
+    stopped_at = len(samples)
+    for offset in range(0, len(samples), block):
+        start = time.perf_counter()
+        recorder.callback(samples[offset:offset + block], block, None, None)
+        callback_seconds.append(time.perf_counter() - start)
+        if recorder.done.is_set():
+            stopped_at = offset + block
+            break
+
+    start = time.perf_counter()
+    utterance = recorder.utterance()
+    preprocess_seconds = time.perf_counter() - start
+
+    vad = recorder.vad
+    return {
+        "duration": len(samples) / sample_rate,
+        "speech_start": vad.speech_start / sample_rate if vad.speech_start is not None else None,
+        "speech_end": vad.speech_end / sample_rate if vad.speech_end is not None else None,
+        "stopped_at": stopped_at / sample_rate,
+        "before_bytes": len(wav_bytes(samples, sample_rate)),
+        "after_bytes": len(wav_bytes(utterance, STT_SAMPLE_RATE)),
+        "utterance_seconds": len(utterance) / STT_SAMPLE_RATE,
+        "preprocess_ms": preprocess_seconds * 1000,
+        "callback_us": statistics.mean(callback_seconds) * 1e6,
+        "utterance": utterance,
+    }
+
+
+def gated_share(samples: np.ndarray, sample_rate: int) -> float:
+    """Share of a recording the /voice/ws speech gate holds back, streamed in 20ms frames at 24kHz."""
+    audio = resample(to_mono(samples), sample_rate, REALTIME_SAMPLE_RATE)
+    gate = SpeechGate(REALTIME_SAMPLE_RATE)
+    frame = REALTIME_SAMPLE_RATE // 50
+    for offset in range(0, len(audio), frame):
+        gate.feed(audio[offset:offset + frame])
+    return 1 - gate.passed / len(audio) if len(audio) else 0.0
+
+
+def transcribe(client, audio: bytes, model: str) -> Tuple[float, str]:
+    start = time.perf_counter()
+    text = client.audio.transcriptions.create(model=model, file=("audio.wav", audio, "audio/wav")).text
+    return time.perf_counter() - start, text
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wavs", nargs="*", help="16-bit PCM WAV recordings to replay")
+    parser.add_argument("--write-fixtures", metavar="DIR", help="Write the synthetic recordings here as WAV files and use them")
+    parser.add_argument("--stt", action="store_true", help="Also time transcribing both versions with the OpenAI API")
+    parser.add_argument("--stt-model", default="gpt-4o-transcribe")
+    args = parser.parse_args(argv)
+
+    if args.wavs:
+        recordings = {os.path.basename(path): read_wav(path) for path in args.wavs}
+    else:
+        recordings = synthetic_recordings()
+        if args.write_fixtures:
+            os.makedirs(args.write_fixtures, exist_ok=True)
+            for name, (samples, rate) in recordings.items():
+                with open(os.path.join(args.write_fixtures, f"{name}.wav"), "wb") as f:
+                    f.write(wav_bytes(samples, rate))
+            print(f"Wrote {len(recordings)} recordings to {args.write_fixtures}")
+        print("Using synthetic recordings (pass WAV files to measure real ones)")
+
+    client = None
+    if args.stt:
+        from openai import OpenAI
+        client = OpenAI()
+
+    kb = lambda size: f"{size / 1024:.0f} KB"
+    totals = [0, 0]
+    for name, (samples, rate) in recordings.items():
+        result = replay(samples, rate)
+        totals[0] += result["before_bytes"]
+        totals[1] += result["after_bytes"]
+        channels = samples.shape[1]
+        print(f"\n{name}: {result['duration']:.1f}s, {rate} Hz, {channels} channel{'s' if channels > 1 else ''}")
+        if result["speech_start"] is None:
+            print(f"  ❌ no speech detected, gave up at {result['stopped_at']:.1f}s")
+            continue
+        end = f"{result['speech_end']:.2f}s" if result["speech_end"] is not None else "not detected"
+        print(f"  speech {result['speech_start']:.2f}s to {end}, recording stopped at {result['stopped_at']:.2f}s")
+        print(f"  upload {kb(result['before_bytes'])} -> {kb(result['after_bytes'])} "
+              f"({result['utterance_seconds']:.1f}s at 16kHz mono, {result['after_bytes'] / result['before_bytes']:.0%})")
+        print(f"  preprocess {result['preprocess_ms']:.2f} ms, {result['callback_us']:.0f} µs per {BLOCK_MS}ms callback, "
+              f"speech gate holds back {gated_share(samples, rate):.0%} of the stream")
+        if client is not None:
+            before_seconds, before_text = transcribe(client, wav_bytes(samples, rate), args.stt_model)
+            after_seconds, after_text = transcribe(client, wav_bytes(result["utterance"], STT_SAMPLE_RATE), args.stt_model)
+            print(f"  transcription {before_seconds * 1000:.0f} ms -> {after_seconds * 1000:.0f} ms")
+            print(f"    before: {before_text!r}\n    after:  {after_text!r}")
+
+    print(f"\n✅ Total upload {kb(totals[0])} -> {kb(totals[1])} ({totals[1] / totals[0]:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Model calls and tokens for multi-item requests: one-item tools vs batched tools.
+
+Runs dialogues where one message names several items or orders ("Add two small running
+and one large walking, and check ORD1001 and ORD1004") through each topology, built once
+with the one-item tools (add_to_cart, lookup_order, view_cart + get_cart_total) and once
+with the batched ones (add_items_to_cart, lookup_orders, view_cart_and_total). The fake
+model calls one-item tools once per item, each call a model round trip that re-sends the
+conversation so far, and batched tools once per request.
+
+Exits non-zero if the batched tools don't take fewer model calls in every topology, or if
+the two variants leave different carts behind.
+
+    python -m benchmarks.batch_tools --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import RunConfig, Runner
+
+from benchmarks.fake_model import FakeModelProvider
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+from cases.shoe_store_case.tools import cart_store
+
+DIALOGUES = {
+    "multi_add": ["Add two small running and one large walking to my cart", "Show my cart and the total"],
+    "multi_order": ["Can you check orders ORD1001, ORD1002 and ORD1004?"],
+    "mixed": ["Add two small running and one large walking, and check ORD1001 and ORD1004", "What's my cart total?"],
+}
+
+
+async def run_variant(topology: str, batched: bool, latency: float) -> dict:
+    agent = build_shoe_store_agent(topology, "fake-model", batched_tools=batched)
+    provider = FakeModelProvider(latency)
+    run_config = RunConfig(model_provider=provider, tracing_disabled=True)
+    turns, tool_calls, carts = 0, 0, {}
+    start = time.perf_counter()
+    for name, messages in DIALOGUES.items():
+        user_id = f"batch-{topology}-{'batched' if batched else 'single'}-{name}"
+        cart_store.clear(user_id)
+        context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+        input_items = []
+        for message in messages:
+            input_items.append({"content": message, "role": "user"})
+            result = await Runner.run(agent, input_items, context=context, run_config=run_config)
+            input_items = result.to_input_list()
+        turns += len(messages)
+        tool_calls += sum(1 for item in input_items if item.get("type") == "function_call")
+        carts[name] = sorted((line.product, line.size, line.quantity) for line in cart_store.lines(user_id))
+    model = provider.model
+    return {
+        "turns": turns,
+        "calls": model.calls,
+        "tool_calls": tool_calls,
+        "input_tokens": model.input_tokens,
+        "output_tokens": model.output_tokens,
+        "seconds": time.perf_counter() - start,
+        "carts": carts,
+    }
+
+
+async def run(latency: float) -> List[str]:
+    problems = []
+    print(f"Fake model latency {latency * 1000:.0f} ms/call; {sum(map(len, DIALOGUES.values()))} turns per run")
+    print(f"{'topology':<10}{'tools':<9}{'calls':>7}{'tool calls':>12}{'in tokens':>11}{'out tokens':>12}{'ms/turn':>9}")
+    for topology in TOPOLOGIES:
+        single = await run_variant(topology, False, latency)
+        batched = await run_variant(topology, True, latency)
+        for label, stats in (("single", single), ("batched", batched)):
+            print(f"{topology:<10}{label:<9}{stats['calls']:>7}{stats['tool_calls']:>12}{stats['input_tokens']:>11}"
+                  f"{stats['output_tokens']:>12}{stats['seconds'] / stats['turns'] * 1000:>9.0f}")
+        saved_calls = 1 - batched["calls"] / single["calls"]
+        saved_tokens = 1 - batched["input_tokens"] / single["input_tokens"]
+        print(f"{'':<10}{'saved':<9}{saved_calls:>7.0%}{'':>12}{saved_tokens:>11.0%}\n")
+        if batched["calls"] >= single["calls"]:
+            problems.append(f"{topology}: batched tools took {batched['calls']} model calls, one-item tools {single['calls']}")
+        for name, cart in single["carts"].items():
+            if batched["carts"][name] != cart:
+                problems.append(f"{topology}/{name}: cart {batched['carts'][name]} with batched tools, {cart} without")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    args = parser.parse_args(argv)
+    problems = asyncio.run(run(args.latency))
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Batched tools take fewer model calls and leave the same carts")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+CartStore micro-benchmark.
+
+Fills 100k carts from several threads (sync tools run in worker threads), then times adds, quantity
+updates, totals and checkouts, and compares them with the old list-of-dicts carts. Those
+neither lock nor normalize product and size names, so they add and update faster; CartStore
+wins on totals, checkout and memory. Also checks that no item is lost when threads add to
+a cart while it is being checked out.
+
+    python -m benchmarks.cart_store --carts 100000 --threads 8
+"""
+import argparse
+import random
+import threading
+import time
+import tracemalloc
+
+from cases.shoe_store_case.cart_store import CartStore
+
+PRODUCTS = [("running", 8999), ("walking", 6999)]
+SIZES = ["small", "medium", "large"]
+
+
+class ListCarts:
+    """The previous carts: a list of item dicts per user, scanned on every operation."""
+
+    def __init__(self):
+        self.carts = {}
+
+    def add(self, user_id, product, size, quantity, unit_price_cents):
+        cart = self.carts.get(user_id, [])
+        for item in cart:
+            if item["product"] == product and item["size"] == size:
+                item["quantity"] += quantity
+                break
+        else:
+            cart.append({"product": product, "size": size, "quantity": quantity, "unit_price": unit_price_cents / 100})
+        self.carts[user_id] = cart
+
+    def set_quantity(self, user_id, product, size, quantity):
+        cart = self.carts.get(user_id, [])
+        for i, item in enumerate(cart):
+            if item["product"] == product and item["size"] == size:
+                if quantity > 0:
+                    item["quantity"] = quantity
+                else:
+                    cart.pop(i)
+                return item
+        return None
+
+    def total_cents(self, user_id):
+        return round(sum(item["unit_price"] * item["quantity"] for item in self.carts.get(user_id, [])) * 100)
+
+    def checkout(self, user_id):
+        cart = self.carts.get(user_id, [])
+        total = self.total_cents(user_id)
+        self.carts[user_id] = []
+        return cart, total
+
+
+def _operations(carts: int, lines_per_cart: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [(f"user-{i}", *rng.choice(PRODUCTS), rng.choice(SIZES)) for i in range(carts) for _ in range(lines_per_cart)]
+
+
+def _timed(threads: int, fn, items) -> float:
+    """Runs `fn` over `items` split into one contiguous shard per thread; returns wall time."""
+    shards = [items[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=lambda shard=shard: [fn(item) for item in shard]) for shard in shards]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def _memory_per_cart(store_factory, operations, carts: int) -> float:
+    tracemalloc.start()
+    store = store_factory()
+    for user_id, product, price, size in operations:
+        store.add(user_id, product, size, 1, price)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory / carts
+
+
+def bench(name: str, store_factory, carts: int, lines_per_cart: int, threads: int):
+    operations = _operations(carts, lines_per_cart)
+    users = [f"user-{i}" for i in range(carts)]
+    store = store_factory()
+
+    add = _timed(threads, lambda op: store.add(op[0], op[1], op[3], 1, op[2]), operations)
+    modify = _timed(threads, lambda op: store.set_quantity(op[0], op[1], op[3], 3), operations)
+    total = _timed(threads, store.total_cents, users)
+    checkout = _timed(threads, store.checkout, users)
+    memory = _memory_per_cart(store_factory, operations, carts)
+
+    per_op = lambda seconds, count: f"{seconds / count * 1e6:9.2f} µs"
+    print(f"{name:<10}{per_op(add, len(operations))}{per_op(modify, len(operations))}"
+          f"{per_op(total, carts)}{per_op(checkout, carts)}{memory:>10.0f} B")
+
+
+def check_atomic_checkout(threads: int, rounds: int = 2000):
+    """Adds from several threads while another checks out; every unit must end up in exactly one checkout."""
+    store = CartStore()
+    checked_out = 0
+    stop = threading.Event()
+
+    def checkouts():
+        nonlocal checked_out
+        while not stop.is_set():
+            lines, _ = store.checkout("racer")
+            checked_out += sum(line.quantity for line in lines)
+
+    def adds():
+        for _ in range(rounds):
+            store.add("racer", "running", "small", 1, 8999)
+
+    checker = threading.Thread(target=checkouts)
+    checker.start()
+    _timed(threads, lambda _: adds(), list(range(threads)))
+    stop.set()
+    checker.join()
+    checked_out += sum(line.quantity for line in store.checkout("racer")[0])
+
+    expected = threads * rounds
+    status = "ok" if checked_out == expected else "LOST ITEMS"
+    print(f"Atomic checkout: {checked_out}/{expected} units accounted for ({status})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--carts", type=int, default=100_000)
+    parser.add_argument("--lines", type=int, default=6, help="Items added per cart")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only benchmark CartStore")
+    args = parser.parse_args()
+
+    print(f"{args.carts} carts, {args.lines} adds per cart, {args.threads} threads")
+    print(f"{'store':<10}{'add':>12}{'modify':>12}{'total':>12}{'checkout':>12}{'mem/cart':>12}")
+    bench("CartStore", CartStore, args.carts, args.lines, args.threads)
+    if not args.skip_legacy:
+        bench("list", ListCarts, args.carts, args.lines, args.threads)
+    check_atomic_checkout(args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Record/replay of model calls ("cassettes") for offline regression runs of agent dialogues.
+
+A CassetteModelProvider that wraps a provider (the real one or the fake one) records:
+every model call made by the agent graph is forwarded, and its response is appended to the
+cassette together with a hash of the normalized request. Without a provider it replays,
+and no model is called. Each request is answered from the cassette:
+
+- by its exact request hash;
+- failing that (the request drifted), by position: the n-th call under the same label.
+
+Both modes record what the code under test actually sent: call count, estimated prompt
+tokens and the tool calls it got back. benchmarks.dialogue_cost compares those figures
+between runs.
+
+Cassettes are JSONL, one call per line, holding the request hash, a few request figures and
+the response output and usage. Prompts are not stored. Paths ending in .gz are gzipped.
+"""
+import gzip
+import hashlib
+import json
+import re
+from collections import defaultdict, deque
+from itertools import count
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from agents import Model, ModelProvider, ModelResponse, Usage
+from agents.tracing import response_span
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseOutputItem,
+    ResponseOutputMessage,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+from pydantic import TypeAdapter
+
+OUTPUT_ITEM = TypeAdapter(ResponseOutputItem)
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request."""
+
+
+def _plain(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def normalize_input(input) -> list:
+    """
+    Input items without what changes from run to run but not between equivalent requests:
+    item ids are dropped and call ids renumbered in order of appearance.
+    """
+    items = [{"role": "user", "content": input}] if isinstance(input, str) else _plain(list(input))
+    call_ids: Dict[str, str] = {}
+    normalized = []
+    for item in items:
+        if isinstance(item, dict):
+            item = {key: value for key, value in item.items() if key != "id"}
+            if "call_id" in item:
+                item["call_id"] = call_ids.setdefault(item["call_id"], f"call_{len(call_ids) + 1}")
+        normalized.append(item)
+    return normalized
+
+
+def request_fingerprint(system_instructions, input, model_settings, tools, output_schema, handoffs) -> Tuple[str, int]:
+    """The normalized request's hash, and its estimated prompt tokens (characters / 4, as the fake model counts)."""
+    definitions = [(tool.name, getattr(tool, "description", None), getattr(tool, "params_json_schema", None))
+                   for tool in tools]
+    definitions += [(handoff.tool_name, handoff.tool_description, handoff.input_json_schema) for handoff in handoffs]
+    items = normalize_input(input)
+    request = {
+        "instructions": system_instructions,
+        "input": items,
+        "tools": definitions,
+        "output_schema": output_schema.json_schema() if output_schema and not output_schema.is_plain_text() else None,
+        "settings": model_settings.to_json_dict(),
+    }
+    encoded = json.dumps(request, sort_keys=True, default=str)
+    prompt = json.dumps([system_instructions, items, definitions], default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16], max(1, len(prompt) // 4)
+
+
+def _tool_calls(output: List[dict]) -> List[str]:
+    return [item["name"] for item in output if item.get("type") == "function_call"]
+
+
+class Cassette:
+    """
+    Recorded model calls, plus the calls observed in the current run.
+
+    `label` tags the calls that follow (e.g. "checkout:2" for the third turn of the checkout
+    dialogue); replay uses it to match a drifted request by position.
+    """
+
+    def __init__(self, interactions: Optional[List[dict]] = None):
+        self.interactions: List[dict] = interactions or []
+        self.observed: List[dict] = []
+        self.label = ""
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_label: Dict[str, List[int]] = defaultdict(list)
+        for index, interaction in enumerate(self.interactions):
+            self._by_key[interaction["key"]].append(index)
+            self._by_label[interaction["label"]].append(index)
+        self._label_calls: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def save(self, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt") as f:
+            for interaction in self.interactions:
+                f.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+    def _observe(self, key: str, prompt_tokens: int, output: List[dict], match: str):
+        self.observed.append({"label": self.label, "key": key, "prompt_tokens": prompt_tokens,
+                              "tool_calls": _tool_calls(output), "match": match})
+
+    def record(self, model_name: str, key: str, prompt_tokens: int, stream: bool, output: List[dict], usage: dict):
+        self.interactions.append({"label": self.label, "key": key, "model": model_name, "stream": stream,
+                                  "prompt_tokens": prompt_tokens, "output": output, "usage": usage})
+        self._label_calls[self.label] += 1
+        self._observe(key, prompt_tokens, output, "recorded")
+
+    def play(self, key: str, prompt_tokens: int) -> dict:
+        position = self._label_calls[self.label]
+        self._label_calls[self.label] += 1
+        queue = self._by_key.get(key)
+        if queue:
+            interaction, match = self.interactions[queue.popleft()], "exact"
+        elif position < len(self._by_label[self.label]):
+            interaction, match = self.interactions[self._by_label[self.label][position]], "position"
+        else:
+            raise CassetteMiss(f"no recorded response for call {position + 1} of {self.label or 'the run'} (request {key})")
+        self._observe(key, prompt_tokens, interaction["output"], match)
+        return interaction
+
+
+def _usage(response_usage) -> dict:
+    if response_usage is None:
+        return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    return {"input_tokens": response_usage.input_tokens, "output_tokens": response_usage.output_tokens,
+            "total_tokens": response_usage.total_tokens}
+
+
+class CassetteModel(Model):
+    def __init__(self, model_name: str, cassette: Cassette, model: Optional[Model] = None):
+        self.model_name = model_name
+        self.cassette = cassette
+        self.model = model
+        self._ids = count(1)
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs) -> ModelResponse:
+        key, prompt_tokens = request_fingerprint(system_instructions, input, model_settings, tools, output_schema, handoffs)
+        if self.model is not None:
+            response = await self.model.get_response(system_instructions, input, model_settings, tools, output_schema,
+                                                     handoffs, tracing, **kwargs)
+            self.cassette.record(self.model_name, key, prompt_tokens, False, _plain(response.output), _usage(response.usage))
+            return response
+
+        interaction = self.cassette.play(key, prompt_tokens)
+        with response_span(disabled=tracing.is_disabled()) as span:
+            span.span_data.usage = {"requests": 1, **interaction["usage"]}
+        return ModelResponse(output=[OUTPUT_ITEM.validate_python(item) for item in interaction["output"]],
+                             usage=Usage(requests=1, **interaction["usage"]), response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs) -> AsyncIterator[Any]:
+        key, prompt_tokens = request_fingerprint(system_instructions, input, model_settings, tools, output_schema, handoffs)
+        if self.model is not None:
+            async for event in self.model.stream_response(system_instructions, input, model_settings, tools,
+                                                          output_schema, handoffs, tracing, **kwargs):
+                if event.type == "response.completed":
+                    self.cassette.record(self.model_name, key, prompt_tokens, True, _plain(event.response.output),
+                                         _usage(event.response.usage))
+                yield event
+            return
+
+        interaction = self.cassette.play(key, prompt_tokens)
+        output = [OUTPUT_ITEM.validate_python(item) for item in interaction["output"]]
+        with response_span(disabled=tracing.is_disabled()) as span:
+            span.span_data.usage = {"requests": 1, **interaction["usage"]}
+            response = Response(id=f"resp_replay_{next(self._ids)}", created_at=0, model=self.model_name,
+                                object="response", output=[], tool_choice="auto", tools=[],
+                                parallel_tool_calls=False, status="in_progress")
+            sequence = count()
+            yield ResponseCreatedEvent(type="response.created", response=response, sequence_number=next(sequence))
+            for output_index, item in enumerate(output):
+                if not isinstance(item, ResponseOutputMessage):
+                    continue
+                for content_index, part in enumerate(item.content):
+                    for word in re.findall(r"\S+\s*", getattr(part, "text", "")):
+                        yield ResponseTextDeltaEvent(type="response.output_text.delta", item_id=item.id,
+                                                     output_index=output_index, content_index=content_index,
+                                                     delta=word, logprobs=[], sequence_number=next(sequence))
+            usage = ResponseUsage(
+                **interaction["usage"],
+                input_tokens_details=InputTokensDetails.model_validate({"cached_tokens": 0, "cache_write_tokens": 0}),
+                output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+            )
+            completed = response.model_copy(update={"output": output, "status": "completed", "usage": usage})
+            yield ResponseCompletedEvent(type="response.completed", response=completed, sequence_number=next(sequence))
+
+    def get_retry_advice(self, request):
+        return self.model.get_retry_advice(request) if self.model is not None else None
+
+    async def close(self):
+        if self.model is not None:
+            await self.model.close()
+
+
+class CassetteModelProvider(ModelProvider):
+    """
+    Records the calls made through `provider` into `cassette`, or, without a provider,
+    replays them from it.
+    """
+
+    def __init__(self, cassette: Cassette, provider: Optional[ModelProvider] = None):
+        self.cassette = cassette
+        self.provider = provider
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        model = self.provider.get_model(model_name) if self.provider is not None else None
+        return CassetteModel(model_name or "default", self.cassette, model)
+
+    async def aclose(self):
+        if self.provider is not None:
+            await self.provider.aclose()
@@ -0,0 +1,139 @@
+"""
+Catalog engine benchmark.
+
+Generates a synthetic catalog with thousands of products (three sizes each) as JSON or CSV,
+then reports load time, search and get_product_info latency against the old approach
+(json.dumps of the products dict on every call), and how long queries take while the file
+is being hot-reloaded.
+
+    python -m benchmarks.catalog --products 5000 --format csv
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from cases.shoe_store_case.catalog import Catalog
+
+STYLES = ["running", "trail", "walking", "hiking", "tennis", "basketball", "casual", "dress", "sandal", "boot"]
+TRAITS = ["lightweight", "cushioned", "waterproof", "breathable", "grippy", "wide", "vegan", "leather", "knit", "retro"]
+SIZES = ["Small", "Medium", "Large"]
+QUERIES = ["trail runners size M", "waterproof hiking boots", "lightweight running", "leather dress shoes size L",
+           "walkng shoes", "basketbal", "vegan casual", "retro tennis size small", "None"]
+
+
+def generate(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        style, trait = rng.choice(STYLES), rng.choice(TRAITS)
+        key = f"{trait}-{style}-{i}"
+        products.append({
+            "key": key,
+            "name": f"{trait.title()} {style.title()} {i}",
+            "category": style,
+            "description": f"{trait.title()} {style} shoes, model {i}.",
+            "tags": rng.sample(TRAITS, 2),
+            "price": round(rng.uniform(39, 199), 2),
+            "currency": "USD",
+            "variants": [{"sku": f"SKU{i}-{size[0]}", "size": size, "stock": rng.randint(0, 50)} for size in SIZES],
+        })
+    return products
+
+
+def write(products: list, fmt: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    with os.fdopen(fd, "w", newline="") as f:
+        if fmt == "json":
+            json.dump(products, f)
+        else:
+            writer = csv.writer(f)
+            writer.writerow(["key", "name", "category", "description", "tags", "price", "currency", "sku", "size", "stock"])
+            for p in products:
+                for v in p["variants"]:
+                    writer.writerow([p["key"], p["name"], p["category"], p["description"], "|".join(p["tags"]),
+                                     p["price"], p["currency"], v["sku"], v["size"], v["stock"]])
+    return path
+
+
+def legacy_describe(products: dict, product_type: str) -> str:
+    """The original get_product_info: substring checks, then json.dumps(indent=4) on every call."""
+    product_type = product_type.lower()
+    for key in products:
+        if key in product_type:
+            return json.dumps(products[key], indent=4)
+    return json.dumps(products, indent=4)
+
+
+def timed(fn, queries, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summary(samples: list) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {statistics.median(samples) * 1e6:9.1f} µs   p99 {p99 * 1e6:9.1f} µs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--mmap", action="store_true", help="Read the catalog file through a memory map")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    products = generate(args.products)
+    path = write(products, args.format)
+    try:
+        start = time.perf_counter()
+        catalog = Catalog(path, use_mmap=args.mmap)
+        load = time.perf_counter() - start
+        stats = catalog.stats()
+        print(f"{stats['products']} products, {stats['variants']} variants from {args.format.upper()}"
+              f"{' (mmap)' if args.mmap else ''}: loaded and indexed in {load * 1000:.0f} ms, {stats['index_terms']} index terms")
+
+        legacy = {p["key"]: {k: p[k] for k in ("description", "price", "currency")} | {"sizes": SIZES} for p in products}
+        print(f"{'search':<24}{summary(timed(catalog.search, QUERIES, args.repeat))}")
+        print(f"{'describe':<24}{summary(timed(catalog.describe, QUERIES, args.repeat))}")
+        print(f"{'legacy json.dumps':<24}{summary(timed(lambda q: legacy_describe(legacy, q), QUERIES, max(1, args.repeat // 10)))}")
+
+        # Query continuously while the file is rewritten and reloaded in the background
+        products[0]["price"] = 1.0
+        write_path = write(products, args.format)
+        os.replace(write_path, path)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        during = []
+        reloaded = threading.Event()
+
+        def reload():
+            start = time.perf_counter()
+            catalog.reload_if_changed()
+            during.append(("reload", time.perf_counter() - start))
+            reloaded.set()
+
+        thread = threading.Thread(target=reload)
+        thread.start()
+        samples = []
+        while not reloaded.is_set():
+            samples += timed(catalog.describe, QUERIES, 1)
+        thread.join()
+        print(f"{'describe during reload':<24}{summary(samples)}   ({len(samples)} queries, "
+              f"reload took {during[0][1] * 1000:.0f} ms, now version {catalog.version})")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
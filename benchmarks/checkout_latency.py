@@ -0,0 +1,70 @@
+"""
+Checkout latency with receipts going through the email outbox.
+
+Runs checkout turns (flat topology, fake model) against a local SMTP stub with a slow
+server, and reports checkout latency next to the time it took the background worker to
+deliver all receipts and how many SMTP connections it needed.
+
+    python -m benchmarks.checkout_latency --checkouts 50 --smtp-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+from agents import RunConfig, Runner
+
+from benchmarks.fake_model import FakeModelProvider
+from benchmarks.smtp_stub import SMTPStub
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import build_shoe_store_agent
+from cases.shoe_store_case.outbox import SMTPConfig
+from cases.shoe_store_case.tools import cart_store, email_worker
+
+
+async def run(checkouts: int, smtp_delay: float, concurrency: int):
+    stub = SMTPStub(delay=smtp_delay)
+    port = await stub.start()
+    email_worker.config = SMTPConfig(host="127.0.0.1", port=port, sender="store@example.com", starttls=False)
+    email_worker.start()
+
+    agent = build_shoe_store_agent("flat", "fake-model")
+    run_config = RunConfig(model_provider=FakeModelProvider(), tracing_disabled=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def checkout(i: int):
+        user_id = f"checkout-{i}"
+        cart_store.add(user_id, "running", "medium", 1, 8999)
+        async with semaphore:
+            start = time.perf_counter()
+            await Runner.run(agent, "Checkout please", context=UserContext(user_id, f"{user_id}@example.com"),
+                             run_config=run_config)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[checkout(i) for i in range(checkouts)])
+    checkouts_done = time.perf_counter() - start
+    while len(stub.messages) < checkouts:
+        await asyncio.sleep(0.01)
+    delivered = time.perf_counter() - start
+
+    await email_worker.stop()
+    await stub.stop()
+
+    print(f"{checkouts} checkouts, SMTP stub delay {smtp_delay * 1000:.0f} ms per reply")
+    print(f"Checkout latency: median {statistics.median(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+    print(f"All checkouts done in {checkouts_done:.2f}s, all receipts delivered in {delivered:.2f}s")
+    print(f"SMTP connections opened: {stub.connections} ({email_worker.stats()})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkouts", type=int, default=50)
+    parser.add_argument("--smtp-delay", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.checkouts, args.smtp_delay, args.concurrency))
@@ -0,0 +1,100 @@
+"""
+Writes per turn of the SQLite conversation store once histories reach the token budget.
+
+Runs --sessions conversations of --turns turns each (a user message, a tool call and its
+output, and the answer) through SQLiteConversationStore, once trimming an over-budget
+history to just under the budget (--compact-to 1.0, the old behaviour) and once with
+headroom (--compact-to, default 0.75). It reports how many turns rewrote their session,
+the items written per turn and the time per turn.
+
+Exits non-zero if, with headroom, more than a third of the turns after a session's first
+compaction rewrite it, or if it writes no fewer items than trimming to the budget.
+
+    python -m benchmarks.conversation_store --sessions 50 --turns 80 --budget 4000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from api.conversation_store import SQLiteConversationStore
+
+
+def _turn(index: int) -> List[dict]:
+    call_id = f"call_{index}"
+    return [
+        {"role": "user", "content": f"Turn {index}: do you have running shoes in medium, and what does my cart hold?"},
+        {"type": "function_call", "call_id": call_id, "name": "get_product_info", "arguments": '{"product_type": "running"}'},
+        {"type": "function_call_output", "call_id": call_id,
+         "output": "Running Shoes - $89.99 USD. Lightweight shoes for road running. Sizes: Small, Medium, Large."},
+        {"role": "assistant", "content": "Yes, the Running Shoes come in medium for $89.99. Want me to add a pair?"},
+    ]
+
+
+def run_variant(path: str, args, compact_to: float) -> dict:
+    store = SQLiteConversationStore(path, max_sessions=args.sessions * 2, token_budget=args.budget,
+                                    compact_to=compact_to)
+    rewrites_after_first = turns_after_first = 0
+    start = time.perf_counter()
+    for session in range(args.sessions):
+        key = f"session-{session}"
+        compacted = False
+        for index in range(args.turns):
+            rewrites = store.rewrites
+            store.set(key, store.get(key) + _turn(index))
+            rewrote = store.rewrites > rewrites
+            if compacted:
+                turns_after_first += 1
+                rewrites_after_first += rewrote
+            compacted = compacted or rewrote
+    seconds = time.perf_counter() - start
+    turns = args.sessions * args.turns
+    return {
+        "compact_to": compact_to,
+        "rewrites": store.rewrites,
+        "rewrite_share": rewrites_after_first / turns_after_first if turns_after_first else 0.0,
+        "items_per_turn": store.items_written / turns,
+        "ms_per_turn": seconds / turns * 1000,
+    }
+
+
+def run(args) -> List[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        trimmed = run_variant(os.path.join(tmp, "trimmed.db"), args, 1.0)
+        headroom = run_variant(os.path.join(tmp, "headroom.db"), args, args.compact_to)
+
+    print(f"{args.sessions} sessions x {args.turns} turns, token budget {args.budget}")
+    print(f"{'compact to':<12}{'rewrites':>10}{'rewriting turns':>17}{'items/turn':>12}{'ms/turn':>9}")
+    for result in (trimmed, headroom):
+        print(f"{result['compact_to']:<12.0%}{result['rewrites']:>10}{result['rewrite_share']:>17.0%}"
+              f"{result['items_per_turn']:>12.1f}{result['ms_per_turn']:>9.2f}")
+
+    problems = []
+    if headroom["rewrite_share"] > 1 / 3:
+        problems.append(f"{headroom['rewrite_share']:.0%} of the turns after the first compaction rewrote "
+                        f"their session with compact-to {args.compact_to}")
+    if headroom["items_per_turn"] >= trimmed["items_per_turn"]:
+        problems.append(f"compacting to {args.compact_to:.0%} wrote {headroom['items_per_turn']:.1f} items/turn, "
+                        f"trimming to the budget {trimmed['items_per_turn']:.1f}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=80)
+    parser.add_argument("--budget", type=int, default=4000, help="Token budget per session")
+    parser.add_argument("--compact-to", type=float, default=0.75, help="Fraction of the budget to compact to")
+    args = parser.parse_args(argv)
+    problems = run(args)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Past the budget, most turns only append their items")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
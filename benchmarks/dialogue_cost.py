@@ -0,0 +1,179 @@
+"""
+Cost profile of scripted dialogues through the agent graph, recorded once and replayed offline.
+
+`record` runs each dialogue against a model and saves every model call to a cassette, plus
+the dialogue's cost profile as a baseline: model calls, estimated prompt tokens and the
+sequence of tool calls. The model is the fake one by default, or the real one with --live.
+`replay` runs the same dialogues against the cassette: no model calls, no cost,
+deterministic. It compares the new profile with the baseline and exits non-zero on drift:
+
+- a different number of model calls (an extra hop through a sub-agent, a retry)
+- prompt tokens up by more than --tolerance (bloated instructions, tool schemas or outputs)
+- a different tool call sequence
+
+    python -m benchmarks.dialogue_cost record --live --cassette benchmarks/cassettes/shoe_store.jsonl.gz
+    python -m benchmarks.dialogue_cost replay --cassette benchmarks/cassettes/shoe_store.jsonl.gz
+    python -m benchmarks.dialogue_cost replay --update     # accept the current profile as the new baseline
+
+Dialogues default to the load test's. --dialogues takes a JSON object of name -> messages,
+or a JSONL file in the /chat/batch format (one dialogue per session), so real conversations
+can be pinned too. Requests that changed since recording are answered by position within
+their dialogue turn and reported, so the run continues and the report shows where the drift
+is. Replay is only as faithful as the recorded answers: once the graph asks for something
+else, re-record.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import RunConfig, Runner
+
+from api.batch import parse_batch
+from benchmarks.cassette import Cassette, CassetteMiss, CassetteModelProvider
+from benchmarks.fake_model import FakeModelProvider
+from benchmarks.load_test import DIALOGUES
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+from cases.shoe_store_case.tools import cart_store
+
+DEFAULT_CASSETTE = "benchmarks/cassettes/shoe_store.jsonl"
+
+
+def load_dialogues(path: Optional[str]) -> Dict[str, List[str]]:
+    if path is None:
+        return DIALOGUES
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return {session.user_id: [turn.message for turn in session.turns] for session in parse_batch(f)}
+        return json.load(f)
+
+
+async def run_dialogues(agent, provider: CassetteModelProvider, dialogues: Dict[str, List[str]]) -> Dict[str, dict]:
+    run_config = RunConfig(model_provider=provider, tracing_disabled=True)
+    cassette = provider.cassette
+    errors = {}
+    for name, messages in dialogues.items():
+        user_id = f"cassette-{name}"
+        cart_store.clear(user_id)
+        context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+        input_items = []
+        for turn, message in enumerate(messages):
+            cassette.label = f"{name}:{turn}"
+            input_items.append({"content": message, "role": "user"})
+            try:
+                result = await Runner.run(agent, input_items, context=context, run_config=run_config)
+            except CassetteMiss as e:
+                errors[name] = str(e)
+                break
+            except Exception as e:
+                # A replayed answer the drifted graph can't take (e.g. a tool it no longer has)
+                errors[name] = f"turn {turn}: {type(e).__name__}: {e}"
+                break
+            input_items = result.to_input_list()
+    return profile(cassette.observed, dialogues, errors)
+
+
+def profile(observed: List[dict], dialogues: Dict[str, List[str]], errors: Dict[str, str]) -> Dict[str, dict]:
+    """Per dialogue: model calls, estimated prompt tokens, tool call sequence and how calls were matched."""
+    profiles = {}
+    for name, messages in dialogues.items():
+        calls = [call for call in observed if call["label"].rsplit(":", 1)[0] == name]
+        profiles[name] = {
+            "turns": len(messages),
+            "calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "max_prompt_tokens": max((call["prompt_tokens"] for call in calls), default=0),
+            "tool_calls": [tool for call in calls for tool in call["tool_calls"]],
+            "matches": dict(Counter(call["match"] for call in calls)),
+            **({"error": errors[name]} if name in errors else {}),
+        }
+    return profiles
+
+
+def drift(baseline: Dict[str, dict], current: Dict[str, dict], tolerance: float) -> List[str]:
+    problems = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            problems.append(f"{name}: not in the baseline")
+            continue
+        if "error" in now:
+            problems.append(f"{name}: {now['error']}")
+        if now["calls"] != before["calls"]:
+            problems.append(f"{name}: {before['calls']} -> {now['calls']} model calls")
+        if before["prompt_tokens"] and now["prompt_tokens"] > before["prompt_tokens"] * (1 + tolerance):
+            problems.append(f"{name}: prompt tokens {before['prompt_tokens']} -> {now['prompt_tokens']} "
+                            f"(+{now['prompt_tokens'] / before['prompt_tokens'] - 1:.0%})")
+        if now["tool_calls"] != before["tool_calls"]:
+            problems.append(f"{name}: tool calls {before['tool_calls']} -> {now['tool_calls']}")
+    problems += [f"{name}: in the baseline but not run" for name in baseline if name not in current]
+    return problems
+
+
+def print_profile(profiles: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None):
+    print(f"{'dialogue':<16}{'turns':>6}{'calls':>7}{'prompt tokens':>15}{'baseline':>10}  tool calls")
+    for name, now in profiles.items():
+        before = (baseline or {}).get(name, {}).get("prompt_tokens")
+        changed = now["matches"].get("position", 0)
+        print(f"{name:<16}{now['turns']:>6}{now['calls']:>7}{now['prompt_tokens']:>15}"
+              f"{before if before is not None else '-':>10}  {', '.join(now['tool_calls']) or '-'}"
+              f"{f'  ({changed} changed requests)' if changed else ''}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--baseline", help="Profile to compare with (default: next to the cassette)")
+    parser.add_argument("--dialogues", help="JSON {name: [messages]} or /chat/batch JSONL")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=os.getenv("AGENT_TOPOLOGY", "nested"))
+    parser.add_argument("--model", default=os.getenv("MODEL_CHOICE", "gpt-4o-mini"))
+    parser.add_argument("--live", action="store_true", help="Record against the real model (needs OPENAI_API_KEY)")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed prompt token growth before it counts as drift")
+    parser.add_argument("--update", action="store_true", help="On replay, save the current profile as the baseline")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or args.cassette.removesuffix(".gz").removesuffix(".jsonl") + ".profile.json"
+    dialogues = load_dialogues(args.dialogues)
+    agent = build_shoe_store_agent(args.topology, args.model)
+
+    if args.mode == "record":
+        from agents import OpenAIProvider
+
+        provider = CassetteModelProvider(Cassette(), OpenAIProvider() if args.live else FakeModelProvider())
+        profiles = asyncio.run(run_dialogues(agent, provider, dialogues))
+        os.makedirs(os.path.dirname(args.cassette) or ".", exist_ok=True)
+        provider.cassette.save(args.cassette)
+        with open(baseline_path, "w") as f:
+            json.dump(profiles, f, indent=2)
+        print_profile(profiles)
+        print(f"✅ Recorded {len(provider.cassette.interactions)} model calls to {args.cassette}, baseline {baseline_path}")
+        return 0
+
+    provider = CassetteModelProvider(Cassette.load(args.cassette))
+    profiles = asyncio.run(run_dialogues(agent, provider, dialogues))
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print_profile(profiles, baseline)
+    if args.update:
+        with open(baseline_path, "w") as f:
+            json.dump(profiles, f, indent=2)
+        print(f"✅ Baseline updated: {baseline_path}")
+        return 0
+    problems = drift(baseline, profiles, args.tolerance)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ No drift from the baseline")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+import asyncio
+import json
+import random
+import re
+from itertools import count
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from agents import Model, ModelProvider, ModelResponse, ModelSettings, ModelTracing, Usage
+from agents.tracing import response_span
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseCreatedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+from cases.shoe_store_case.tool_output import SNAPSHOT_HEADER
+
+ORDER_ID_PATTERN = re.compile(r"\bORD\d+\b", re.IGNORECASE)
+PRODUCTS = ("running", "walking")
+SIZES = ("small", "medium", "large")
+QUANTITY_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+# "2 medium running", "two small running", "one pair of large walking"
+ITEM_PATTERN = re.compile(
+    rf"\b(\d+|{'|'.join(QUANTITY_WORDS)})\s+(?:pairs?\s+of\s+)?({'|'.join(SIZES)})\s+({'|'.join(PRODUCTS)})\b"
+)
+
+
+def _text_of(item: Any) -> str:
+    content = item.get("content", "")
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def _last_user_text(items: list) -> str:
+    for item in reversed(items):
+        if isinstance(item, dict) and item.get("role") == "user":
+            return _text_of(item)
+    return ""
+
+
+def _steps_since_user(items: list, include_handoffs: bool = True) -> int:
+    """How many model turns (tool calls) the current user request has already taken."""
+    steps = 0
+    for item in reversed(items):
+        if isinstance(item, dict) and item.get("role") == "user":
+            break
+        if isinstance(item, dict) and item.get("type") == "function_call":
+            if include_handoffs or not str(item.get("name", "")).startswith("transfer_to_"):
+                steps += 1
+    return steps
+
+
+def _outputs_since_user(items: list) -> List[str]:
+    """Tool outputs returned for the current user request, handoffs excluded."""
+    outputs = []
+    for item in reversed(items):
+        if isinstance(item, dict) and item.get("role") == "user":
+            break
+        if isinstance(item, dict) and item.get("type") == "function_call_output" and not _is_handoff_output(items, item):
+            output = item.get("output")
+            outputs.append(output if isinstance(output, str) else json.dumps(output, default=str))
+    return outputs[::-1]
+
+
+def load_script(path: str) -> Dict[str, List[dict]]:
+    """
+    Reads a script file: a JSON object mapping a user message to the steps the model takes
+    for it, e.g. {"Checkout please": [{"tool": "generate_receipt"}, {"message": "Done!"}]}.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _pick_intent(text: str) -> Optional[str]:
+    text = text.lower()
+    if ORDER_ID_PATTERN.search(text) or ("order" in text and "status" in text):
+        return "order"
+    if any(word in text for word in ("checkout", "check out", "receipt", "place my order")):
+        return "checkout"
+    if any(word in text for word in ("add", "cart", "remove", "total", "change")):
+        return "cart"
+    if any(word in text for word in ("shoe", "sell", "price", "product", "cost") + PRODUCTS):
+        return "product"
+    return None
+
+
+def _pick_intents(text: str) -> List[str]:
+    """The request's intents in the order they are served: an order check can come with items to add."""
+    intent = _pick_intent(text)
+    if intent == "order" and ITEM_PATTERN.search(text.lower()):
+        return ["order", "cart"]
+    return [intent] if intent else []
+
+
+def _cart_items(text: str) -> List[dict]:
+    """Every "<quantity> <size> <product>" in the text, or the single item the rules guess."""
+    items = [{"product": product, "size": size,
+              "quantity": int(quantity) if quantity.isdigit() else QUANTITY_WORDS[quantity]}
+             for quantity, size, product in ITEM_PATTERN.findall(text.lower())]
+    return items or [_tool_arguments("add_to_cart", {"properties": {"product": {}, "size": {}, "quantity": {}}}, text)]
+
+
+def _order_ids(text: str) -> List[str]:
+    return list(dict.fromkeys(order_id.upper() for order_id in ORDER_ID_PATTERN.findall(text)))
+
+
+def _cart_tool(text: str) -> str:
+    text = text.lower()
+    if "remove" in text or "change" in text:
+        return "modify_cart_item"
+    if "add" in text:
+        return "add_to_cart"
+    if "total" in text and not any(word in text for word in ("show", "view", "what's in", "items")):
+        return "get_cart_total"
+    return "view_cart"
+
+
+def _plan(intents: List[str], text: str, offered: dict) -> List[tuple]:
+    """
+    The (tool name, arguments) calls that serve the request with the tools offered, one model
+    turn each. One-item tools take a call per item or order; the batched ones
+    (add_items_to_cart, lookup_orders, view_cart_and_total) take one call for all of them.
+    """
+    plan = []
+    for intent in intents:
+        name = next((name for name in _candidate_tools(intent, text) if name in offered), None)
+        if name is None:
+            continue
+        schema = offered[name].params_json_schema
+        if set(schema.get("properties", {})) == {"input"}:
+            plan.append((name, {"input": text}))
+        elif name == "lookup_orders":
+            plan.append((name, {"order_ids": _order_ids(text)}))
+        elif name == "add_items_to_cart":
+            plan.append((name, {"items": _cart_items(text)}))
+        elif name == "lookup_order" and len(_order_ids(text)) > 1:
+            plan += [(name, {"order_id": order_id}) for order_id in _order_ids(text)]
+        elif name == "add_to_cart" and len(_cart_items(text)) > 1:
+            plan += [(name, item) for item in _cart_items(text)]
+        elif name == "view_cart" and "total" in text.lower() and "get_cart_total" in offered:
+            plan += [(name, {}), ("get_cart_total", {})]
+        else:
+            plan.append((name, _tool_arguments(name, schema, text)))
+    return plan
+
+
+def _snapshot_lines(system_instructions: Optional[str]) -> Optional[List[str]]:
+    """The lines of the customer state snapshot at the end of the instructions, if there is one."""
+    if not system_instructions or SNAPSHOT_HEADER not in system_instructions:
+        return None
+    return system_instructions.rsplit(SNAPSHOT_HEADER, 1)[1].splitlines()[1:]
+
+
+def _from_snapshot(intent: str, text: str, snapshot: List[str]) -> Optional[List[str]]:
+    """
+    The snapshot lines that answer a read-only intent (viewing the cart or its total, checking
+    listed or recent orders), or None when it takes a tool call.
+    """
+    if intent == "cart" and _cart_tool(text) in ("view_cart", "get_cart_total"):
+        return [line for line in snapshot if line.startswith(("cart:", "total:"))]
+    if intent == "order":
+        orders = [line for line in snapshot if line.startswith(("ORD", "orders:"))]
+        order_ids = _order_ids(text)
+        if not order_ids:
+            return orders
+        listed = [line for line in orders if line.split(":", 1)[0] in order_ids]
+        return listed if len(listed) == len(order_ids) else None
+    return None
+
+
+def _candidate_tools(intent: Optional[str], text: str) -> list[str]:
+    """Tool names (function tools or agents-as-tools) that serve an intent, most specific first."""
+    if intent == "cart":
+        tool = _cart_tool(text)
+        batched = {"add_to_cart": "add_items_to_cart", "view_cart": "view_cart_and_total",
+                   "get_cart_total": "view_cart_and_total"}.get(tool)
+        return [batched, tool, "cart_management"] if batched else [tool, "cart_management"]
+    return {
+        "order": ["lookup_orders", "lookup_order"],
+        "product": ["get_product_info"],
+        "checkout": ["generate_receipt"],
+    }.get(intent, [])
+
+
+# Specialist agent reached through a handoff for each intent (handoff topology)
+HANDOFF_AGENTS = {
+    "order": "Order Agent",
+    "product": "Product Agent",
+    "cart": "Cart Assistant",
+    "checkout": "Checkout Agent",
+}
+
+
+def _is_handoff_output(items: list, output_item: dict) -> bool:
+    """Whether a function call output answers a transfer_to_* handoff call."""
+    for item in items:
+        if isinstance(item, dict) and item.get("type") == "function_call" and item.get("call_id") == output_item.get("call_id"):
+            return str(item.get("name", "")).startswith("transfer_to_")
+    return False
+
+
+def _is_tool_result(items: list, item: Any) -> bool:
+    return isinstance(item, dict) and item.get("type") == "function_call_output" and not _is_handoff_output(items, item)
+
+
+def _tool_arguments(tool_name: str, schema: dict, text: str) -> dict:
+    """Builds plausible arguments for a shoe store tool from the user's text."""
+    properties = schema.get("properties", {})
+    if set(properties) == {"input"}:
+        return {"input": text}
+
+    lowered = text.lower()
+    product = next((p for p in PRODUCTS if p in lowered), "running")
+    size = next((s for s in SIZES if s in lowered), "medium")
+    quantity = next((int(n) for n in re.findall(r"\b(\d+)\b", lowered)), 1)
+    order_id = ORDER_ID_PATTERN.search(text)
+
+    arguments = {
+        "order_id": order_id.group(0).upper() if order_id else "",
+        "product_type": next((p for p in PRODUCTS if p in lowered), "None"),
+        "product": product,
+        "size": size,
+        "quantity": 0 if "remove" in lowered else quantity,
+    }
+    return {name: arguments[name] for name in properties if name in arguments}
+
+
+class FakeModel(Model):
+    """
+    Deterministic, rule-based stand-in for an OpenAI model.
+
+    It picks a tool from the ones offered using keyword rules on the latest user message,
+    answers with a templated message once a tool output comes back, and sleeps for
+    `latency` seconds per call (plus up to `jitter` more, `prefill_delay` per 1000 prompt
+    tokens and `token_delay` per word of reply text, streamed or not) to mimic upstream timing. When the
+    instructions end with a customer state snapshot, cart and order reads it covers are
+    answered from it without a tool call.
+
+    A `script` maps user messages to the exact steps to take instead: each step is either
+    {"tool": name, "arguments": {...}} or {"message": text}, taken in order as tool outputs
+    come back. Steps naming a tool the current agent doesn't offer fall back to the rules.
+    """
+
+    def __init__(self, name: str = "fake-model", latency: float = 0.0, token_delay: float = 0.0,
+                 jitter: float = 0.0, script: Optional[Dict[str, List[dict]]] = None, seed: int = 0,
+                 prefill_delay: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+        self.jitter = jitter
+        self.script = {message.strip().lower(): steps for message, steps in (script or {}).items()}
+        self.calls = 0
+        self.scripted_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._ids = count(1)
+        self._random = random.Random(seed)
+
+    async def _wait(self, prompt_tokens: int):
+        await asyncio.sleep(self.latency + self.prefill_delay * prompt_tokens / 1000
+                            + (self._random.uniform(0, self.jitter) if self.jitter else 0.0))
+
+    def _scripted(self, items: list, tools, handoffs) -> Optional[list]:
+        steps = self.script.get(_last_user_text(items).strip().lower())
+        if not steps:
+            return None
+        index = _steps_since_user(items)
+        if index >= len(steps):
+            return None
+        step = steps[index]
+        if "message" in step:
+            return [self._message(step["message"])]
+        offered = {getattr(tool, "name", None) for tool in tools} | {handoff.tool_name for handoff in handoffs}
+        if step["tool"] in offered:
+            return [self._function_call(step["tool"], step.get("arguments", {}))]
+        return None
+
+    def _decide(self, input, tools, handoffs, system_instructions: Optional[str] = None) -> tuple[list, int]:
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else list(input)
+        # Tool and handoff definitions are part of every real prompt too
+        definitions = [(t.name, t.description, t.params_json_schema) for t in tools if hasattr(t, "params_json_schema")]
+        definitions += [(h.tool_name, h.tool_description, h.input_json_schema) for h in handoffs]
+        prompt_tokens = _estimate_tokens(json.dumps(items, default=str)) + _estimate_tokens(json.dumps(definitions))
+        last = items[-1] if items else {}
+
+        scripted = self._scripted(items, tools, handoffs)
+        if scripted is not None:
+            self.scripted_calls += 1
+            return scripted, prompt_tokens
+
+        # Tools are called one per turn until the plan is done, then the results are answered;
+        # after a handoff the new agent acts on the user's request
+        text = _last_user_text(items)
+        intents = _pick_intents(text)
+        # What the state snapshot in the instructions already answers takes no tool call
+        snapshot = _snapshot_lines(system_instructions)
+        answered: List[str] = []
+        if snapshot is not None:
+            for intent in list(intents):
+                lines = _from_snapshot(intent, text, snapshot)
+                if lines is not None:
+                    intents.remove(intent)
+                    answered += lines
+        offered = {tool.name: tool for tool in tools if hasattr(tool, "params_json_schema")}
+        plan = _plan(intents, text, offered)
+        step = _steps_since_user(items, include_handoffs=False)
+        if step < len(plan):
+            name, arguments = plan[step]
+            return [self._function_call(name, arguments)], prompt_tokens
+        if _is_tool_result(items, last) or (answered and not intents):
+            found = _outputs_since_user(items) + answered
+            return [self._message(f"Here's what I found: {' '.join(found)}")], prompt_tokens
+        for handoff in handoffs:
+            if intents and handoff.agent_name == HANDOFF_AGENTS[intents[0]]:
+                return [self._function_call(handoff.tool_name, {})], prompt_tokens
+
+        return [self._message("Hi, I'm Freddie from EOcean Shoe Store. How can I help you today?")], prompt_tokens
+
+    def _message(self, text: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=f"msg_{next(self._ids)}",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+        )
+
+    def _function_call(self, name: str, arguments: dict) -> ResponseFunctionToolCall:
+        call_id = f"call_{next(self._ids)}"
+        return ResponseFunctionToolCall(
+            id=call_id, call_id=call_id, type="function_call", name=name, arguments=json.dumps(arguments)
+        )
+
+    @staticmethod
+    def _output_tokens(output: list) -> int:
+        return sum(_estimate_tokens(item.model_dump_json()) for item in output)
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings: ModelSettings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+        *,
+        previous_response_id=None,
+        conversation_id=None,
+        prompt=None,
+    ) -> ModelResponse:
+        self.calls += 1
+        # Like the real Responses model, each call is a response span carrying its token usage
+        with response_span(disabled=tracing.is_disabled()) as span:
+            output, prompt_tokens = self._decide(input, tools, handoffs, system_instructions)
+            prompt_tokens += _estimate_tokens(system_instructions or "")
+            await self._wait(prompt_tokens)
+            # Unstreamed, the whole reply is generated before anything comes back
+            await asyncio.sleep(self.token_delay * sum(len(re.findall(r"\S+\s*", item.content[0].text))
+                                                       for item in output if isinstance(item, ResponseOutputMessage)))
+            output_tokens = self._output_tokens(output)
+            self.input_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            span.span_data.usage = {"requests": 1, "input_tokens": prompt_tokens, "output_tokens": output_tokens}
+        usage = Usage(
+            requests=1,
+            input_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            total_tokens=prompt_tokens + output_tokens,
+        )
+        return ModelResponse(output=output, usage=usage, response_id=None)
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings: ModelSettings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+        *,
+        previous_response_id=None,
+        conversation_id=None,
+        prompt=None,
+    ) -> AsyncIterator[Any]:
+        self.calls += 1
+        with response_span(disabled=tracing.is_disabled()) as span:
+            output, prompt_tokens = self._decide(input, tools, handoffs, system_instructions)
+            prompt_tokens += _estimate_tokens(system_instructions or "")
+            await self._wait(prompt_tokens)
+            output_tokens = self._output_tokens(output)
+            self.input_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            span.span_data.usage = {"requests": 1, "input_tokens": prompt_tokens, "output_tokens": output_tokens}
+
+            response = Response(
+                id=f"resp_{next(self._ids)}",
+                created_at=0,
+                model=self.name,
+                object="response",
+                output=[],
+                tool_choice="auto",
+                tools=[],
+                parallel_tool_calls=False,
+                status="in_progress",
+            )
+            sequence = count()
+            yield ResponseCreatedEvent(type="response.created", response=response, sequence_number=next(sequence))
+
+            for output_index, item in enumerate(output):
+                if not isinstance(item, ResponseOutputMessage):
+                    continue
+                for word in re.findall(r"\S+\s*", item.content[0].text):
+                    await asyncio.sleep(self.token_delay)
+                    yield ResponseTextDeltaEvent(
+                        type="response.output_text.delta",
+                        item_id=item.id,
+                        output_index=output_index,
+                        content_index=0,
+                        delta=word,
+                        logprobs=[],
+                        sequence_number=next(sequence),
+                    )
+
+            completed = response.model_copy(
+                update={
+                    "output": output,
+                    "status": "completed",
+                    "usage": ResponseUsage(
+                        input_tokens=prompt_tokens,
+                        output_tokens=output_tokens,
+                        total_tokens=prompt_tokens + output_tokens,
+                        input_tokens_details=InputTokensDetails.model_validate({"cached_tokens": 0, "cache_write_tokens": 0}),
+                        output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+                    ),
+                }
+            )
+            yield ResponseCompletedEvent(type="response.completed", response=completed, sequence_number=next(sequence))
+
+
+class FakeModelProvider(ModelProvider):
+    """Serves the same FakeModel for every model name so the whole agent graph runs offline."""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, jitter: float = 0.0,
+                 script: Optional[Dict[str, List[dict]]] = None, seed: int = 0, prefill_delay: float = 0.0):
+        self.model = FakeModel(latency=latency, token_delay=token_delay, jitter=jitter, script=script, seed=seed,
+                               prefill_delay=prefill_delay)
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return self.model
@@ -0,0 +1,98 @@
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+from agents.voice import (
+    AudioInput,
+    STTModel,
+    STTModelSettings,
+    StreamedAudioInput,
+    StreamedTranscriptionSession,
+    TTSModel,
+    TTSModelSettings,
+    VoiceModelProvider,
+)
+
+# 24kHz mono int16, the format OpenAI TTS produces
+TTS_SAMPLE_RATE = 24000
+
+
+class FakeTranscriptionSession(StreamedTranscriptionSession):
+    """Emits the next scripted transcript whenever an all-silent frame follows some speech."""
+
+    def __init__(self, input: StreamedAudioInput, transcripts: List[str], latency: float):
+        self._queue = input.queue
+        self._transcripts = transcripts
+        self._latency = latency
+
+    async def transcribe_turns(self) -> AsyncIterator[str]:
+        turn = 0
+        heard_speech = False
+        while True:
+            frame = await self._queue.get()
+            if frame is None:
+                return
+            if frame.any():
+                heard_speech = True
+            elif heard_speech:
+                await asyncio.sleep(self._latency)
+                yield self._transcripts[turn % len(self._transcripts)]
+                turn += 1
+                heard_speech = False
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeSTTModel(STTModel):
+    def __init__(self, transcripts: List[str], latency: float):
+        self.transcripts = transcripts
+        self.latency = latency
+
+    @property
+    def model_name(self) -> str:
+        return "fake-stt"
+
+    async def transcribe(self, input: AudioInput, settings: STTModelSettings,
+                         trace_include_sensitive_data: bool, trace_include_sensitive_audio_data: bool) -> str:
+        await asyncio.sleep(self.latency)
+        return self.transcripts[0]
+
+    async def create_session(self, input: StreamedAudioInput, settings: STTModelSettings,
+                             trace_include_sensitive_data: bool,
+                             trace_include_sensitive_audio_data: bool) -> StreamedTranscriptionSession:
+        return FakeTranscriptionSession(input, self.transcripts, self.latency)
+
+
+class FakeTTSModel(TTSModel):
+    """Produces 100ms of quiet noise per `chunk_delay` for roughly every 10 characters of text."""
+
+    def __init__(self, latency: float, chunk_delay: float):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    @property
+    def model_name(self) -> str:
+        return "fake-tts"
+
+    async def run(self, text: str, settings: TTSModelSettings) -> AsyncIterator[bytes]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        chunk = (np.random.default_rng(len(text)).integers(-300, 300, TTS_SAMPLE_RATE // 10)).astype(np.int16)
+        for _ in range(max(1, len(text) // 10)):
+            await asyncio.sleep(self.chunk_delay)
+            yield chunk.tobytes()
+
+
+class FakeVoiceModelProvider(VoiceModelProvider):
+    def __init__(self, transcripts: Optional[List[str]] = None, stt_latency: float = 0.0,
+                 tts_latency: float = 0.0, chunk_delay: float = 0.0):
+        self.stt = FakeSTTModel(transcripts or ["What shoes do you sell?"], stt_latency)
+        self.tts = FakeTTSModel(tts_latency, chunk_delay)
+
+    def get_stt_model(self, model_name: Optional[str]) -> STTModel:
+        return self.stt
+
+    def get_tts_model(self, model_name: Optional[str]) -> TTSModel:
+        return self.tts
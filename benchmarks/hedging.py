@@ -0,0 +1,193 @@
+"""
+Per-agent model tiering and hedged model calls under injected slow and failing calls.
+
+Runs single-turn requests through the nested agent graph with the fake model behind a
+FlakyModelProvider, which gives each model name its own base latency and makes a share of
+calls slow (--slow-rate, --slow-delay extra seconds) or fail (--error-rate) before they
+answer. The fallback model is healthy. Three setups are compared:
+
+- single model: every agent on the main model
+- tiered: the specialists on the faster sub-agent model
+- tiered + hedging: as tiered, through ModelHedger with a fallback model
+
+For each it reports turn latency percentiles and failed turns, and for the hedged setup how
+many calls were hedged, won by the hedge or sent to the fallback. Exits non-zero if tiering
+doesn't lower the median, or hedging doesn't lower the p99 and the failed turns.
+
+    python -m benchmarks.hedging --turns 200 --slow-rate 0.05 --error-rate 0.03
+    python -m benchmarks.hedging --stream
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import Model, ModelProvider, ModelResponse, RunConfig, Runner
+
+from api.hedging import ModelHedger
+from benchmarks.fake_model import FakeModelProvider
+from benchmarks.load_test import DIALOGUES, percentile
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import AGENT_ROLES, build_shoe_store_agent
+
+MAIN_MODEL, SUBAGENT_MODEL, FALLBACK_MODEL = "main-model", "subagent-model", "fallback-model"
+
+
+class InjectedFailure(ConnectionError):
+    """A model call failed on purpose."""
+
+
+class FlakyModel(Model):
+    def __init__(self, model: Model, latency: float, faults: Optional["FlakyModelProvider"]):
+        self.model = model
+        self.latency = latency
+        self.faults = faults
+
+    async def _delay(self):
+        extra = 0.0
+        if self.faults is not None:
+            roll = self.faults.random.random()
+            if roll < self.faults.error_rate:
+                self.faults.failed += 1
+                await asyncio.sleep(self.latency / 2)
+                raise InjectedFailure("injected model failure")
+            if roll < self.faults.error_rate + self.faults.slow_rate:
+                self.faults.slowed += 1
+                extra = self.faults.slow_delay
+        await asyncio.sleep(self.latency + extra)
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        await self._delay()
+        return await self.model.get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+        await self._delay()
+        async for event in self.model.stream_response(*args, **kwargs):
+            yield event
+
+
+class FlakyModelProvider(ModelProvider):
+    """
+    The fake model with a base latency per model name; every model but `healthy` fails
+    `error_rate` of its calls and is `slow_delay` seconds slower on `slow_rate` of them.
+    """
+
+    def __init__(self, latencies: Dict[str, float], slow_rate: float, slow_delay: float, error_rate: float,
+                 healthy: str = FALLBACK_MODEL, seed: int = 0):
+        self.provider = FakeModelProvider()
+        self.latencies = latencies
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate
+        self.healthy = healthy
+        self.random = random.Random(seed)
+        self.slowed = 0
+        self.failed = 0
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return FlakyModel(self.provider.get_model(model_name), self.latencies.get(model_name, 0.1),
+                          None if model_name == self.healthy else self)
+
+
+async def run_setup(name: str, args, agent_models: Dict[str, str], hedger: Optional[ModelHedger]) -> dict:
+    agent = build_shoe_store_agent("nested", MAIN_MODEL, agent_models=agent_models)
+    provider = FlakyModelProvider({MAIN_MODEL: args.latency, SUBAGENT_MODEL: args.subagent_latency,
+                                   FALLBACK_MODEL: args.latency}, args.slow_rate, args.slow_delay, args.error_rate,
+                                  seed=args.seed)
+    run_config = RunConfig(model_provider=hedger.wrap(provider) if hedger else provider, tracing_disabled=True)
+    messages = [message for dialogue in DIALOGUES.values() for message in dialogue]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def turn(index: int):
+        nonlocal failures
+        user_id = f"hedging-{name}-{index}"
+        context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+        message = messages[index % len(messages)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if args.stream:
+                    result = Runner.run_streamed(agent, message, context=context, run_config=run_config)
+                    async for _ in result.stream_events():
+                        pass
+                else:
+                    await Runner.run(agent, message, context=context, run_config=run_config)
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(turn(index) for index in range(args.turns)))
+    return {"name": name, "latencies": latencies, "failures": failures, "slowed": provider.slowed,
+            "failed_calls": provider.failed, "hedger": hedger.stats() if hedger else None}
+
+
+async def run(args) -> List[str]:
+    tiered = {role: SUBAGENT_MODEL for role in AGENT_ROLES[1:]}
+    hedger = ModelHedger(percentile=args.percentile, min_delay=args.min_delay, min_samples=20,
+                         max_ratio=args.max_ratio, timeout=args.timeout, fallback=FALLBACK_MODEL)
+    results = [
+        await run_setup("single model", args, {}, None),
+        await run_setup("tiered", args, tiered, None),
+        await run_setup("tiered + hedging", args, tiered, hedger),
+    ]
+
+    ms = lambda seconds: f"{seconds * 1000:7.0f} ms"
+    print(f"{args.turns} {'streamed ' if args.stream else ''}turns, {args.concurrency} at a time; main model "
+          f"{args.latency * 1000:.0f} ms, sub-agent model {args.subagent_latency * 1000:.0f} ms per call; "
+          f"{args.slow_rate:.0%} of calls {args.slow_delay:g}s slower, {args.error_rate:.0%} failing")
+    print(f"{'':<18}{'p50':>11}{'p95':>11}{'p99':>11}{'failed turns':>14}{'slow calls':>12}{'failed calls':>14}")
+    for result in results:
+        latencies = result["latencies"] or [0.0]
+        print(f"{result['name']:<18}{ms(percentile(latencies, 50)):>11}{ms(percentile(latencies, 95)):>11}"
+              f"{ms(percentile(latencies, 99)):>11}{result['failures']:>14}{result['slowed']:>12}{result['failed_calls']:>14}")
+    stats = results[-1]["hedger"]
+    print(f"Hedger: {stats['calls']} calls, {stats['hedges']} hedged ({stats['hedge_wins']} won by the hedge), "
+          f"{stats['timeouts']} timed out, {stats['fallbacks']} sent to {stats['fallback_model']}")
+
+    single, tiered_only, hedged = results
+    p99 = lambda result: percentile(result["latencies"], 99)
+    problems = []
+    if percentile(tiered_only["latencies"], 50) >= percentile(single["latencies"], 50):
+        problems.append("tiering did not lower the median turn latency")
+    if p99(hedged) >= p99(tiered_only):
+        problems.append(f"hedging did not lower the p99 ({ms(p99(tiered_only))} -> {ms(p99(hedged))})")
+    if tiered_only["failures"] and hedged["failures"] >= tiered_only["failures"]:
+        problems.append(f"the fallback did not reduce failed turns ({tiered_only['failures']} -> {hedged['failures']})")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="Stream the turns (hedges the time to first event)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per main model call")
+    parser.add_argument("--subagent-latency", type=float, default=0.08, help="Seconds per sub-agent model call")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    parser.add_argument("--percentile", type=float, default=95, help="Latency percentile after which a call is hedged")
+    parser.add_argument("--min-delay", type=float, default=0.05, help="Never hedge sooner than this many seconds")
+    parser.add_argument("--max-ratio", type=float, default=0.1, help="Most hedges as a share of calls")
+    parser.add_argument("--timeout", type=float, default=1.5, help="Seconds before a call goes to the fallback model")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    problems = asyncio.run(run(args))
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Tiering lowers the median; hedging and the fallback cut the tail and the failed turns")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+HTTP load test for the chat API against the local fake model.
+
+Starts `api.main:app` under uvicorn in a child process (with the fake model provider and
+an event-loop lag probe), then drives it with N concurrent simulated users, each running
+browse / add-to-cart / checkout dialogues with think time between turns. Reports
+throughput, latency percentiles, event-loop lag and the server's memory.
+
+    python -m benchmarks.load_test --users 50 --duration 30 --latency 0.3 --jitter 0.2
+    python -m benchmarks.load_test --users 20 --endpoint stream --json baseline.json
+    python -m benchmarks.load_test --topology flat --script benchmarks/load_script.json
+
+The numbers are a baseline for the server's own overhead: model time is whatever
+--latency/--jitter say it is.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+# api.main reads its configuration at import time, so only the server process may import it
+from benchmarks.fake_model import load_script
+
+DIALOGUES = {
+    "browse": ["What shoes do you sell?", "How much are the walking shoes?", "Tell me about running shoes"],
+    "add_to_cart": ["Do you have trail runners size M?", "Add 2 medium running shoes to my cart",
+                    "Add 1 large walking shoe", "What's my cart total?", "Show my cart"],
+    "checkout": ["Add 1 small running shoe to my cart", "What's my cart total?", "Checkout please"],
+    "order": ["Where is my order ORD1003?", "What is the status of order ORD1001?"],
+}
+DEFAULT_MIX = {"browse": 4, "add_to_cart": 3, "checkout": 2, "order": 1}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def serve(port: int, options: dict):
+    """Child process: the API with the fake model provider, plus a lag probe and a stats route."""
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ.update(options.get("env") or {})
+    if options.get("topology"):
+        os.environ["AGENT_TOPOLOGY"] = options["topology"]
+    if options.get("trace_metrics"):
+        # Local span metrics only; nothing is exported to the OpenAI dashboard
+        os.environ["TRACE_METRICS"] = "true"
+        os.environ["OPENAI_TRACE_EXPORT"] = "false"
+
+    import uvicorn
+    from agents import RunConfig
+
+    import api.main
+    from benchmarks.fake_model import FakeModelProvider
+
+    provider = FakeModelProvider(options["latency"], options["token_delay"], options["jitter"],
+                                 script=options.get("script"), seed=options["seed"])
+    api.main.run_config = RunConfig(model_provider=provider, tracing_disabled=not options.get("trace_metrics"))
+    lags: List[float] = []
+    probes = []
+
+    async def probe(interval: float = 0.01):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    @api.main.app.get("/_bench/stats")
+    async def bench_stats(reset: bool = False):
+        # The app's lifespan is already taken, so the probe starts with the first stats request
+        if not probes:
+            probes.append(asyncio.create_task(probe()))
+        rss = _rss_bytes()
+        stats = {
+            "lag_p50": percentile(lags, 50),
+            "lag_p99": percentile(lags, 99),
+            "lag_max": max(lags, default=0.0),
+            "rss_bytes": rss,
+            "max_rss_bytes": max(rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+            "model_calls": provider.model.calls,
+        }
+        if reset:
+            lags.clear()
+        return stats
+
+    uvicorn.run(api.main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_tokens: List[float] = []
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.dialogues = 0
+
+    @property
+    def requests(self) -> int:
+        return sum(len(samples) for samples in self.latencies.values())
+
+
+async def _turn(client: httpx.AsyncClient, endpoint: str, payload: dict, results: Results, dialogue: str):
+    start = time.perf_counter()
+    try:
+        if endpoint == "text":
+            response = await client.post("/chat/text", json=payload)
+            response.raise_for_status()
+        else:
+            async with client.stream("POST", "/chat/stream", json=payload) as response:
+                response.raise_for_status()
+                first = None
+                async for line in response.aiter_lines():
+                    if first is None and line == "event: delta":
+                        first = time.perf_counter() - start
+                    elif line == "event: error":
+                        raise RuntimeError("error event")
+                if first is not None:
+                    results.first_tokens.append(first)
+    except (httpx.HTTPError, RuntimeError) as e:
+        results.errors[type(e).__name__ if not isinstance(e, httpx.HTTPStatusError) else str(e.response.status_code)] += 1
+        return
+    results.latencies[dialogue].append(time.perf_counter() - start)
+
+
+async def _user(index: int, client: httpx.AsyncClient, args, deadline: float, results: Results):
+    rng = random.Random(args.seed + index)
+    names, weights = zip(*DEFAULT_MIX.items())
+    dialogue_number = 0
+    while time.perf_counter() < deadline:
+        dialogue = rng.choices(names, weights)[0]
+        user_id = f"load-{index}-{dialogue_number}"
+        dialogue_number += 1
+        for message in DIALOGUES[dialogue]:
+            if time.perf_counter() >= deadline:
+                return
+            payload = {"message": message, "user_id": user_id, "email": f"{user_id}@example.com"}
+            await _turn(client, args.endpoint, payload, results, dialogue)
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+        results.dialogues += 1
+
+
+async def _wait_until_up(client: httpx.AsyncClient, process: multiprocessing.Process, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if not process.is_alive():
+            raise RuntimeError("API server process exited during startup")
+        try:
+            await client.get("/_bench/stats")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("API server did not start in time")
+
+
+async def run(args) -> dict:
+    options = {
+        "latency": args.latency, "jitter": args.jitter, "token_delay": args.token_delay, "seed": args.seed,
+        "topology": args.topology, "script": load_script(args.script) if args.script else None,
+        "trace_metrics": args.trace_metrics,
+    }
+    port = _free_port()
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(port, options), daemon=True)
+    process.start()
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+            await _wait_until_up(client, process)
+            baseline = (await client.get("/_bench/stats", params={"reset": True})).json()
+            results = Results()
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*[_user(i, client, args, deadline, results) for i in range(args.users)])
+            elapsed = time.perf_counter() - start
+            server = (await client.get("/_bench/stats")).json()
+    finally:
+        process.terminate()
+        process.join()
+
+    everything = [sample for samples in results.latencies.values() for sample in samples]
+    report = {
+        "users": args.users,
+        "endpoint": args.endpoint,
+        "topology": args.topology or "nested",
+        "trace_metrics": args.trace_metrics,
+        "model_latency": args.latency,
+        "model_jitter": args.jitter,
+        "duration_seconds": elapsed,
+        "requests": results.requests,
+        "dialogues": results.dialogues,
+        "errors": dict(results.errors),
+        "rps": results.requests / elapsed if elapsed else 0.0,
+        "latency": {f"p{q}": percentile(everything, q) for q in (50, 95, 99)},
+        "latency_by_dialogue": {
+            name: {f"p{q}": percentile(samples, q) for q in (50, 95, 99)} for name, samples in results.latencies.items()
+        },
+        "first_token": {f"p{q}": percentile(results.first_tokens, q) for q in (50, 95, 99)} if results.first_tokens else None,
+        "event_loop_lag": {"p50": server["lag_p50"], "p99": server["lag_p99"], "max": server["lag_max"]},
+        "rss_bytes": {"start": baseline["rss_bytes"], "end": server["rss_bytes"], "peak": server["max_rss_bytes"]},
+        "model_calls": server["model_calls"] - baseline["model_calls"],
+    }
+    return report
+
+
+def print_report(report: dict):
+    ms = lambda seconds: f"{seconds * 1000:8.1f} ms"
+    mb = lambda size: f"{size / 2**20:.1f} MB"
+    print(f"{report['users']} users on /chat/{report['endpoint']} ({report['topology']} topology"
+          f"{', trace metrics on' if report['trace_metrics'] else ''}), fake model "
+          f"{report['model_latency'] * 1000:.0f} ms + up to {report['model_jitter'] * 1000:.0f} ms jitter per call")
+    print(f"{report['requests']} requests ({report['dialogues']} dialogues, {report['model_calls']} model calls) "
+          f"in {report['duration_seconds']:.1f}s: {report['rps']:.1f} req/s, errors {report['errors'] or 0}")
+    print(f"{'':<14}{'p50':>11}{'p95':>11}{'p99':>11}")
+    rows = [("all", report["latency"])] + sorted(report["latency_by_dialogue"].items())
+    if report["first_token"]:
+        rows.append(("first token", report["first_token"]))
+    for name, latency in rows:
+        print(f"{name:<14}{ms(latency['p50'])}{ms(latency['p95'])}{ms(latency['p99'])}")
+    lag = report["event_loop_lag"]
+    print(f"Event loop lag: p50 {lag['p50'] * 1000:.2f} ms, p99 {lag['p99'] * 1000:.2f} ms, max {lag['max'] * 1000:.2f} ms")
+    rss = report["rss_bytes"]
+    print(f"Server RSS: {mb(rss['start'])} at start, {mb(rss['end'])} at end, peak {mb(rss['peak'])}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to generate load for")
+    parser.add_argument("--endpoint", choices=["text", "stream"], default="text")
+    parser.add_argument("--topology", choices=["flat", "nested", "handoff"], help="AGENT_TOPOLOGY for the server")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per fake model call")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra random seconds per fake model call, up to")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per streamed word")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds a user waits between turns")
+    parser.add_argument("--trace-metrics", action="store_true", help="Enable tracing with the /metrics span processor")
+    parser.add_argument("--script", help="JSON file mapping user messages to scripted model steps")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
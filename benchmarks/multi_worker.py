@@ -0,0 +1,241 @@
+"""
+Multi-worker consistency check.
+
+Starts several API worker processes (fake model, flat topology) that share carts, orders,
+conversations and the receipt outbox through SQLite, with cross-process session locks.
+Each simulated user's turns then go round-robin to a different worker, including two
+turns sent to two workers at the same moment. At the end the check verifies:
+
+- every reply saw the cart as the previous turns left it
+- each user has exactly one order with the right lines
+- each receipt was emailed exactly once
+- each conversation history holds every message in order
+
+    python -m benchmarks.multi_worker --workers 4 --users 20
+    python -m benchmarks.multi_worker --memory     # process-local stores: expect failures
+
+Every worker is its own process on its own port. That is what `uvicorn --workers N`
+runs, minus the shared socket. Pinning turns to workers makes "the next request lands
+on another worker" deterministic. Exits non-zero when any check fails.
+"""
+import argparse
+import asyncio
+import email
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_test import _free_port, _wait_until_up, serve
+from benchmarks.smtp_stub import SMTPStub
+from cases.shoe_store_case.cart_store import format_cents
+from cases.shoe_store_case.catalog import Catalog, DEFAULT_CATALOG_PATH
+
+# (message, cart lines after the turn as {(product, size): quantity}); None means unchanged
+DIALOGUE = [
+    ("Add 2 medium running shoes to my cart", {("running", "medium"): 2}),
+    ("Add 1 large walking shoe", {("running", "medium"): 2, ("walking", "large"): 1}),
+    ("What's my cart total?", None),
+    ("Remove the medium running shoes", {("walking", "large"): 1}),
+    ("Add 3 small running shoes to my cart", {("walking", "large"): 1, ("running", "small"): 3}),
+    ("Show my cart", None),
+]
+# Sent to two workers at once; both must land and both must end up in the history
+CONCURRENT = ["Add 1 small walking shoe", "Add 1 small walking shoe please"]
+AFTER_CONCURRENT = {("walking", "large"): 1, ("running", "small"): 3, ("walking", "small"): 2}
+CLOSING = ["What's my cart total?", "Checkout please", "Show my cart"]
+
+
+def shared_state_env(directory: str) -> Dict[str, str]:
+    """The settings that make workers share state: SQLite stores plus cross-process session locks."""
+    return {
+        "CART_STORE": "sqlite", "CART_DB_PATH": os.path.join(directory, "carts.db"),
+        "ORDER_STORE": "sqlite", "ORDER_DB_PATH": os.path.join(directory, "orders.db"),
+        "CONVERSATION_BACKEND": "sqlite", "CONVERSATION_DB_PATH": os.path.join(directory, "conversations.db"),
+        "EMAIL_OUTBOX": "sqlite", "EMAIL_OUTBOX_DB_PATH": os.path.join(directory, "outbox.db"),
+        "SESSION_LOCK_DIR": os.path.join(directory, "locks"),
+    }
+
+
+class Checks:
+    def __init__(self):
+        self.failures: List[str] = []
+        self.passed = 0
+
+    def expect(self, condition: bool, failure: str):
+        if condition:
+            self.passed += 1
+        else:
+            self.failures.append(failure)
+
+
+def _total(lines: Dict[tuple, int], prices: Dict[str, int]) -> str:
+    return format_cents(sum(quantity * prices[product] for (product, _), quantity in lines.items()))
+
+
+def _cart_text(lines: Dict[tuple, int]) -> List[str]:
+    return [f"{quantity}x {product.title()} ({size.title()})" for (product, size), quantity in lines.items()]
+
+
+async def _turn(client: httpx.AsyncClient, user_id: str, message: str) -> str:
+    response = await client.post("/chat/text", json={"message": message, "user_id": user_id, "email": f"{user_id}@example.com"})
+    response.raise_for_status()
+    return response.json()["response"]
+
+
+async def _user(index: int, clients: List[httpx.AsyncClient], prices: Dict[str, int], checks: Checks) -> List[str]:
+    """Runs one user's dialogue across the workers; returns the messages it sent, in order."""
+    user_id = f"worker-user-{index}"
+    worker = index
+    sent = []
+
+    def next_client() -> httpx.AsyncClient:
+        nonlocal worker
+        worker += 1
+        return clients[worker % len(clients)]
+
+    lines: Dict[tuple, int] = {}
+    for message, after in DIALOGUE:
+        reply = await _turn(next_client(), user_id, message)
+        sent.append(message)
+        lines = after if after is not None else lines
+        if "total" in message:
+            checks.expect(_total(lines, prices) in reply, f"{user_id}: total after {sent[-2]!r} should be {_total(lines, prices)}, got {reply!r}")
+        elif message == "Show my cart":
+            checks.expect(all(line in reply for line in _cart_text(lines)), f"{user_id}: cart should list {_cart_text(lines)}, got {reply!r}")
+
+    await asyncio.gather(*[_turn(next_client(), user_id, message) for message in CONCURRENT])
+    sent += CONCURRENT
+    lines = AFTER_CONCURRENT
+
+    total_reply = await _turn(next_client(), user_id, CLOSING[0])
+    checks.expect(_total(lines, prices) in total_reply,
+                  f"{user_id}: total after concurrent adds should be {_total(lines, prices)}, got {total_reply!r}")
+    receipt_reply = await _turn(next_client(), user_id, CLOSING[1])
+    checks.expect(_total(lines, prices).lstrip("$") in receipt_reply, f"{user_id}: receipt should total {_total(lines, prices)}, got {receipt_reply!r}")
+    empty_reply = await _turn(next_client(), user_id, CLOSING[2])
+    checks.expect("empty" in empty_reply, f"{user_id}: cart should be empty after checkout, got {empty_reply!r}")
+    return sent + CLOSING
+
+
+def _check_orders(path: str, users: int, checks: Checks):
+    db = sqlite3.connect(path)
+    orders = defaultdict(list)
+    for user_id, items in db.execute("SELECT user_id, items FROM orders WHERE user_id IS NOT NULL"):
+        orders[user_id].append(json.loads(items))
+    for index in range(users):
+        user_id = f"worker-user-{index}"
+        checks.expect(len(orders[user_id]) == 1, f"{user_id}: expected 1 order, found {len(orders[user_id])}")
+        if orders[user_id]:
+            got = {(item["product"].lower(), item["size"].lower()): item["quantity"] for item in orders[user_id][0]}
+            checks.expect(got == AFTER_CONCURRENT, f"{user_id}: order lines {got} != {AFTER_CONCURRENT}")
+
+
+def _check_history(path: str, expected: Dict[str, List[str]], checks: Checks):
+    db = sqlite3.connect(path)
+    for user_id, messages in expected.items():
+        items = [json.loads(item) for (item,) in db.execute(
+            "SELECT item FROM items WHERE key = ? ORDER BY seq", (f"{user_id}:{user_id}@example.com",))]
+        history = [item["content"] for item in items if item.get("role") == "user" and isinstance(item.get("content"), str)]
+        # The two concurrent turns may be serialized in either order
+        checks.expect(sorted(history) == sorted(messages) and history[:len(DIALOGUE)] == messages[:len(DIALOGUE)]
+                      and history[-len(CLOSING):] == messages[-len(CLOSING):],
+                      f"{user_id}: history has {history}, expected {messages}")
+
+
+def _receipt_order_ids(messages: List[str]) -> List[str]:
+    order_ids = []
+    for raw in messages:
+        message = email.message_from_string(raw)
+        body = message.get_payload(decode=True).decode(errors="replace")
+        order_ids += re.findall(r"Order ID: (ORD\d+)", body)
+    return order_ids
+
+
+async def run(args) -> Checks:
+    catalog = Catalog(DEFAULT_CATALOG_PATH)
+    prices = {key: catalog.get(key).variant("medium").price_cents for key in ("running", "walking")}
+    directory = tempfile.mkdtemp(prefix="shoe-store-workers-")
+    stub = SMTPStub()
+    smtp_port = await stub.start()
+    env = {
+        "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp_port), "SMTP_STARTTLS": "false", "SMTP_USER": "",
+        "SMTP_FROM": "store@example.com", "CATALOG_RELOAD_INTERVAL": "0",
+        **({} if args.memory else shared_state_env(directory)),
+    }
+    options = {"latency": args.latency, "jitter": 0.0, "token_delay": 0.0, "seed": 1, "topology": "flat", "env": env}
+
+    context = multiprocessing.get_context("spawn")
+    ports = []
+    while len(ports) < args.workers:
+        port = _free_port()
+        if port not in ports and port != smtp_port:
+            ports.append(port)
+    processes = [context.Process(target=serve, args=(port, options), daemon=True) for port in ports]
+    for process in processes:
+        process.start()
+
+    checks = Checks()
+    clients = [httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60.0) for port in ports]
+    try:
+        for client, process in zip(clients, processes):
+            await _wait_until_up(client, process)
+        start = time.perf_counter()
+        sent = await asyncio.gather(*[_user(i, clients, prices, checks) for i in range(args.users)])
+        elapsed = time.perf_counter() - start
+
+        # Receipts are sent in the background; give the outbox workers a moment to drain
+        deadline = time.perf_counter() + args.email_timeout
+        while len(stub.messages) < args.users and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.5)  # late duplicates would show up here
+    finally:
+        for client in clients:
+            await client.aclose()
+        for process in processes:
+            process.terminate()
+            process.join()
+        await asyncio.sleep(0.1)  # let the stub see the workers' SMTP connections close
+        await stub.stop()
+
+    turns = sum(len(messages) for messages in sent)
+    print(f"{args.users} users x {turns // args.users} turns over {args.workers} workers "
+          f"({'process-local stores' if args.memory else 'shared SQLite state in ' + directory}) in {elapsed:.1f}s")
+
+    receipts = Counter(_receipt_order_ids(stub.messages))
+    checks.expect(len(receipts) == args.users, f"expected {args.users} receipts, got {len(receipts)}")
+    duplicates = {order_id: count for order_id, count in receipts.items() if count > 1}
+    checks.expect(not duplicates, f"receipts sent more than once: {duplicates}")
+    if not args.memory:
+        _check_orders(env["ORDER_DB_PATH"], args.users, checks)
+        _check_history(env["CONVERSATION_DB_PATH"], {f"worker-user-{i}": messages for i, messages in enumerate(sent)}, checks)
+    return checks
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--email-timeout", type=float, default=20.0, help="Seconds to wait for all receipts")
+    parser.add_argument("--memory", action="store_true", help="Keep the default process-local stores")
+    args = parser.parse_args(argv)
+
+    checks = asyncio.run(run(args))
+    for failure in checks.failures[:20]:
+        print(f"❌ {failure}")
+    if len(checks.failures) > 20:
+        print(f"... and {len(checks.failures) - 20} more")
+    print(f"{checks.passed} checks passed, {len(checks.failures)} failed")
+    return 1 if checks.failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
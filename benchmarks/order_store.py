@@ -0,0 +1,54 @@
+"""
+Checkout and lookup latency of the order stores as the number of orders grows.
+
+Fills each store up to every size in --sizes with orders spread over many customers, then
+times order creation, lookup by ID and a customer's recent-orders listing at that size.
+
+    python -m benchmarks.order_store --sizes 1000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from cases.shoe_store_case.order_store import InMemoryOrderStore, SQLiteOrderStore
+
+ITEMS = [{"product": "Running", "size": "Medium", "quantity": 1, "unit_price": 89.99}]
+CUSTOMERS = 10000
+SAMPLES = 2000
+
+
+def _fill(store, count: int, batch: int = 10000):
+    while len(store) < count:
+        for _ in range(min(batch, count - len(store))):
+            customer = random.randrange(CUSTOMERS)
+            store.create(ITEMS, user_id=f"user{customer}", email=f"user{customer}@example.com")
+
+
+def _micros(fn, samples: int = SAMPLES) -> float:
+    start = time.perf_counter()
+    for _ in range(samples):
+        fn()
+    return (time.perf_counter() - start) / samples * 1e6
+
+
+def run(sizes: list):
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {"memory": InMemoryOrderStore(), "sqlite": SQLiteOrderStore(os.path.join(tmp, "orders.db"))}
+        print(f"{'store':<8}{'orders':>10}{'create us':>12}{'get us':>10}{'recent us':>12}")
+        for size in sizes:
+            for name, store in stores.items():
+                _fill(store, size)
+                top = len(store) + 1000
+                create = _micros(lambda: store.create(ITEMS, user_id="bench", email="bench@example.com"), 500)
+                get = _micros(lambda: store.get(f"ORD{random.randrange(1001, top)}"))
+                recent = _micros(lambda: store.for_customer(f"user{random.randrange(CUSTOMERS)}", None))
+                print(f"{name:<8}{size:>10}{create:>12.1f}{get:>10.1f}{recent:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,131 @@
+"""
+Overload benchmark for admission control.
+
+Starts the API (fake model) once without and once with admission control, and sends each
+a burst of requests at once, several times the worker's capacity. Reports how many
+succeeded, how many were shed (429 queue full / 503 deadline, with their Retry-After),
+and the latency of the requests that got through:
+
+    python -m benchmarks.overload --burst 200 --latency 0.5 --max-concurrency 16 --max-queue 32 --max-wait 3
+
+Without admission every request is accepted and they all slow down together; with it the
+admitted ones keep a bounded latency and the rest are told to come back later. The fake
+model has no capacity limit of its own, so the run without admission only shows the cost
+of letting everything in; against a real, rate-limited model those requests would also
+start failing upstream. On /chat/stream a request shed after the stream has started gets
+an `error` event (with `retry_after`) instead of a status code.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.load_test import _free_port, _wait_until_up, percentile, serve
+
+
+async def _request(client: httpx.AsyncClient, index: int, endpoint: str, statuses: Counter,
+                   latencies: List[float], shed: List[float], retry_afters: List[int]):
+    payload = {"message": "Tell me about running shoes", "user_id": f"burst-{index}", "email": f"burst-{index}@example.com"}
+    start = time.perf_counter()
+    try:
+        if endpoint == "text":
+            response = await client.post("/chat/text", json=payload)
+        else:
+            async with client.stream("POST", "/chat/stream", json=payload) as response:
+                body = "".join([line async for line in response.aiter_lines()])
+                if response.status_code == 200 and "event: error" in body:
+                    statuses["error event"] += 1
+                    return
+    except httpx.HTTPError as e:
+        statuses[type(e).__name__] += 1
+        return
+    statuses[response.status_code] += 1
+    if response.status_code == 200:
+        latencies.append(time.perf_counter() - start)
+    elif "retry-after" in response.headers:
+        shed.append(time.perf_counter() - start)
+        retry_afters.append(int(response.headers["retry-after"]))
+
+
+async def burst(args, env: dict) -> dict:
+    options = {"latency": args.latency, "jitter": args.jitter, "token_delay": 0.0, "seed": 1, "topology": "flat", "env": env}
+    port = _free_port()
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(port, options), daemon=True)
+    process.start()
+
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    shed: List[float] = []
+    retry_afters: List[int] = []
+    limits = httpx.Limits(max_connections=args.burst, max_keepalive_connections=args.burst)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+            await _wait_until_up(client, process)
+            # One request first, so the controller has a run time to estimate waits from
+            await client.post("/chat/text", json={"message": "Tell me about running shoes", "user_id": "warmup"})
+            start = time.perf_counter()
+            await asyncio.gather(*[_request(client, i, args.endpoint, statuses, latencies, shed, retry_afters)
+                                   for i in range(args.burst)])
+            elapsed = time.perf_counter() - start
+            admission = (await client.get("/admission/stats")).json()
+    finally:
+        process.terminate()
+        process.join()
+
+    return {
+        "admission": env.get("ADMISSION_MAX_CONCURRENCY", "off"),
+        "elapsed_seconds": elapsed,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "latency": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+        "latency_max": max(latencies, default=0.0),
+        "shed_latency": {f"p{q}": percentile(shed, q) for q in (50, 99)},
+        "retry_after": {"min": min(retry_afters, default=None), "max": max(retry_afters, default=None)},
+        "server": admission,
+    }
+
+
+def print_result(result: dict):
+    ms = lambda seconds: f"{seconds * 1000:.0f} ms"
+    latency = result["latency"]
+    print(f"admission {result['admission']}: {result['statuses']} in {result['elapsed_seconds']:.1f}s")
+    print(f"  ok latency p50 {ms(latency['p50'])}, p95 {ms(latency['p95'])}, p99 {ms(latency['p99'])}, "
+          f"max {ms(result['latency_max'])}")
+    if result["retry_after"]["min"] is not None:
+        print(f"  shed in p50 {ms(result['shed_latency']['p50'])}, p99 {ms(result['shed_latency']['p99'])}, "
+              f"Retry-After {result['retry_after']['min']}-{result['retry_after']['max']} s")
+    server = result["server"]
+    if server.get("enabled"):
+        print(f"  shed: queue full {server['rejected_queue_full']}, deadline {server['rejected_deadline']}, "
+              f"timed out {server['timed_out']}; average wait {ms(server['average_wait_seconds'])}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=200, help="Requests sent at once")
+    parser.add_argument("--endpoint", choices=["text", "stream"], default="text")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per fake model call")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random seconds per fake model call, up to")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="ADMISSION_MAX_CONCURRENCY")
+    parser.add_argument("--max-queue", type=int, default=32, help="ADMISSION_MAX_QUEUE")
+    parser.add_argument("--max-wait", type=float, default=3.0, help="ADMISSION_MAX_WAIT")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+    parser.add_argument("--json", dest="json_path", help="Also write both results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for env in ({}, {"ADMISSION_MAX_CONCURRENCY": str(args.max_concurrency), "ADMISSION_MAX_QUEUE": str(args.max_queue),
+                     "ADMISSION_MAX_WAIT": str(args.max_wait)}):
+        results.append(asyncio.run(burst(args, env)))
+        print_result(results[-1])
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+from typing import List, Optional
+
+
+class SMTPStub:
+    """
+    Minimal local SMTP server for exercising the email outbox without a real mail server.
+
+    Speaks just enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT; no TLS
+    or AUTH), records every delivered message and can add a fixed `delay` to each reply to
+    mimic a slow remote server.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.messages: List[str] = []
+        self.connections = 0
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str):
+        await asyncio.sleep(self.delay)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await self._reply(writer, "220 localhost SMTP stub")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith("EHLO"):
+                    await self._reply(writer, "250-localhost\r\n250 8BITMIME")
+                elif command.startswith("DATA"):
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b""):
+                        lines.append(data.decode(errors="replace"))
+                    self.messages.append("".join(lines))
+                    await self._reply(writer, "250 OK: queued")
+                elif command.startswith("QUIT"):
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "250 OK")
+        finally:
+            writer.close()
@@ -0,0 +1,118 @@
+"""
+Worker startup benchmark.
+
+Imports `api.main` in fresh interpreters under `python -X importtime`, then reports the import
+time, the packages and modules it is spent in, and the heavy modules that must stay out of a
+text-only worker (numpy and the agents.voice stack load on the first voice session only).
+Exits non-zero when a budget is exceeded or a forbidden module is imported, so it can gate CI:
+
+    python -m benchmarks.startup --runs 5 --budget-ms 4000 --app-budget-ms 300
+    python -m benchmarks.startup --module cases.shoe_store_case.main --top 20
+
+The SDK itself (agents, openai, mcp) is most of the total; the app budget covers the time
+spent in our own modules (api.*, cases.*) so regressions there are not hidden by it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+FORBIDDEN = ("numpy", "agents.voice", "sounddevice")
+APP_PACKAGES = ("api", "cases")
+
+# Wall time is measured inside the child, so interpreter startup itself is not counted
+CHILD = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def import_profile(module: str, env: Dict[str, str]) -> dict:
+    """Imports `module` in a new interpreter; returns wall seconds and per-module self/cumulative microseconds."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD.format(module=module)],
+                               capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return {"wall": float(completed.stdout.strip().splitlines()[-1]), "modules": modules}
+
+
+def summarize(profiles: List[dict], top: int) -> dict:
+    walls = [profile["wall"] for profile in profiles]
+    # The run closest to the median is representative; the others only feed the wall-time spread
+    profile = sorted(profiles, key=lambda p: p["wall"])[len(profiles) // 2]
+    packages = defaultdict(int)
+    for name, (self_us, _) in profile["modules"].items():
+        packages[name.split(".")[0]] += self_us
+    app_us = sum(us for package, us in packages.items() if package in APP_PACKAGES)
+    return {
+        "wall_ms": {"min": min(walls) * 1000, "median": statistics.median(walls) * 1000, "max": max(walls) * 1000},
+        "modules_imported": len(profile["modules"]),
+        "app_ms": app_us / 1000,
+        "packages_ms": {name: us / 1000 for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "slowest_modules_ms": {
+            name: self_us / 1000
+            for name, (self_us, _) in sorted(profile["modules"].items(), key=lambda item: -item[1][0])[:top]
+        },
+        "forbidden_imported": [name for name in FORBIDDEN if name in profile["modules"]],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=4000.0, help="Median wall time allowed for the whole import")
+    parser.add_argument("--app-budget-ms", type=float, default=300.0, help="Self time allowed in api.* and cases.* modules")
+    parser.add_argument("--allow-voice", action="store_true", help="Don't fail when numpy or agents.voice are imported")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # Import cost only: no catalog watcher thread and no span exporter
+    env = {**os.environ, "CATALOG_RELOAD_INTERVAL": "0", "TRACE_METRICS": "false"}
+    profiles = [import_profile(args.module, env) for _ in range(args.runs)]
+    report = {"module": args.module, "runs": args.runs, **summarize(profiles, args.top)}
+
+    wall = report["wall_ms"]
+    print(f"import {args.module}: median {wall['median']:.0f} ms (min {wall['min']:.0f}, max {wall['max']:.0f}) "
+          f"over {args.runs} runs, {report['modules_imported']} modules, {report['app_ms']:.1f} ms in app modules")
+    print("By package (self time):")
+    for name, ms in report["packages_ms"].items():
+        print(f"  {name:<40}{ms:8.1f} ms")
+    print("Slowest modules (self time):")
+    for name, ms in report["slowest_modules_ms"].items():
+        print(f"  {name:<40}{ms:8.1f} ms")
+
+    failures = []
+    if wall["median"] > args.budget_ms:
+        failures.append(f"median import time {wall['median']:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if report["app_ms"] > args.app_budget_ms:
+        failures.append(f"app modules take {report['app_ms']:.1f} ms, over the {args.app_budget_ms:.0f} ms budget")
+    if report["forbidden_imported"] and not args.allow_voice:
+        failures.append(f"imported at startup: {', '.join(report['forbidden_imported'])}")
+    report["failures"] = failures
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Within startup budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Tool calls saved by preloading the customer's cart and recent orders into the instructions.
+
+Runs read-heavy dialogues (showing the cart, asking for the total, checking recent orders
+between changes) through each topology with the fake model, once with STATE_SNAPSHOT off
+and once on. With the snapshot every agent's instructions end with the current cart, total
+and recent orders, so the reads it covers are answered without a tool call; changes,
+checkout and orders that aren't listed still go through the tools. It reports model calls,
+tool calls (read-only ones separately) and prompt tokens, and the change from off to on.
+Prompt tokens can go either way: every call carries the snapshot, but there are fewer
+calls re-sending the conversation.
+
+Exits non-zero if the snapshot doesn't eliminate read-only tool calls in every topology, or
+if an answer misses the cart total or one of the customer's orders.
+
+    python -m benchmarks.state_snapshot --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import Model, ModelProvider, RunConfig, Runner
+
+from benchmarks.fake_model import FakeModelProvider
+from cases.shoe_store_case.cart_store import format_cents
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+from cases.shoe_store_case.tools import cart_store, order_store
+
+DIALOGUES = {
+    "browse_cart": ["Add 2 medium running shoes to my cart", "Show my cart", "What's my cart total?",
+                    "Add one large walking to my cart", "What's my total now?"],
+    "after_checkout": ["Add two small running to my cart", "Checkout please", "What's the status of my order?",
+                       "What's my cart total?"],
+    "mixed": ["Add two small running and one large walking, and check ORD1001", "Show my cart and the total",
+              "Change the running shoes to 3", "What's my cart total?"],
+}
+READ_TOOLS = {"view_cart", "get_cart_total", "view_cart_and_total", "lookup_order", "lookup_orders"}
+
+
+class ToolCallCounter(Model):
+    """Counts the tool calls the model makes, by name (handoffs excluded)."""
+
+    def __init__(self, model: Model, counts: Counter):
+        self.model = model
+        self.counts = counts
+
+    def _count(self, output):
+        for item in output:
+            name = getattr(item, "name", None)
+            if getattr(item, "type", None) == "function_call" and not name.startswith("transfer_to_"):
+                self.counts[name] += 1
+
+    async def get_response(self, *args, **kwargs):
+        response = await self.model.get_response(*args, **kwargs)
+        self._count(response.output)
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        async for event in self.model.stream_response(*args, **kwargs):
+            if getattr(event, "type", None) == "response.completed":
+                self._count(event.response.output)
+            yield event
+
+
+class ToolCallCountingProvider(ModelProvider):
+    def __init__(self, provider: ModelProvider):
+        self.provider = provider
+        self.counts: Counter = Counter()
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return ToolCallCounter(self.provider.get_model(model_name), self.counts)
+
+
+def _check_answer(user_id: str, email: str, message: str, answer: str) -> Optional[str]:
+    """What the answer to a read-only question gets wrong about the current state, if anything."""
+    lowered = message.lower()
+    if "total" in lowered:
+        lines = cart_store.lines(user_id)
+        total = format_cents(sum(line.line_total_cents for line in lines)) if lines else "empty"
+        if total not in answer:
+            return f"{message!r} answered without the total {total}: {answer!r}"
+    if "status of my order" in lowered:
+        missing = [order_id for order_id, _ in order_store.for_customer(user_id, email) if order_id not in answer]
+        if missing:
+            return f"{message!r} answered without {', '.join(missing)}: {answer!r}"
+    return None
+
+
+async def run_variant(topology: str, state_snapshot: bool, latency: float) -> dict:
+    agent = build_shoe_store_agent(topology, "fake-model", state_snapshot=state_snapshot)
+    fake = FakeModelProvider(latency)
+    provider = ToolCallCountingProvider(fake)
+    run_config = RunConfig(model_provider=provider, tracing_disabled=True)
+    turns, problems = 0, []
+    start = time.perf_counter()
+    for name, messages in DIALOGUES.items():
+        user_id = f"snapshot-{topology}-{'on' if state_snapshot else 'off'}-{name}"
+        email = f"{user_id}@example.com"
+        cart_store.clear(user_id)
+        context = UserContext(user_id=user_id, email=email)
+        input_items = []
+        for message in messages:
+            input_items.append({"content": message, "role": "user"})
+            result = await Runner.run(agent, input_items, context=context, run_config=run_config)
+            input_items = result.to_input_list()
+            problem = _check_answer(user_id, email, message, str(result.final_output))
+            if problem:
+                problems.append(f"{topology}/{name}: {problem}")
+        turns += len(messages)
+    return {
+        "turns": turns,
+        "calls": fake.model.calls,
+        "tool_calls": sum(provider.counts.values()),
+        "read_calls": sum(count for tool, count in provider.counts.items() if tool in READ_TOOLS),
+        "by_tool": provider.counts,
+        "input_tokens": fake.model.input_tokens,
+        "seconds": time.perf_counter() - start,
+        "problems": problems,
+    }
+
+
+async def run(latency: float) -> List[str]:
+    problems = []
+    print(f"Fake model latency {latency * 1000:.0f} ms/call; {sum(map(len, DIALOGUES.values()))} turns per run")
+    print(f"{'topology':<10}{'snapshot':<10}{'calls':>7}{'tool calls':>12}{'reads':>7}{'in tokens':>11}{'ms/turn':>9}")
+    for topology in TOPOLOGIES:
+        off = await run_variant(topology, False, latency)
+        on = await run_variant(topology, True, latency)
+        for label, stats in (("off", off), ("on", on)):
+            print(f"{topology:<10}{label:<10}{stats['calls']:>7}{stats['tool_calls']:>12}{stats['read_calls']:>7}"
+                  f"{stats['input_tokens']:>11}{stats['seconds'] / stats['turns'] * 1000:>9.0f}")
+        eliminated = off["by_tool"] - on["by_tool"]
+        # Signed change from off to on: the snapshot adds prompt tokens to every call, so input
+        # tokens only drop when enough calls go away with the reads
+        print(f"{'':<10}{'change':<10}{on['calls'] / off['calls'] - 1:>+7.0%}"
+              f"{on['tool_calls'] - off['tool_calls']:>+12}{on['read_calls'] - off['read_calls']:>+7}"
+              f"{on['input_tokens'] / off['input_tokens'] - 1:>+11.0%}"
+              f"{on['seconds'] / off['seconds'] - 1:>+9.0%}")
+        print(f"{'':<10}eliminated: {', '.join(f'{tool} x{count}' for tool, count in sorted(eliminated.items()))}\n")
+        problems += off["problems"] + on["problems"]
+        if on["read_calls"] >= off["read_calls"]:
+            problems.append(f"{topology}: {on['read_calls']} read-only tool calls with the snapshot, "
+                            f"{off['read_calls']} without")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    args = parser.parse_args(argv)
+    problems = asyncio.run(run(args.latency))
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ The state snapshot answers cart and order reads without tool calls")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Time-to-first-token benchmark for /chat/stream against the local fake model.
+
+Runs the API in-process with uvicorn and compares how long a user waits for the
+first streamed text delta with how long /chat/text takes to return a full reply.
+
+Only the text of the agent that answers is streamed. In the nested topology that is the
+main agent, which writes its reply after the specialists it calls as tools have finished,
+so the first token comes about as late as the full /chat/text reply; in the flat and
+handoff topologies it follows the last tool call.
+
+    python -m benchmarks.stream_latency --latency 0.3 --turns 10
+    python -m benchmarks.stream_latency --topology flat
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+import httpx
+import uvicorn
+from agents import RunConfig
+
+import api.main
+from benchmarks.fake_model import FakeModelProvider
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+
+MESSAGES = [
+    "What shoes do you sell?",
+    "Add 2 small running shoes to my cart",
+    "Where is my order ORD1003?",
+    "What's my cart total?",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _time_to_first_token(client: httpx.AsyncClient, payload: dict) -> tuple[float, float]:
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if first_token is None and line == "event: delta":
+                first_token = time.perf_counter() - start
+            elif line == "event: error":
+                raise RuntimeError("/chat/stream reported an error event")
+    total = time.perf_counter() - start
+    return first_token if first_token is not None else total, total
+
+
+async def _full_response(client: httpx.AsyncClient, payload: dict) -> float:
+    start = time.perf_counter()
+    response = await client.post("/chat/text", json=payload)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(latency: float, token_delay: float, turns: int, topology: str):
+    api.main.ShoeStoreAgent = build_shoe_store_agent(topology, "fake-model")
+    api.main.run_config = RunConfig(model_provider=FakeModelProvider(latency, token_delay), tracing_disabled=True)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api.main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    first_tokens, stream_totals, blocking_totals = [], [], []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for i in range(turns):
+            message = MESSAGES[i % len(MESSAGES)]
+            ttft, total = await _time_to_first_token(client, {"message": message, "user_id": "bench-stream", "email": "bench@example.com"})
+            first_tokens.append(ttft)
+            stream_totals.append(total)
+            blocking_totals.append(await _full_response(client, {"message": message, "user_id": "bench-text", "email": "bench@example.com"}))
+
+    server.should_exit = True
+    await server_task
+
+    print(f"Topology {topology}; fake model latency: {latency * 1000:.0f} ms/call, {token_delay * 1000:.0f} ms/word, "
+          f"{turns} turns")
+    print(f"/chat/stream  time to first token: median {statistics.median(first_tokens) * 1000:.0f} ms, max {max(first_tokens) * 1000:.0f} ms")
+    print(f"/chat/stream  full reply:          median {statistics.median(stream_totals) * 1000:.0f} ms")
+    print(f"/chat/text    full reply:          median {statistics.median(blocking_totals) * 1000:.0f} ms")
+    print(f"Target TTFT < 1000 ms: {'met' if max(first_tokens) < 1.0 else 'missed'}")
+    if statistics.median(first_tokens) >= statistics.median(blocking_totals) * 0.9:
+        print("Streaming doesn't bring the first token forward here: the agent that answers only starts "
+              "writing once every tool call, sub-agents included, has returned")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake model call")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds per streamed word")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="nested")
+    args = parser.parse_args()
+    asyncio.run(run(args.latency, args.token_delay, args.turns, args.topology))
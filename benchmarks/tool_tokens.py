@@ -0,0 +1,192 @@
+"""
+Prompt tokens spent on tool outputs: the verbose prose encoding vs the compact one.
+
+Runs scripted dialogues through the agent graph with the fake model, once per
+TOOL_OUTPUT_FORMAT, and counts tokens with the model's tokenizer (tiktoken's o200k_base,
+as used by gpt-4o and gpt-4o-mini; without tiktoken installed, characters / 4). It reports:
+
+- per tool: the average tokens of one output
+- per dialogue: the prompt tokens of every model call added up (tool outputs are re-sent
+  with every later step and turn) and the time per turn, with the fake model's latency
+  growing with the prompt (--prefill-delay per 1000 tokens)
+
+Exits non-zero if the compact encoding doesn't send fewer prompt tokens.
+
+    python -m benchmarks.tool_tokens --topology flat --latency 0.2 --prefill-delay 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import Model, ModelProvider, RunConfig, Runner
+
+from benchmarks.batch_tools import DIALOGUES as BATCH_DIALOGUES
+from benchmarks.fake_model import FakeModelProvider
+from benchmarks.load_test import DIALOGUES as LOAD_DIALOGUES
+from cases.shoe_store_case import tools
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+from cases.shoe_store_case.tool_output import ToolOutput, VerboseToolOutput
+
+DIALOGUES = {
+    **LOAD_DIALOGUES,
+    **BATCH_DIALOGUES,
+    "changes": ["Add 2 medium running shoes to my cart", "Change the running shoes to 3", "Show my cart and the total",
+                "Checkout please", "Where is my order ORD1002?"],
+}
+FORMATS = {"verbose": VerboseToolOutput, "compact": ToolOutput}
+
+
+def tokenizer() -> tuple[str, Callable[[str], int]]:
+    try:
+        import tiktoken
+    except ImportError:
+        return "characters / 4 (pip install tiktoken for exact counts)", lambda text: max(1, len(text) // 4)
+    encoding = tiktoken.get_encoding("o200k_base")
+    return "tiktoken o200k_base", lambda text: len(encoding.encode(text))
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+class TokenMeter:
+    """Prompt tokens per model call and the distinct tool outputs seen in the prompts."""
+
+    def __init__(self, count: Callable[[str], int]):
+        self.count = count
+        self.prompt_tokens = 0
+        self._seen_calls: set = set()
+        self.outputs_by_tool: Dict[str, List[int]] = defaultdict(list)
+
+    def observe(self, system_instructions, input, tools, handoffs):
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else list(input)
+        items = [item if isinstance(item, dict) else item.model_dump(exclude_none=True) for item in items]
+        definitions = [(tool.name, tool.description, tool.params_json_schema) for tool in tools
+                       if hasattr(tool, "params_json_schema")]
+        definitions += [(handoff.tool_name, handoff.tool_description, handoff.input_json_schema) for handoff in handoffs]
+        self.prompt_tokens += self.count(system_instructions or "") + self.count(json.dumps(items, default=str)) \
+            + self.count(json.dumps(definitions))
+        names = {item["call_id"]: item["name"] for item in items if item.get("type") == "function_call"}
+        for item in items:
+            call_id = item.get("call_id")
+            if item.get("type") != "function_call_output" or call_id in self._seen_calls:
+                continue
+            self._seen_calls.add(call_id)
+            name = names.get(call_id, "?")
+            if not name.startswith("transfer_to_"):
+                self.outputs_by_tool[name].append(self.count(_text(item.get("output"))))
+
+
+class MeteredModel(Model):
+    def __init__(self, model: Model, meter: TokenMeter):
+        self.model = model
+        self.meter = meter
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, **kwargs):
+        self.meter.observe(system_instructions, input, tools, handoffs)
+        return await self.model.get_response(system_instructions, input, model_settings, tools, output_schema,
+                                             handoffs, tracing, **kwargs)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, **kwargs):
+        self.meter.observe(system_instructions, input, tools, handoffs)
+        async for event in self.model.stream_response(system_instructions, input, model_settings, tools,
+                                                      output_schema, handoffs, tracing, **kwargs):
+            yield event
+
+
+class MeteredProvider(ModelProvider):
+    def __init__(self, provider: ModelProvider, meter: TokenMeter):
+        self.provider = provider
+        self.meter = meter
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return MeteredModel(self.provider.get_model(model_name), self.meter)
+
+
+async def run_format(name: str, args, count: Callable[[str], int]) -> dict:
+    tools.formatter = FORMATS[name]()
+    agent = build_shoe_store_agent(args.topology, "fake-model")
+    tool_tokens: Dict[str, List[int]] = defaultdict(list)
+    dialogues = {}
+    for dialogue, messages in DIALOGUES.items():
+        meter = TokenMeter(count)
+        fake = FakeModelProvider(args.latency, prefill_delay=args.prefill_delay)
+        run_config = RunConfig(model_provider=MeteredProvider(fake, meter), tracing_disabled=True)
+        user_id = f"tokens-{name}-{dialogue}"
+        tools.cart_store.clear(user_id)
+        context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+        input_items = []
+        start = time.perf_counter()
+        for message in messages:
+            input_items.append({"content": message, "role": "user"})
+            result = await Runner.run(agent, input_items, context=context, run_config=run_config)
+            input_items = result.to_input_list()
+        dialogues[dialogue] = {"turns": len(messages), "calls": fake.model.calls, "prompt_tokens": meter.prompt_tokens,
+                               "seconds": time.perf_counter() - start}
+        for tool, counts in meter.outputs_by_tool.items():
+            tool_tokens[tool] += counts
+    return {"tools": tool_tokens, "dialogues": dialogues}
+
+
+async def run(args) -> int:
+    method, count = tokenizer()
+    formatter = tools.formatter
+    # The first agent run pays one-off costs (schemas, lazy imports); keep them out of the timings
+    await Runner.run(build_shoe_store_agent(args.topology, "fake-model"), "What shoes do you sell?",
+                     context=UserContext(user_id="tokens-warmup", email="tokens-warmup@example.com"),
+                     run_config=RunConfig(model_provider=FakeModelProvider(), tracing_disabled=True))
+    try:
+        results = {name: await run_format(name, args, count) for name in FORMATS}
+    finally:
+        tools.formatter = formatter
+    verbose, compact = results["verbose"], results["compact"]
+
+    print(f"Topology {args.topology}, tokens counted with {method}")
+    print(f"\n{'tool output':<22}{'verbose':>9}{'compact':>9}{'saved':>8}   (average tokens per output)")
+    for tool in sorted(set(verbose["tools"]) | set(compact["tools"])):
+        before = statistics.mean(verbose["tools"].get(tool) or [0])
+        after = statistics.mean(compact["tools"].get(tool) or [0])
+        print(f"{tool:<22}{before:>9.0f}{after:>9.0f}{1 - after / before if before else 0:>8.0%}")
+
+    print(f"\n{'dialogue':<14}{'turns':>6}{'calls':>7}{'prompt tokens':>24}{'saved':>8}{'ms/turn':>18}")
+    totals = {"verbose": 0, "compact": 0}
+    for dialogue, before in verbose["dialogues"].items():
+        after = compact["dialogues"][dialogue]
+        totals["verbose"] += before["prompt_tokens"]
+        totals["compact"] += after["prompt_tokens"]
+        turns = before["turns"]
+        print(f"{dialogue:<14}{turns:>6}{after['calls']:>7}{before['prompt_tokens']:>12} -> {after['prompt_tokens']:>7}"
+              f"{1 - after['prompt_tokens'] / before['prompt_tokens']:>8.0%}"
+              f"{before['seconds'] / turns * 1000:>9.0f} -> {after['seconds'] / turns * 1000:>5.0f}")
+    saved = 1 - totals["compact"] / totals["verbose"]
+    print(f"{'all':<14}{'':>13}{totals['verbose']:>12} -> {totals['compact']:>7}{saved:>8.0%}")
+    if totals["compact"] >= totals["verbose"]:
+        print("❌ The compact encoding did not reduce prompt tokens")
+        return 1
+    print(f"✅ Compact tool outputs send {saved:.0%} fewer prompt tokens")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="nested")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--prefill-delay", type=float, default=0.1, help="Extra seconds per 1000 prompt tokens")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
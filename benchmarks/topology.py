@@ -0,0 +1,80 @@
+"""
+Compares the flat, nested (agents as tools) and handoff agent topologies.
+
+Runs the same scripted dialogues against each topology with the local fake model and
+reports model calls, prompt/completion tokens and wall time per turn.
+
+    python -m benchmarks.topology --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+from agents import RunConfig, Runner
+
+from benchmarks.fake_model import FakeModelProvider
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import TOPOLOGIES, build_shoe_store_agent
+from cases.shoe_store_case.tools import cart_store
+
+DIALOGUES = {
+    "browse": ["What shoes do you sell?", "How much are the walking shoes?", "Tell me about running shoes"],
+    "cart": ["Add 2 small running shoes to my cart", "Add 1 large walking shoe", "What's my cart total?",
+             "Remove the running shoes", "Show my cart"],
+    "order": ["Where is my order ORD1003?", "What is the status of order ORD1001?"],
+}
+
+
+async def run_dialogue(agent, provider: FakeModelProvider, user_id: str, messages: list) -> dict:
+    run_config = RunConfig(model_provider=provider, tracing_disabled=True)
+    context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+    input_items = []
+    model = provider.model
+    calls, input_tokens, output_tokens = model.calls, model.input_tokens, model.output_tokens
+
+    start = time.perf_counter()
+    for message in messages:
+        input_items.append({"content": message, "role": "user"})
+        result = await Runner.run(agent, input_items, context=context, run_config=run_config)
+        input_items = result.to_input_list()
+
+    return {
+        "turns": len(messages),
+        "calls": model.calls - calls,
+        "input_tokens": model.input_tokens - input_tokens,
+        "output_tokens": model.output_tokens - output_tokens,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+async def run(latency: float):
+    print(f"Fake model latency {latency * 1000:.0f} ms/call; figures are per turn")
+    print(f"{'topology':<10}{'dialogue':<10}{'calls':>8}{'in tokens':>12}{'out tokens':>12}{'ms':>10}")
+    for topology in TOPOLOGIES:
+        agent = build_shoe_store_agent(topology, "fake-model")
+        totals = dict(turns=0, calls=0, input_tokens=0, output_tokens=0, seconds=0.0)
+        for name, messages in DIALOGUES.items():
+            user_id = f"bench-{topology}-{name}"
+            cart_store.clear(user_id)
+            stats = await run_dialogue(agent, FakeModelProvider(latency), user_id, messages)
+            for key in totals:
+                totals[key] += stats[key]
+            _print_row(topology, name, stats)
+        _print_row(topology, "all", totals)
+        print()
+
+
+def _print_row(topology: str, dialogue: str, stats: dict):
+    turns = stats["turns"]
+    print(f"{topology:<10}{dialogue:<10}{stats['calls'] / turns:>8.2f}{stats['input_tokens'] / turns:>12.0f}"
+          f"{stats['output_tokens'] / turns:>12.0f}{stats['seconds'] / turns * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per fake model call")
+    args = parser.parse_args()
+    asyncio.run(run(args.latency))
@@ -0,0 +1,146 @@
+"""
+Time-to-first-audio benchmark for voice replies: buffered vs streaming playback, with and
+without the TTS cache.
+
+Runs the voice pipeline (fake STT and TTS, a scripted workflow instead of the agent) over a
+dialogue whose replies mix recurring phrases (greeting, "Your cart is empty.", a retry
+prompt) with one-off answers. Playback goes to a simulated output device that pulls 10ms
+blocks, like sounddevice does. For each mode it reports the time from the start of the
+turn to the first audible sample, and how many TTS calls were made:
+
+- buffered: the old CLI, which concatenates every chunk and then plays
+- streaming: StreamingPlayer plays each chunk as it arrives
+- streaming + cache: recurring phrases come from the TTS cache without a TTS call
+
+    python -m benchmarks.tts_playback --turns 30 --tts-latency 0.3 --chunk-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import AsyncIterator, List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+import numpy as np
+from agents.voice import AudioInput, VoicePipeline, VoicePipelineConfig, VoiceWorkflowBase
+
+from benchmarks.fake_voice import TTS_SAMPLE_RATE, FakeVoiceModelProvider
+from cases.shoe_store_case.audio import StreamingPlayer
+from cases.shoe_store_case.tts_cache import CachedVoiceModelProvider, TTSCache
+from cases.shoe_store_case.voice import shoe_store_tts_settings
+
+RECURRING = [
+    "Hi, welcome to the EOcean shoe store! How can I help you today?",
+    "Your cart is empty.",
+    "Sorry, I didn't catch that. Could you say it again?",
+]
+BLOCK = TTS_SAMPLE_RATE // 100  # 10ms device blocks
+
+
+def dialogue(turns: int) -> List[str]:
+    """Every other reply is a recurring phrase; the rest are one-off answers."""
+    replies = []
+    for turn in range(turns):
+        if turn % 2 == 0:
+            replies.append(RECURRING[(turn // 2) % len(RECURRING)])
+        else:
+            replies.append(f"Order ORD{1000 + turn} has shipped and is on its way with our courier. It should arrive "
+                           f"in {turn % 5 + 2} days, and you will get an email with the tracking details shortly.")
+    return replies
+
+
+class ScriptedWorkflow(VoiceWorkflowBase):
+    """Streams a fixed reply word by word, standing in for the agent."""
+
+    def __init__(self, reply: str, word_delay: float):
+        self.reply = reply
+        self.word_delay = word_delay
+
+    async def run(self, transcription: str) -> AsyncIterator[str]:
+        for word in self.reply.split(" "):
+            await asyncio.sleep(self.word_delay)
+            yield word + " "
+
+
+async def play_turn(config: VoicePipelineConfig, reply: str, word_delay: float, streaming: bool) -> float:
+    """Seconds from the start of the turn to the first audible sample on the simulated device."""
+    start = time.perf_counter()
+    pipeline = VoicePipeline(workflow=ScriptedWorkflow(reply, word_delay), config=config)
+    result = await pipeline.run(AudioInput(buffer=np.zeros(2400, dtype=np.int16)))
+    player = StreamingPlayer()
+    first_audio: List[float] = []
+
+    async def device():
+        outdata = np.zeros((BLOCK, 1), dtype=np.int16)
+        while not player.drained.is_set():
+            player.callback(outdata, BLOCK, None, None)
+            if not first_audio and outdata.any():
+                first_audio.append(time.perf_counter() - start)
+            await asyncio.sleep(BLOCK / TTS_SAMPLE_RATE)
+
+    chunks = []
+    playback = asyncio.create_task(device()) if streaming else None
+    async for event in result.stream():
+        if event.type == "voice_stream_event_audio":
+            if streaming:
+                player.write(event.data)
+            else:
+                chunks.append(event.data)
+    if not streaming:
+        player.write(np.concatenate(chunks))
+        playback = asyncio.create_task(device())
+    player.finish()
+    await playback
+    return first_audio[0]
+
+
+async def run_mode(name: str, replies: List[str], args, streaming: bool, cached: bool) -> dict:
+    provider = FakeVoiceModelProvider(stt_latency=0.0, tts_latency=args.tts_latency, chunk_delay=args.chunk_delay)
+    cache = TTSCache() if cached else None
+    config = VoicePipelineConfig(model_provider=CachedVoiceModelProvider(provider, cache) if cache else provider,
+                                 tts_settings=shoe_store_tts_settings(), tracing_disabled=True)
+    first_audio = [await play_turn(config, reply, args.word_delay, streaming) for reply in replies]
+    recurring = [seconds for reply, seconds in zip(replies, first_audio) if reply in RECURRING]
+    return {
+        "mode": name,
+        "first_audio": first_audio,
+        "recurring_first_audio": recurring,
+        "tts_calls": provider.tts.calls,
+        "cache": cache.stats() if cache else None,
+    }
+
+
+async def run(args):
+    replies = dialogue(args.turns)
+    results = [
+        await run_mode("buffered", replies, args, streaming=False, cached=False),
+        await run_mode("streaming", replies, args, streaming=True, cached=False),
+        await run_mode("streaming + cache", replies, args, streaming=True, cached=True),
+    ]
+    ms = lambda seconds: f"{seconds * 1000:7.0f} ms"
+    print(f"{args.turns} replies, fake TTS {args.tts_latency * 1000:.0f} ms to first chunk + "
+          f"{args.chunk_delay * 1000:.0f} ms per 100ms chunk")
+    print(f"{'':<20}{'first audio p50':>16}{'max':>11}{'recurring p50':>15}{'TTS calls':>11}")
+    for result in results:
+        first_audio = result["first_audio"]
+        print(f"{result['mode']:<20}{ms(statistics.median(first_audio)):>16}{ms(max(first_audio)):>11}"
+              f"{ms(statistics.median(result['recurring_first_audio'])):>15}{result['tts_calls']:>11}")
+    cache = results[-1]["cache"]
+    print(f"TTS cache: {cache['hits']}/{cache['lookups']} hits, {cache['entries']} entries, "
+          f"{cache['audio_seconds_served']:.1f}s of audio served without a TTS call")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Seconds before the first TTS chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="Seconds per 100ms TTS chunk")
+    parser.add_argument("--word-delay", type=float, default=0.01, help="Seconds per word from the scripted workflow")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+The shared upstream client against a local stand-in for the model API.
+
+Starts a keep-alive HTTP/1.1 server that answers the Responses API (POST /v1/responses,
+plain or streamed, with the fake model's rule-based decisions, and GET /v1/models) after
+--latency seconds, and holds every new connection for --connect-delay seconds first,
+standing in for the TCP and TLS handshakes of a remote API. Single turns then run through
+the nested agent graph with an UpstreamClient pointed at it, --concurrency at a time, in
+three setups:
+
+- no keep-alive: every model call opens a new connection
+- pooled: connections are kept alive and reused
+- pooled + warmup: as pooled, with --concurrency connections opened before the first turn
+
+For each it reports the latency of the first wave of turns and of all of them, the model
+calls the stand-in served and the connections it accepted. Exits non-zero if any model call
+bypassed the shared client, pooling doesn't open fewer connections, or warmup doesn't speed
+up the first turns.
+
+    python -m benchmarks.upstream_pool --turns 120 --concurrency 8 --connect-delay 0.15
+
+The stand-in can also serve the API itself:
+
+    python -m benchmarks.upstream_pool --serve 8099
+    UPSTREAM_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake-key uvicorn api.main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("CATALOG_RELOAD_INTERVAL", "0")
+
+from agents import RunConfig, Runner
+from openai.types.responses import Response, ResponseCompletedEvent, ResponseCreatedEvent, ResponseUsage
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails
+
+from api.upstream import UpstreamClient
+from benchmarks.fake_model import FakeModel
+from benchmarks.load_test import DIALOGUES, percentile
+from cases.shoe_store_case.context import UserContext
+from cases.shoe_store_case.graph import build_shoe_store_agent
+
+
+class StandInServer:
+    """
+    A minimal model API over keep-alive HTTP/1.1. Each new connection waits `connect_delay`
+    seconds before its first request is read; each response takes `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.05, connect_delay: float = 0.1):
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.model = FakeModel()
+        self.connections = 0
+        self.responses = 0
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def start(self, port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._connection, "127.0.0.1", port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reset(self):
+        self.connections = self.responses = 0
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.connect_delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {name.strip().lower(): value.strip() for name, _, value in
+                           (line.partition(":") for line in header_lines if line)}
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                method, path, _ = request_line.split(" ", 2)
+                status, payload = await self._handle(method, path.split("?")[0], body)
+                data = payload.encode()
+                content_type = "text/event-stream" if payload.startswith("event:") else "application/json"
+                writer.write(f"HTTP/1.1 {status}\r\ncontent-type: {content_type}\r\n"
+                             f"content-length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, method: str, path: str, body: bytes) -> tuple:
+        if method == "GET" and path.endswith("/models"):
+            return "200 OK", json.dumps({"object": "list", "data": []})
+        if method == "POST" and path.endswith("/responses"):
+            self.responses += 1
+            await asyncio.sleep(self.latency)
+            try:
+                request = json.loads(body)
+                response = self._response(request)
+                if request.get("stream"):
+                    return "200 OK", self._events(response)
+                return "200 OK", response.model_dump_json(exclude_none=True)
+            except Exception as e:
+                return "500 Internal Server Error", json.dumps({"error": {"message": repr(e)}})
+        return "404 Not Found", json.dumps({"error": {"message": f"{method} {path} not found"}})
+
+    @staticmethod
+    def _events(response: Response) -> str:
+        """A streamed response as server-sent events: created, then completed with the whole output."""
+        created = ResponseCreatedEvent(type="response.created", sequence_number=0,
+                                       response=response.model_copy(update={"output": [], "status": "in_progress"}))
+        completed = ResponseCompletedEvent(type="response.completed", sequence_number=1, response=response)
+        return "".join(f"event: {event.type}\ndata: {event.model_dump_json(exclude_none=True)}\n\n"
+                       for event in (created, completed))
+
+    def _response(self, request: dict) -> Response:
+        tools = [SimpleNamespace(name=tool["name"], description=tool.get("description"),
+                                 params_json_schema=tool.get("parameters", {}))
+                 for tool in request.get("tools", []) if tool.get("type") == "function"]
+        output, prompt_tokens = self.model._decide(request.get("input", []), tools, [], request.get("instructions"))
+        output_tokens = self.model._output_tokens(output)
+        return Response(
+            id=f"resp_{self.responses}",
+            created_at=time.time(),
+            model=request.get("model", "fake-model"),
+            object="response",
+            output=output,
+            tool_choice="auto",
+            tools=[],
+            parallel_tool_calls=False,
+            status="completed",
+            usage=ResponseUsage(
+                input_tokens=prompt_tokens,
+                output_tokens=output_tokens,
+                total_tokens=prompt_tokens + output_tokens,
+                input_tokens_details=InputTokensDetails.model_validate({"cached_tokens": 0, "cache_write_tokens": 0}),
+                output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+            ),
+        )
+
+
+async def run_setup(name: str, server: StandInServer, args, max_keepalive: int, warmup: int) -> dict:
+    upstream = UpstreamClient(base_url=f"http://127.0.0.1:{server.port}/v1", max_connections=args.concurrency * 2,
+                              max_keepalive=max_keepalive, warmup_connections=warmup, max_retries=0)
+    server.reset()
+    await upstream.start()
+    accepted_at_start = server.connections
+    agent = build_shoe_store_agent("nested", "gpt-4o-mini")
+    # A fresh RunConfig resolves model names with the SDK's default client, i.e. the shared one
+    run_config = RunConfig(tracing_disabled=True)
+    messages = [message for dialogue in DIALOGUES.values() for message in dialogue]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[tuple] = []
+
+    async def turn(index: int):
+        user_id = f"upstream-{name}-{index}"
+        context = UserContext(user_id=user_id, email=f"{user_id}@example.com")
+        async with semaphore:
+            start = time.perf_counter()
+            await Runner.run(agent, messages[index % len(messages)], context=context, run_config=run_config)
+            latencies.append((index, time.perf_counter() - start))
+
+    try:
+        await asyncio.gather(*(turn(index) for index in range(args.turns)))
+    finally:
+        stats = upstream.stats()
+        await upstream.close()
+    first_wave = [seconds for index, seconds in latencies if index < args.concurrency]
+    return {
+        "name": name,
+        "first_wave": percentile(first_wave, 50),
+        "p50": percentile([seconds for _, seconds in latencies], 50),
+        "p95": percentile([seconds for _, seconds in latencies], 95),
+        "model_calls": server.responses,
+        "accepted": server.connections - accepted_at_start,
+        "client": stats,
+    }
+
+
+async def run(args) -> List[str]:
+    server = StandInServer(args.latency, args.connect_delay)
+    await server.start()
+    try:
+        results = [
+            await run_setup("no keep-alive", server, args, 0, 0),
+            await run_setup("pooled", server, args, args.concurrency, 0),
+            await run_setup("pooled + warmup", server, args, args.concurrency, args.concurrency),
+        ]
+    finally:
+        await server.close()
+
+    ms = lambda seconds: f"{seconds * 1000:6.0f} ms"
+    print(f"{args.turns} turns, {args.concurrency} at a time; stand-in answers in {args.latency * 1000:.0f} ms, "
+          f"new connections wait {args.connect_delay * 1000:.0f} ms")
+    print(f"{'':<17}{'first wave':>12}{'p50':>11}{'p95':>11}{'model calls':>13}{'connections':>13}{'reused':>8}")
+    for result in results:
+        client = result["client"]
+        print(f"{result['name']:<17}{ms(result['first_wave']):>12}{ms(result['p50']):>11}{ms(result['p95']):>11}"
+              f"{result['model_calls']:>13}{result['accepted']:>13}{client['reuse_ratio'] or 0:>8.0%}")
+
+    problems = []
+    for result in results:
+        client = result["client"]
+        sent = client["requests"] - client["warmup"]["connections"]
+        if sent != result["model_calls"] or result["model_calls"] <= args.turns:
+            problems.append(f"{result['name']}: the stand-in served {result['model_calls']} model calls, "
+                            f"the shared client sent {sent} for {args.turns} turns")
+    unpooled, pooled, warmed = results
+    if pooled["accepted"] >= unpooled["accepted"]:
+        problems.append(f"pooling opened {pooled['accepted']} connections, no keep-alive {unpooled['accepted']}")
+    if warmed["first_wave"] >= pooled["first_wave"]:
+        problems.append(f"warmup did not speed up the first turns ({ms(pooled['first_wave'])} -> "
+                        f"{ms(warmed['first_wave'])})")
+    return problems
+
+
+async def serve(port: int, latency: float, connect_delay: float):
+    server = StandInServer(latency, connect_delay)
+    await server.start(port)
+    print(f"🚀 Stand-in model API on http://127.0.0.1:{server.port}/v1")
+    await server.server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per stand-in model response")
+    parser.add_argument("--connect-delay", type=float, default=0.15, help="Seconds to set up a new connection")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Only run the stand-in server on PORT")
+    args = parser.parse_args(argv)
+    if args.serve is not None:
+        asyncio.run(serve(args.serve, args.latency, args.connect_delay))
+        return 0
+    problems = asyncio.run(run(args))
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Every model call went through the shared pool; keep-alive and warmup cut connection setup")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
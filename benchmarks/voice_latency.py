@@ -0,0 +1,98 @@
+"""
+Time-to-first-audio benchmark for /voice/ws with fake model, STT and TTS providers.
+
+Opens many concurrent voice sessions against the in-process API. Each session streams
+20ms PCM frames of "speech" followed by a silent frame (which ends the turn for the fake STT)
+and measures the time from end of speech to the first synthesized audio chunk.
+
+    python -m benchmarks.voice_latency --sessions 50 --turns 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+import numpy as np
+import uvicorn
+import websockets
+from agents import RunConfig
+from agents.voice import VoicePipelineConfig
+
+import api.main
+from benchmarks.fake_model import FakeModelProvider
+from benchmarks.fake_voice import FakeVoiceModelProvider
+from benchmarks.stream_latency import _free_port
+from cases.shoe_store_case.voice import shoe_store_tts_settings
+
+FRAME = np.full(480, 1000, dtype=np.int16).tobytes()  # 20ms at 24kHz
+SILENCE = np.zeros(480, dtype=np.int16).tobytes()
+TRANSCRIPTS = ["What shoes do you sell?", "Add 2 small running shoes to my cart", "What's my cart total?"]
+
+
+async def _voice_session(url: str, user: int, turns: int, speech_frames: int) -> list:
+    first_audio = []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"user_id": f"voice-{user}", "email": f"voice-{user}@example.com"}))
+        for _ in range(turns):
+            for _ in range(speech_frames):
+                await ws.send(FRAME)
+            await ws.send(SILENCE)
+            end_of_speech = time.perf_counter()
+            got_audio = False
+            while True:
+                message = await ws.recv()
+                if isinstance(message, bytes):
+                    if not got_audio:
+                        first_audio.append(time.perf_counter() - end_of_speech)
+                        got_audio = True
+                elif json.loads(message)["event"] in ("turn_ended", "error"):
+                    break
+        await ws.send(json.dumps({"event": "end"}))
+        async for message in ws:
+            if not isinstance(message, bytes) and json.loads(message)["event"] == "session_ended":
+                break
+    return first_audio
+
+
+async def run(sessions: int, turns: int, latency: float, tts_latency: float):
+    api.main.run_config = RunConfig(model_provider=FakeModelProvider(latency, 0.005), tracing_disabled=True)
+    api.main.voice_pipeline_config = VoicePipelineConfig(
+        model_provider=FakeVoiceModelProvider(TRANSCRIPTS, stt_latency=0.05, tts_latency=tts_latency, chunk_delay=0.01),
+        tts_settings=shoe_store_tts_settings(),
+        tracing_disabled=True,
+    )
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api.main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        _voice_session(f"ws://127.0.0.1:{port}/voice/ws", user, turns, speech_frames=25) for user in range(sessions)
+    ])
+    elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    first_audio = sorted(t for session in results for t in session)
+    print(f"{sessions} concurrent sessions x {turns} turns in {elapsed:.2f}s "
+          f"(fake model {latency * 1000:.0f} ms/call, fake TTS {tts_latency * 1000:.0f} ms to first chunk)")
+    print(f"Time to first audio: median {statistics.median(first_audio) * 1000:.0f} ms, "
+          f"p95 {first_audio[int(len(first_audio) * 0.95) - 1] * 1000:.0f} ms, max {first_audio[-1] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake model call")
+    parser.add_argument("--tts-latency", type=float, default=0.1, help="Seconds before the first TTS chunk")
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.turns, args.latency, args.tts_latency))
@@ -0,0 +1,320 @@
+import threading
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+# Microphone audio is cleaned up before it goes to speech to text. Everything here works on
+# int16 PCM with NumPy only: no agents.voice import, so it is cheap to load on first voice use.
+
+STT_SAMPLE_RATE = 16000  # plenty for speech, a third of a 48kHz capture
+REALTIME_SAMPLE_RATE = 24000  # what the streamed transcription session expects
+MIN_SPEECH_RMS = 250.0  # int16 RMS below which a frame is never speech
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """A 1-D int16 array from a (frames,) or (frames, channels) buffer."""
+    if samples.ndim == 2:
+        if samples.shape[1] == 1:
+            return samples[:, 0].astype(np.int16, copy=False)
+        return samples.mean(axis=1).astype(np.int16)
+    return samples.astype(np.int16, copy=False)
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """
+    Resamples mono int16 audio. Integer downsampling ratios (48k or 32k to 16k, 48k to 24k)
+    average each group of samples, which also filters what would alias; other ratios are
+    smoothed over the ratio's width and linearly interpolated.
+    """
+    if from_rate == to_rate or not len(samples):
+        return samples
+    if from_rate % to_rate == 0:
+        factor = from_rate // to_rate
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1).round().astype(np.int16)
+
+    audio = samples.astype(np.float32)
+    ratio = from_rate / to_rate
+    if ratio > 1:
+        width = int(np.ceil(ratio))
+        audio = np.convolve(audio, np.full(width, 1.0 / width, dtype=np.float32), mode="same")
+    positions = np.arange(int(round(len(samples) / ratio))) * ratio
+    return np.interp(positions, np.arange(len(samples)), audio).round().astype(np.int16)
+
+
+def frame_rms(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """RMS level of each complete `frame_size` frame; a trailing partial frame is ignored."""
+    frames = len(samples) // frame_size
+    audio = samples[:frames * frame_size].reshape(frames, frame_size).astype(np.float32)
+    return np.sqrt(np.mean(audio * audio, axis=1))
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int, padding_ms: int = 150, frame_ms: int = 20,
+                 threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Cuts leading and trailing silence, keeping `padding_ms` around the speech so the first and
+    last syllables are not clipped. Without a threshold, frames count as speech when they are
+    well above the recording's own noise floor. Returns an empty array when nothing is speech.
+    """
+    frame_size = sample_rate * frame_ms // 1000
+    levels = frame_rms(samples, frame_size)
+    if not len(levels):
+        return samples
+    if threshold is None:
+        threshold = max(MIN_SPEECH_RMS, 3.0 * float(np.percentile(levels, 10)))
+    voiced = np.flatnonzero(levels > threshold)
+    if not len(voiced):
+        return samples[:0]
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame_size - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_size + padding)
+    return samples[start:end]
+
+
+def preprocess_for_stt(samples: np.ndarray, sample_rate: int, target_rate: int = STT_SAMPLE_RATE,
+                       trim: bool = True) -> np.ndarray:
+    """Mono, silence trimmed and resampled to `target_rate`: the smallest buffer that still transcribes the same."""
+    audio = to_mono(samples)
+    if trim:
+        audio = trim_silence(audio, sample_rate)
+    return resample(audio, sample_rate, target_rate)
+
+
+class RingBuffer:
+    """
+    Preallocated int16 buffer holding the last `capacity` samples. Writes copy into place and
+    never allocate, so it can be filled from an audio callback; the oldest samples are
+    overwritten once it is full.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.written = 0
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+
+    @property
+    def full(self) -> bool:
+        return self.written >= self.capacity
+
+    def write(self, samples: np.ndarray):
+        self.written += len(samples)
+        if len(samples) >= self.capacity:
+            self._data[:] = samples[-self.capacity:]
+            self._position = 0
+            return
+        first = min(len(samples), self.capacity - self._position)
+        self._data[self._position:self._position + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self._position = (self._position + len(samples)) % self.capacity
+
+    def view(self) -> np.ndarray:
+        """The buffered samples, oldest first, as a new contiguous array."""
+        if not self.full:
+            return self._data[:self._position].copy()
+        return np.concatenate((self._data[self._position:], self._data[:self._position]))
+
+    def clear(self):
+        self.written = 0
+        self._position = 0
+
+
+class EndpointDetector:
+    """
+    Streaming energy-based voice activity detection, fed with chunks of any size.
+
+    Speech starts after `min_speech_ms` of frames above the threshold and ends after
+    `end_silence_ms` of frames below it. The threshold adapts to three times the noise floor
+    measured on the non-speech frames (never below MIN_SPEECH_RMS) unless one is given.
+    `speech_start` and `speech_end` are sample offsets from the first sample fed.
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 20, min_speech_ms: int = 100, end_silence_ms: int = 700,
+                 threshold: Optional[float] = None):
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.end_silence_frames = max(1, end_silence_ms // frame_ms)
+        self.fixed_threshold = threshold
+        self.noise_floor: Optional[float] = None
+        self._pending = np.zeros(0, dtype=np.int16)
+        self.reset()
+
+    def reset(self):
+        """Starts listening for the next utterance; the noise floor estimate is kept."""
+        self.position = 0
+        self.speech_start: Optional[int] = None
+        self.speech_end: Optional[int] = None
+        self._voiced_run = 0
+        self._silent_run = 0
+
+    @property
+    def threshold(self) -> float:
+        if self.fixed_threshold is not None:
+            return self.fixed_threshold
+        return max(MIN_SPEECH_RMS, 3.0 * (self.noise_floor or 0.0))
+
+    @property
+    def in_speech(self) -> bool:
+        return self.speech_start is not None and self.speech_end is None
+
+    @property
+    def ended(self) -> bool:
+        return self.speech_end is not None
+
+    def feed(self, samples: np.ndarray) -> bool:
+        """Processes a chunk; returns True once the end of speech has been detected."""
+        if len(self._pending):
+            samples = np.concatenate((self._pending, samples))
+        frames = len(samples) // self.frame_size
+        self._pending = samples[frames * self.frame_size:]
+        for level in frame_rms(samples, self.frame_size):
+            self._frame(float(level))
+            self.position += self.frame_size
+        return self.ended
+
+    def _frame(self, level: float):
+        if self.ended:
+            return
+        if level > self.threshold:
+            self._voiced_run += 1
+            self._silent_run = 0
+            if self.speech_start is None and self._voiced_run >= self.min_speech_frames:
+                self.speech_start = self.position - (self._voiced_run - 1) * self.frame_size
+            return
+        self.noise_floor = level if self.noise_floor is None else 0.95 * self.noise_floor + 0.05 * level
+        self._voiced_run = 0
+        if self.speech_start is not None:
+            self._silent_run += 1
+            if self._silent_run >= self.end_silence_frames:
+                self.speech_end = self.position - (self._silent_run - 1) * self.frame_size
+
+
+class SpeechRecorder:
+    """
+    Records one utterance from a microphone callback into a preallocated buffer and stops by
+    itself: `done` is set once the speaker has been quiet for `end_silence_ms`, when nobody
+    has spoken for `no_speech_seconds`, or when `max_seconds` is reached.
+
+        recorder = SpeechRecorder(48000)
+        with sd.InputStream(samplerate=48000, channels=1, dtype="int16", callback=recorder.callback):
+            recorder.done.wait()
+        audio = recorder.utterance()  # 16kHz mono, silence trimmed
+    """
+
+    def __init__(self, sample_rate: int, max_seconds: float = 30.0, end_silence_ms: int = 800,
+                 no_speech_seconds: float = 8.0):
+        self.sample_rate = sample_rate
+        self.buffer = RingBuffer(int(sample_rate * max_seconds))
+        self.vad = EndpointDetector(sample_rate, end_silence_ms=end_silence_ms)
+        self.no_speech_samples = int(sample_rate * no_speech_seconds)
+        self.done = threading.Event()
+
+    def callback(self, indata, frames, time, status):
+        """sounddevice.InputStream callback; runs on the audio thread."""
+        if self.done.is_set():
+            return
+        samples = to_mono(indata)
+        self.buffer.write(samples)
+        self.vad.feed(samples)
+        if self.vad.ended or self.buffer.full or (self.vad.speech_start is None and self.buffer.written >= self.no_speech_samples):
+            self.done.set()
+
+    @property
+    def heard_speech(self) -> bool:
+        return self.vad.speech_start is not None
+
+    def utterance(self, target_rate: int = STT_SAMPLE_RATE) -> np.ndarray:
+        """The recorded speech, ready for speech to text; empty when nothing was said."""
+        if not self.heard_speech:
+            return np.zeros(0, dtype=np.int16)
+        return preprocess_for_stt(self.buffer.view(), self.sample_rate, target_rate)
+
+
+class SpeechGate:
+    """
+    Holds back idle audio on a live stream so only speech is uploaded to the transcription
+    session. Frames are buffered (the last `preroll_ms` of them) until speech starts, then
+    released with everything that follows until `hangover_ms` of silence. The hangover must
+    be longer than the transcriber's own end-of-turn silence so that it still sees the pause.
+    """
+
+    def __init__(self, sample_rate: int, preroll_ms: int = 300, hangover_ms: int = 1500):
+        self.vad = EndpointDetector(sample_rate, min_speech_ms=60, end_silence_ms=hangover_ms)
+        self.preroll = RingBuffer(sample_rate * preroll_ms // 1000)
+        self.passed = 0
+        self.held = 0
+
+    def feed(self, samples: np.ndarray) -> Optional[np.ndarray]:
+        """The audio to forward for this chunk, or None while nobody is speaking."""
+        self.vad.feed(samples)
+        if self.vad.ended:
+            self.vad.reset()
+        elif not self.vad.in_speech:
+            self.held += len(samples)
+            self.preroll.write(samples)
+            return None
+        if len(self.preroll):
+            # The start of the utterance is still in the pre-roll: release it first
+            self.held -= len(self.preroll)
+            samples = np.concatenate((self.preroll.view(), samples))
+            self.preroll.clear()
+        self.passed += len(samples)
+        return samples
+
+
+class StreamingPlayer:
+    """
+    Plays int16 PCM as it arrives instead of after the whole reply has been synthesized.
+    Chunks are queued with `write`; `callback` (a sounddevice.OutputStream callback) copies
+    them into the device buffer and plays silence while waiting for more. After `finish`,
+    `drained` is set once everything queued has been played.
+
+        player = StreamingPlayer()
+        with sd.OutputStream(samplerate=24000, channels=1, dtype="int16", callback=player.callback):
+            async for event in result.stream():
+                player.write(event.data)
+            player.finish()
+            await asyncio.to_thread(player.drained.wait)
+    """
+
+    def __init__(self):
+        self._chunks: "deque[np.ndarray]" = deque()
+        self._offset = 0
+        self._finished = False
+        self.started = False
+        self.samples_played = 0
+        self.underruns = 0
+        self.drained = threading.Event()
+
+    def write(self, chunk: np.ndarray):
+        if len(chunk):
+            self._chunks.append(to_mono(chunk))
+
+    def finish(self):
+        self._finished = True
+
+    def callback(self, outdata, frames, time, status):
+        """sounddevice.OutputStream callback; runs on the audio thread."""
+        filled = 0
+        while filled < frames and self._chunks:
+            chunk = self._chunks[0]
+            count = min(frames - filled, len(chunk) - self._offset)
+            outdata[filled:filled + count, 0] = chunk[self._offset:self._offset + count]
+            filled += count
+            self._offset += count
+            if self._offset == len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+        outdata[filled:] = 0
+        if filled:
+            self.started = True
+            self.samples_played += filled
+        if filled < frames:
+            if self._finished:
+                self.drained.set()
+            elif self.started:
+                self.underruns += 1
@@ -0,0 +1,273 @@
+import functools
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+def to_cents(price: float) -> int:
+    return int(round(price * 100))
+
+
+def format_cents(cents: int) -> str:
+    return f"${cents / 100:.2f}"
+
+
+class CartLine:
+    __slots__ = ("product", "size", "quantity", "unit_price_cents")
+
+    def __init__(self, product: str, size: str, quantity: int, unit_price_cents: int):
+        self.product = product
+        self.size = size
+        self.quantity = quantity
+        self.unit_price_cents = unit_price_cents
+
+    @property
+    def line_total_cents(self) -> int:
+        return self.quantity * self.unit_price_cents
+
+    def copy(self) -> "CartLine":
+        return CartLine(self.product, self.size, self.quantity, self.unit_price_cents)
+
+
+class Cart:
+    """One user's cart: lines keyed by (product, size) plus running totals. Its lock is the store's stripe for the user."""
+
+    __slots__ = ("lines", "total_cents", "item_count")
+
+    def __init__(self):
+        self.lines: Dict[Tuple[str, str], CartLine] = {}
+        self.total_cents = 0
+        self.item_count = 0
+
+
+@functools.lru_cache(maxsize=4096)
+def _key(product: str, size: str) -> Tuple[str, str]:
+    # Cached (the same few product/size pairs recur) and shared by every line of that pair
+    return product.strip().lower(), size.strip().lower()
+
+
+class CartBackend(ABC):
+    """Carts keyed by user; products and sizes are matched case-insensitively."""
+
+    @abstractmethod
+    def add(self, user_id: str, product: str, size: str, quantity: int, unit_price_cents: int) -> int:
+        """Adds `quantity` of a product/size, merging with an existing line; returns the line's new quantity."""
+
+    @abstractmethod
+    def set_quantity(self, user_id: str, product: str, size: str, quantity: int) -> Optional[CartLine]:
+        """
+        Sets a line's quantity, removing the line when quantity is 0 or less.
+        Returns the previous line, or None if the item is not in the cart.
+        """
+
+    @abstractmethod
+    def lines(self, user_id: str) -> List[CartLine]:
+        """A snapshot of the cart's lines, in the order they were added."""
+
+    @abstractmethod
+    def total_cents(self, user_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def item_count(self, user_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def checkout(self, user_id: str) -> Tuple[List[CartLine], int]:
+        """Atomically takes the cart's lines and total and leaves the cart empty."""
+
+    @abstractmethod
+    def clear(self, user_id: str):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of carts held."""
+
+
+class CartStore(CartBackend):
+    """
+    Carts keyed by user, with O(1) line operations and totals.
+
+    Products and sizes are matched case-insensitively everywhere. Each cart keeps its total
+    in integer cents, updated on every change, so reading the total never rescans the lines.
+    Operations on one cart are serialized by one of `stripes` locks picked by hashing the
+    user (tools run in worker threads), rather than a lock per cart; users sharing a stripe
+    only wait on each other when their calls overlap. `checkout` and `clear` take the cart
+    out under that lock, so a concurrent add lands either before them or in a fresh cart.
+    """
+
+    def __init__(self, stripes: int = 256):
+        self._carts: Dict[str, Cart] = {}
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._stripe_count = stripes
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        return self._stripes[hash(user_id) % self._stripe_count]
+
+    def add(self, user_id: str, product: str, size: str, quantity: int, unit_price_cents: int) -> int:
+        key = _key(product, size)
+        with self._lock(user_id):
+            cart = self._carts.get(user_id)
+            if cart is None:
+                cart = self._carts[user_id] = Cart()
+            line = cart.lines.get(key)
+            if line is None:
+                line = cart.lines[key] = CartLine(key[0], key[1], 0, unit_price_cents)
+            line.quantity += quantity
+            cart.total_cents += quantity * line.unit_price_cents
+            cart.item_count += quantity
+            return line.quantity
+
+    def set_quantity(self, user_id: str, product: str, size: str, quantity: int) -> Optional[CartLine]:
+        key = _key(product, size)
+        with self._lock(user_id):
+            cart = self._carts.get(user_id)
+            line = cart.lines.get(key) if cart is not None else None
+            if line is None:
+                return None
+            previous = line.copy()
+            new_quantity = max(quantity, 0)
+            cart.total_cents += (new_quantity - line.quantity) * line.unit_price_cents
+            cart.item_count += new_quantity - line.quantity
+            if new_quantity == 0:
+                del cart.lines[key]
+            else:
+                line.quantity = new_quantity
+            return previous
+
+    def lines(self, user_id: str) -> List[CartLine]:
+        with self._lock(user_id):
+            cart = self._carts.get(user_id)
+            return [line.copy() for line in cart.lines.values()] if cart is not None else []
+
+    def total_cents(self, user_id: str) -> int:
+        cart = self._carts.get(user_id)
+        return cart.total_cents if cart is not None else 0
+
+    def item_count(self, user_id: str) -> int:
+        cart = self._carts.get(user_id)
+        return cart.item_count if cart is not None else 0
+
+    def checkout(self, user_id: str) -> Tuple[List[CartLine], int]:
+        # Once popped under the user's lock no writer can reach the cart, so it is read unlocked
+        with self._lock(user_id):
+            cart = self._carts.pop(user_id, None)
+        if cart is None:
+            return [], 0
+        return list(cart.lines.values()), cart.total_cents
+
+    def clear(self, user_id: str):
+        with self._lock(user_id):
+            self._carts.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._carts)
+
+
+class SQLiteCartStore(CartBackend):
+    """
+    Carts in a SQLite database (WAL mode), shared by every worker process on the host.
+
+    Each operation is a single statement (an upsert for `add`, DELETE ... RETURNING for
+    `checkout`) or an IMMEDIATE transaction, so concurrent workers never lose an update or
+    check out the same cart twice. Totals are summed over the cart's lines through the
+    primary key index.
+    """
+
+    def __init__(self, path: str = "carts.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # Lines keep their rowid when updated, so ORDER BY rowid is the order they were added in
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS cart_lines (
+                user_id TEXT NOT NULL,
+                product TEXT NOT NULL,
+                size TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                unit_price_cents INTEGER NOT NULL,
+                PRIMARY KEY (user_id, product, size)
+            );
+        """)
+
+    def add(self, user_id, product, size, quantity, unit_price_cents) -> int:
+        product, size = _key(product, size)
+        with self._lock:
+            # fetchall, not fetchone: a RETURNING statement only commits once it has been stepped to the end
+            ((new_quantity,),) = self._db.execute("""
+                INSERT INTO cart_lines (user_id, product, size, quantity, unit_price_cents) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, product, size) DO UPDATE SET quantity = quantity + excluded.quantity
+                RETURNING quantity
+            """, (user_id, product, size, quantity, unit_price_cents)).fetchall()
+        return new_quantity
+
+    def set_quantity(self, user_id, product, size, quantity) -> Optional[CartLine]:
+        product, size = _key(product, size)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT quantity, unit_price_cents FROM cart_lines WHERE user_id = ? AND product = ? AND size = ?",
+                    (user_id, product, size)).fetchone()
+                if row is not None:
+                    if quantity > 0:
+                        self._db.execute(
+                            "UPDATE cart_lines SET quantity = ? WHERE user_id = ? AND product = ? AND size = ?",
+                            (quantity, user_id, product, size))
+                    else:
+                        self._db.execute(
+                            "DELETE FROM cart_lines WHERE user_id = ? AND product = ? AND size = ?",
+                            (user_id, product, size))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return CartLine(product, size, row[0], row[1]) if row else None
+
+    def lines(self, user_id) -> List[CartLine]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT product, size, quantity, unit_price_cents FROM cart_lines WHERE user_id = ? ORDER BY rowid",
+                (user_id,)).fetchall()
+        return [CartLine(*row) for row in rows]
+
+    def total_cents(self, user_id) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(quantity * unit_price_cents), 0) FROM cart_lines WHERE user_id = ?",
+                (user_id,)).fetchone()[0]
+
+    def item_count(self, user_id) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(quantity), 0) FROM cart_lines WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def checkout(self, user_id) -> Tuple[List[CartLine], int]:
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM cart_lines WHERE user_id = ? RETURNING rowid, product, size, quantity, unit_price_cents",
+                (user_id,)).fetchall()
+        lines = [CartLine(*row[1:]) for row in sorted(rows)]
+        return lines, sum(line.line_total_cents for line in lines)
+
+    def clear(self, user_id):
+        with self._lock:
+            self._db.execute("DELETE FROM cart_lines WHERE user_id = ?", (user_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(DISTINCT user_id) FROM cart_lines").fetchone()[0]
+
+
+def cart_store_from_env() -> CartBackend:
+    """Builds the store selected by CART_STORE ("memory" or "sqlite", with CART_DB_PATH)."""
+    backend = os.getenv("CART_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteCartStore(os.getenv("CART_DB_PATH", "carts.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown CART_STORE: {backend}")
+    return CartStore()
@@ -0,0 +1,450 @@
+import csv
+import difflib
+import functools
+import heapq
+import io
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .tool_output import ToolOutput
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "catalog.json")
+
+SIZE_ALIASES = {
+    "s": "small", "sm": "small",
+    "m": "medium", "med": "medium", "md": "medium",
+    "l": "large", "lg": "large",
+    "xl": "extra large", "xs": "extra small",
+}
+STOP_WORDS = {"a", "an", "and", "any", "do", "for", "have", "i", "in", "is", "me", "my", "of", "pair", "pairs",
+              "shoe", "shoes", "show", "some", "the", "to", "what", "with", "you", "your"}
+SUFFIXES = ("ning", "ners", "ing", "ner", "ers", "er", "es", "s")
+
+# Field weights in the inverted index: a name match beats a tag match, which beats a description match
+NAME_WEIGHT, TAG_WEIGHT, DESCRIPTION_WEIGHT = 3.0, 2.0, 1.0
+FUZZY_CUTOFF = 0.8
+# Query tokens whose close spellings are remembered per snapshot; queries are user text, so it is capped
+FUZZY_CACHE_SIZE = 4096
+# Cart tools accept a product name with at most this many typos (one for names under 6 letters)
+MAX_NAME_TYPOS = 2
+LISTING_LIMIT = 20
+
+
+def stem(token: str) -> str:
+    """Crude suffix stripping so "runners", "running" and "runner" all index as "run"."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between `a` and `b`, or `limit + 1` once it is known to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", text.lower())
+
+
+def normalize_size(size: str) -> str:
+    size = size.strip().lower()
+    return SIZE_ALIASES.get(size, size)
+
+
+def format_price(cents: int, currency: str) -> str:
+    return f"${cents / 100:.2f} {currency}"
+
+
+@dataclass(frozen=True)
+class Variant:
+    sku: str
+    size: str
+    price_cents: int
+    stock: Optional[int] = None  # None when stock isn't tracked for the variant
+
+    @property
+    def in_stock(self) -> bool:
+        return self.stock is None or self.stock > 0
+
+
+@dataclass
+class Product:
+    key: str
+    name: str
+    description: str
+    price_cents: int
+    currency: str = "USD"
+    category: str = ""
+    tags: List[str] = field(default_factory=list)
+    variants: Dict[str, Variant] = field(default_factory=dict)  # keyed by lowercased size
+
+    def variant(self, size: str) -> Optional[Variant]:
+        return self.variants.get(normalize_size(size))
+
+    @property
+    def sizes(self) -> List[str]:
+        return [variant.size for variant in self.variants.values()]
+
+
+@dataclass
+class SearchHit:
+    product: Product
+    score: float
+    variant: Optional[Variant] = None
+
+
+def _price_cents(value) -> int:
+    return int(round(float(value) * 100))
+
+
+def _product_from_dict(key: str, data: dict) -> Product:
+    price_cents = _price_cents(data.get("price", 0))
+    variants = data.get("variants")
+    if variants is None:
+        # The original products dict: a bare list of sizes with no SKUs or stock
+        variants = [{"size": size} for size in data.get("sizes", [])]
+    product = Product(
+        key=data.get("key", key).lower(),
+        name=data.get("name", key.title()),
+        description=data.get("description", ""),
+        price_cents=price_cents,
+        currency=data.get("currency", "USD"),
+        category=data.get("category", ""),
+        tags=list(data.get("tags", [])),
+    )
+    for variant in variants:
+        size = variant["size"]
+        product.variants[normalize_size(size)] = Variant(
+            sku=variant.get("sku", f"{product.key}-{size}".upper()),
+            size=size,
+            price_cents=_price_cents(variant["price"]) if "price" in variant else price_cents,
+            stock=int(variant["stock"]) if variant.get("stock") not in (None, "") else None,
+        )
+    return product
+
+
+def _parse_json(text: str) -> List[Product]:
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = [dict(value, key=value.get("key", key)) for key, value in data.items()]
+    return [_product_from_dict(entry.get("key") or entry["name"], entry) for entry in data]
+
+
+def _parse_csv(text: str) -> List[Product]:
+    """One row per variant: key,name,category,description,tags,price,currency,sku,size,stock (tags split on "|")."""
+    rows: Dict[str, dict] = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        key = (row.get("key") or row["name"]).strip().lower()
+        entry = rows.setdefault(key, {
+            "key": key,
+            "name": row.get("name") or key.title(),
+            "category": row.get("category", ""),
+            "description": row.get("description", ""),
+            "tags": [tag for tag in (row.get("tags") or "").split("|") if tag],
+            "price": row.get("price") or 0,
+            "currency": row.get("currency") or "USD",
+            "variants": [],
+        })
+        variant = {"sku": row.get("sku") or None, "size": row["size"], "stock": row.get("stock")}
+        if row.get("variant_price"):
+            variant["price"] = row["variant_price"]
+        entry["variants"].append({name: value for name, value in variant.items() if value is not None})
+    return [_product_from_dict(key, entry) for key, entry in rows.items()]
+
+
+def load_products(path: str, use_mmap: bool = False) -> List[Product]:
+    """Loads products from a .json or .csv file, optionally reading it through a memory map."""
+    with open(path, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                text = mapped[:].decode("utf-8")
+        else:
+            text = f.read().decode("utf-8")
+    if path.lower().endswith(".csv"):
+        return _parse_csv(text)
+    return _parse_json(text)
+
+
+class CatalogSnapshot:
+    """
+    An immutable, fully indexed view of the catalog. Reloads build a new snapshot and swap
+    it in, so requests never see a half-built index and never wait for a reload.
+    """
+
+    def __init__(self, products: List[Product], version: int):
+        self.version = version
+        self.loaded_at = time.time()
+        self.products: Dict[str, Product] = {product.key: product for product in products}
+        self.aliases: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}
+        self.index: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for product in products:
+            for alias in (product.key, product.name, product.name.lower().removesuffix(" shoes"), *[v.sku for v in product.variants.values()]):
+                self.aliases.setdefault(alias.strip().lower(), product.key)
+            for name in (product.key, product.name, product.name.lower().removesuffix(" shoes")):
+                self.names.setdefault(name.strip().lower(), product.key)
+            self._index(product, [product.key, product.name, product.category], NAME_WEIGHT)
+            self._index(product, product.tags, TAG_WEIGHT)
+            self._index(product, [product.description], DESCRIPTION_WEIGHT)
+        self.index = dict(self.index)
+        self.vocabulary = sorted(self.index)
+        self._close_spellings = functools.lru_cache(maxsize=FUZZY_CACHE_SIZE)(self._find_close_spellings)
+
+        # Responses are rendered once per load rather than on every tool call
+        self.responses: Dict[str, str] = {key: self._render(product) for key, product in self.products.items()}
+        self.variant_responses: Dict[Tuple[str, str], str] = {
+            (key, size): self._render_variant(product, variant)
+            for key, product in self.products.items() for size, variant in product.variants.items()
+        }
+        self._listings: Dict[type, str] = {}
+
+    def _index(self, product: Product, texts: List[str], weight: float):
+        for text in texts:
+            for token in tokenize(text):
+                if token in STOP_WORDS:
+                    continue
+                token = stem(token)
+                postings = self.index[token]
+                postings[product.key] = max(postings.get(product.key, 0.0), weight)
+
+    @staticmethod
+    def _stock(variant: Variant) -> str:
+        if variant.stock is None:
+            return variant.size
+        return f"{variant.size} ({variant.stock} in stock)" if variant.stock > 0 else f"{variant.size} (out of stock)"
+
+    def _render(self, product: Product) -> str:
+        sizes = ", ".join(self._stock(variant) for variant in product.variants.values())
+        return f"{product.name} - {format_price(product.price_cents, product.currency)}. {product.description} Sizes: {sizes}."
+
+    def _render_variant(self, product: Product, variant: Variant) -> str:
+        return (f"{product.name} in {variant.size} - {format_price(variant.price_cents, product.currency)}"
+                f" (SKU {variant.sku}). {product.description} Availability: {self._stock(variant)}.")
+
+    def listing(self, output: ToolOutput) -> str:
+        """The product listing in `output`'s encoding, rendered once per snapshot and encoding."""
+        listing = self._listings.get(type(output))
+        if listing is None:
+            products = list(self.products.values())
+            listing = output.products(
+                [(product.name, format_price(product.price_cents, product.currency), product.sizes)
+                 for product in products[:LISTING_LIMIT]],
+                more=max(0, len(products) - LISTING_LIMIT),
+            )
+            self._listings[type(output)] = listing
+        return listing
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Index terms for a query token: the exact stem, or close spellings of it."""
+        token = stem(token)
+        if token in self.index:
+            return [(token, 1.0)]
+        return [(term, difflib.SequenceMatcher(None, token, term).ratio()) for term in self._close_spellings(token)]
+
+    def _find_close_spellings(self, token: str) -> Tuple[str, ...]:
+        return tuple(difflib.get_close_matches(token, self.vocabulary, n=3, cutoff=FUZZY_CUTOFF))
+
+    def get(self, name: str) -> Optional[Product]:
+        """Exact lookup by key, name or SKU, ignoring case."""
+        key = self.aliases.get(name.strip().lower())
+        return self.products.get(key) if key else None
+
+    def match(self, name: str) -> Optional[Product]:
+        """
+        Exact lookup, or the one product whose name is within MAX_NAME_TYPOS edits of `name`
+        ("runing shoes"). Anything else, including names close to two products, is no match.
+        """
+        product = self.get(name)
+        if product is not None:
+            return product
+        name = name.strip().lower()
+        limit = MAX_NAME_TYPOS if len(name) >= 6 else 1
+        keys = {key for alias, key in self.names.items() if edit_distance(name, alias, limit) <= limit}
+        return self.products[keys.pop()] if len(keys) == 1 else None
+
+    def search(self, query: str, limit: int = 5) -> List[SearchHit]:
+        """
+        Ranks products for a free-text query such as "trail runners size M". Tokens are
+        stemmed and looked up in the inverted index (falling back to close spellings), scored
+        by field weight and rarity; a requested size narrows the results to products that
+        come in that size.
+        """
+        tokens = tokenize(query)
+        size = None
+        terms = []
+        for i, token in enumerate(tokens):
+            if token == "size" and i + 1 < len(tokens):
+                size = normalize_size(tokens[i + 1])
+            elif i > 0 and tokens[i - 1] == "size":
+                continue
+            elif normalize_size(token) in ("small", "medium", "large", "extra small", "extra large") and len(token) > 2:
+                size = normalize_size(token)
+            elif token not in STOP_WORDS:
+                terms.append(token)
+
+        scores: Dict[str, float] = defaultdict(float)
+        for token in terms:
+            for term, similarity in self._expand(token):
+                postings = self.index[term]
+                rarity = math.log(1 + len(self.products) / len(postings))
+                for key, weight in postings.items():
+                    scores[key] += weight * rarity * similarity
+
+        if not terms and size:
+            scores = dict.fromkeys(self.products, 1.0)
+        candidates = scores.keys()
+        if size:
+            sized = [key for key in candidates if size in self.products[key].variants]
+            candidates = sized or candidates
+            if not sized:
+                size = None
+        top = heapq.nlargest(limit, candidates, key=lambda key: (scores[key], self.products[key].name))
+        return [SearchHit(self.products[key], scores[key], self.products[key].variants[size] if size else None)
+                for key in top]
+
+    def response(self, hit: SearchHit) -> str:
+        if hit.variant is not None:
+            return self.variant_responses[(hit.product.key, normalize_size(hit.variant.size))]
+        return self.responses[hit.product.key]
+
+
+class Catalog:
+    """
+    Product catalog loaded from a JSON or CSV file, with a search index and prerendered
+    responses. Reads go to the current `CatalogSnapshot`; `start_watching` polls the file
+    from a background thread and swaps in a freshly built snapshot when it changes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH, use_mmap: bool = False):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._signature = self._file_signature()
+        self._snapshot = CatalogSnapshot(load_products(path, use_mmap), version=1)
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def get(self, name: str) -> Optional[Product]:
+        return self._snapshot.get(name)
+
+    def find(self, name: str) -> Optional[Product]:
+        """
+        The product a cart tool means: an exact match by key, name or SKU, or a name with a
+        typo or two. Free-text queries belong to `describe`; guessing here would add products
+        the customer never asked for.
+        """
+        return self._snapshot.match(name)
+
+    def search(self, query: str, limit: int = 5) -> List[SearchHit]:
+        return self._snapshot.search(query, limit)
+
+    def describe(self, query: Optional[str], limit: int = 3, output: Optional[ToolOutput] = None) -> str:
+        """Answer for get_product_info: the full listing, or the best matches for a query."""
+        snapshot = self._snapshot
+        output = output or ToolOutput()
+        if not query or query.strip().lower() in ("none", "all", "everything", "any"):
+            return snapshot.listing(output)
+        product = snapshot.get(query)
+        if product is not None:
+            return snapshot.responses[product.key]
+        hits = snapshot.search(query, limit)
+        if not hits:
+            return output.product_not_found(query, snapshot.listing(output))
+        return "\n".join(snapshot.response(hit) for hit in hits)
+
+    def _file_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> bool:
+        """Rebuilds the snapshot if the file changed; a broken file keeps the previous snapshot."""
+        try:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            snapshot = CatalogSnapshot(load_products(self.path, self.use_mmap), version=self._snapshot.version + 1)
+        except (OSError, ValueError, KeyError) as e:
+            self.last_error = str(e)
+            return False
+        self._signature = signature
+        self._snapshot = snapshot
+        self.reloads += 1
+        self.last_error = None
+        return True
+
+    def start_watching(self, interval: float = 2.0):
+        """Polls the catalog file every `interval` seconds from a daemon thread (no-op if already running)."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "version": snapshot.version,
+            "products": len(snapshot.products),
+            "variants": sum(len(product.variants) for product in snapshot.products.values()),
+            "index_terms": len(snapshot.index),
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+        }
+
+
+def catalog_from_env() -> Catalog:
+    """
+    Loads the catalog from CATALOG_PATH (defaults to the bundled catalog.json), memory-mapped
+    when CATALOG_MMAP is set, and watches it for changes every CATALOG_RELOAD_INTERVAL
+    seconds (0 disables hot reload).
+    """
+    catalog = Catalog(
+        os.getenv("CATALOG_PATH", DEFAULT_CATALOG_PATH),
+        use_mmap=os.getenv("CATALOG_MMAP", "false").lower() in ("1", "true", "yes"),
+    )
+    interval = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
+    if interval > 0:
+        catalog.start_watching(interval)
+    return catalog
@@ -0,0 +1,288 @@
+import os
+from typing import Dict, Optional
+
+from agents import Agent
+from agents.extensions.handoff_prompt import RECOMMENDED_PROMPT_PREFIX, prompt_with_handoff_instructions
+
+from .tools import (
+    add_items_to_cart, add_to_cart, generate_receipt, lookup_order, lookup_orders, get_product_info, view_cart,
+    view_cart_and_total, modify_cart_item, get_cart_total
+)
+from .context import UserContext
+from .snapshot import with_state_snapshot
+
+TOPOLOGIES = ("flat", "nested", "handoff")
+
+# Agents whose model can be set separately; the specialists do near-trivial work and can run on a faster model
+AGENT_ROLES = ("main", "order", "product", "cart", "checkout")
+
+ORDER_INSTRUCTIONS = """
+        You are specialized in checking order status. You can:
+        1. use lookup_order to check the status of an order
+        2. call lookup_order with None as the order ID to list the user's recent orders
+
+        If the order ID is not provided by the user and they are not asking about their recent orders, ask them to provide it.
+    """
+
+BATCHED_ORDER_INSTRUCTIONS = """
+        You are specialized in checking order status. You can:
+        1. use lookup_orders with every order ID the user mentions to check them all in one call
+        2. call lookup_orders with an empty list to list the user's recent orders
+
+        If the order ID is not provided by the user and they are not asking about their recent orders, ask them to provide it.
+    """
+
+PRODUCT_INSTRUCTIONS = """
+        You are specialized in providing product information. You can:
+        1. use get_product_info to provide information about a specific product or call it with None as parameter to list all available products.
+           You can pass what the user is looking for as is (e.g. "trail runners size M"); the tool finds the closest matching products and their stock.
+        """
+
+CART_INSTRUCTIONS = """
+        You are specialized in managing the user's cart. You can:
+        1. use add_to_cart to add items to the cart
+        2. use modify_cart_item to update the quantity of a specific item or remove it from the cart (set quantity as 0 to remove the item)
+        3. use view_cart to view cart contents
+        4. use get_cart_total to get the total price of the cart
+
+        If the size and quantity are not provided for the tools that require it, ask the user to provide them.
+    """
+
+BATCHED_CART_INSTRUCTIONS = """
+        You are specialized in managing the user's cart. You can:
+        1. use add_items_to_cart to add items to the cart, passing every item the user asked for in one call
+        2. use modify_cart_item to update the quantity of a specific item or remove it from the cart (set quantity as 0 to remove the item)
+        3. use view_cart_and_total to view cart contents and the total price
+
+        add_items_to_cart reports on each item separately; tell the user which items could not be added and why.
+        If the size and quantity are not provided for the tools that require it, ask the user to provide them.
+    """
+
+CHECKOUT_INSTRUCTIONS = """
+        You are specialized in handling checkout and generating receipts. You can:
+        1. use generate_receipt to create a receipt for the user's cart. The tool will return the order ID, email address in which the email was sent to and total price of the order.
+    """
+
+STORE_INSTRUCTIONS = """
+        You are an assistant for EOcean Shoe Store named Freddie.
+        You help customers with:
+        1. Checking order status
+        2. Providing product information
+        3. Adding products to cart
+        4. Viewing cart contents
+        5. Generating receipts, provide the user with order id and total price of the receipt.
+
+        Use a friendly, helpful tone. If you don't understand a request or if it's for products we don't carry, politely explain what we do offer.
+
+        Note that the user may be speaking to you via a voice interface, so ensure your responses are conversational and easily translatable to speech.
+    """
+
+FLAT_TOOL_INSTRUCTIONS = """
+        Use these tools directly:
+        - lookup_order to check the status of an order, or with None as the order ID to list the user's recent orders
+        - get_product_info for a specific product, or with None to list all available products
+        - add_to_cart, modify_cart_item (quantity 0 removes the item), view_cart and get_cart_total to manage the cart
+        - generate_receipt to check out; it returns the order ID, the email the receipt was sent to and the total price
+
+        If the size and quantity are not provided for the tools that require it, ask the user to provide them.
+    """
+
+BATCHED_FLAT_TOOL_INSTRUCTIONS = """
+        Use these tools directly:
+        - lookup_orders with every order ID the user mentions, or with an empty list to list the user's recent orders
+        - get_product_info for a specific product, or with None to list all available products
+        - add_items_to_cart with every item the user asked for in one call, modify_cart_item (quantity 0 removes the item)
+          and view_cart_and_total to manage the cart
+        - generate_receipt to check out; it returns the order ID, the email the receipt was sent to and the total price
+
+        If the size and quantity are not provided for the tools that require it, ask the user to provide them.
+    """
+
+HANDOFF_RULES = """
+        Do not use your own knowledge or make assumptions about the store's policies or products, hand off to the appropriate agent.
+    """
+
+
+def _specialists(models: dict, batched_tools: bool) -> dict:
+    """The four specialist agents shared by the nested and handoff topologies."""
+    return {
+        "order": Agent[UserContext](
+            name="Order Agent",
+            handoff_description="Specialist agent for order tracking based on the order ID.",
+            instructions=BATCHED_ORDER_INSTRUCTIONS if batched_tools else ORDER_INSTRUCTIONS,
+            model=models["order"],
+            tools=[lookup_orders] if batched_tools else [lookup_order]
+        ),
+        "product": Agent[UserContext](
+            name="Product Agent",
+            handoff_description="Specialist agent for providing specific product information and inventory details.",
+            instructions=PRODUCT_INSTRUCTIONS,
+            model=models["product"],
+            tools=[get_product_info]
+        ),
+        "cart": Agent[UserContext](
+            name="Cart Assistant",
+            handoff_description="Specialist agent for adding and modifying items to the cart and viewing cart contents or get the total price of cart.",
+            instructions=BATCHED_CART_INSTRUCTIONS if batched_tools else CART_INSTRUCTIONS,
+            model=models["cart"],
+            tools=[add_items_to_cart, modify_cart_item, view_cart_and_total] if batched_tools
+            else [add_to_cart, modify_cart_item, view_cart, get_cart_total]
+        ),
+        "checkout": Agent[UserContext](
+            name="Checkout Agent",
+            handoff_description="Specialist agent for generating receipts and handling checkout.",
+            instructions=CHECKOUT_INSTRUCTIONS,
+            model=models["checkout"],
+            tools=[generate_receipt]
+        ),
+    }
+
+
+def _add_state_snapshot(*agents: Agent[UserContext]):
+    """Turns the agents' instructions into dynamic ones that end with the user's cart and orders."""
+    for agent in agents:
+        agent.instructions = with_state_snapshot(agent.instructions)
+
+
+def _build_flat(models: dict, batched_tools: bool, state_snapshot: bool) -> Agent[UserContext]:
+    """One agent holding every function tool: one model call per action, plus the reply."""
+    if batched_tools:
+        instructions = STORE_INSTRUCTIONS + BATCHED_FLAT_TOOL_INSTRUCTIONS
+        tools = [lookup_orders, get_product_info, add_items_to_cart, modify_cart_item, view_cart_and_total, generate_receipt]
+    else:
+        instructions = STORE_INSTRUCTIONS + FLAT_TOOL_INSTRUCTIONS
+        tools = [lookup_order, get_product_info, add_to_cart, modify_cart_item, view_cart, get_cart_total, generate_receipt]
+    store_agent = Agent[UserContext](
+        name="ShoeStoreAgent",
+        instructions=instructions,
+        tools=tools,
+        model=models["main"]
+    )
+    if state_snapshot:
+        _add_state_snapshot(store_agent)
+    return store_agent
+
+
+def _build_nested(models: dict, batched_tools: bool, state_snapshot: bool) -> Agent[UserContext]:
+    """Specialists wrapped as tools of the main agent: at least two model calls per action."""
+    specialists = _specialists(models, batched_tools)
+    store_agent = Agent[UserContext](
+        name="ShoeStoreAgent",
+        instructions=STORE_INSTRUCTIONS,
+        tools=[
+            specialists["order"].as_tool(
+                tool_name="lookup_order",
+                tool_description="Check the status of one or more orders using their order IDs, or list the user's recent orders."
+            ),
+            specialists["product"].as_tool(
+                tool_name="get_product_info",
+                tool_description="Get information about a specific product or list all available products."
+            ),
+            specialists["cart"].as_tool(
+                tool_name="cart_management",
+                tool_description="Add one or more items to the cart, modify cart items, view cart contents, or get the total price of the cart."
+            ),
+            specialists["checkout"].as_tool(
+                tool_name="generate_receipt",
+                tool_description="Generate a receipt/checkout for the user's cart. On success, the tool will return generated order ID, email address in which the email was sent to and total price of the order."
+            )
+        ],
+        model=models["main"]
+    )
+    if state_snapshot:
+        _add_state_snapshot(store_agent, *specialists.values())
+    return store_agent
+
+
+def _build_handoff(models: dict, batched_tools: bool, state_snapshot: bool) -> Agent[UserContext]:
+    """Main agent hands the conversation off to a specialist, which can hand it back."""
+    specialists = _specialists(models, batched_tools)
+    for agent in specialists.values():
+        agent.instructions = prompt_with_handoff_instructions(agent.instructions + HANDOFF_RULES)
+
+    store_agent = Agent[UserContext](
+        name="ShoeStoreAgent",
+        handoff_description="Main agent for EOcean Shoe Store, coordinating between order, product, cart and checkout agents.",
+        instructions=f"""
+        {RECOMMENDED_PROMPT_PREFIX}
+
+        You are an assistant for EOcean Shoe Store named Freddie.
+        You help customers with following:
+        1. For checking order status, handoff to the Order Agent.
+        2. For providing product information, handoff to the Product Agent.
+        3. handoff to Cart Assistant for adding products to cart, modifying cart items, viewing cart contents or the cart total
+        4. handoff to Checkout Agent for generating receipts
+
+        Do not use your own knowledge or make assumptions about the store's policies or products, hand off to the appropriate agent.
+        Do not mention that you are transferring the user to another agent.
+        Use a friendly, helpful tone. If you don't understand a request or if it's for products we don't carry, politely explain what we do offer.
+    """,
+        handoffs=list(specialists.values()),
+        model=models["main"]
+    )
+
+    for agent in specialists.values():
+        agent.handoffs.append(store_agent)
+    if state_snapshot:
+        _add_state_snapshot(store_agent, *specialists.values())
+    return store_agent
+
+
+def build_shoe_store_agent(topology: str = "nested", model: str = "gpt-4o-mini", batched_tools: bool = True,
+                           agent_models: Optional[Dict[str, str]] = None,
+                           state_snapshot: bool = True) -> Agent[UserContext]:
+    """
+    Builds the shoe store agent graph in the chosen topology:
+
+    - "flat": every function tool on a single agent
+    - "nested": specialist agents exposed to the main agent with `as_tool`
+    - "handoff": specialist agents reached through handoffs, with handoffs back to the main agent
+
+    With `batched_tools` the order and cart tools take several orders or items per call
+    (lookup_orders, add_items_to_cart, view_cart_and_total), so a multi-item request is one
+    tool call instead of one model round trip per item.
+
+    `agent_models` overrides `model` per agent ("main", "order", "product", "cart",
+    "checkout"); the flat topology only has the main agent.
+
+    With `state_snapshot` every agent's instructions end with the user's current cart, total
+    and recent orders, so reading them takes no tool call.
+    """
+    builders = {"flat": _build_flat, "nested": _build_nested, "handoff": _build_handoff}
+    if topology not in builders:
+        raise ValueError(f"Unknown agent topology {topology!r}, expected one of {', '.join(TOPOLOGIES)}")
+    unknown = set(agent_models or {}) - set(AGENT_ROLES)
+    if unknown:
+        raise ValueError(f"Unknown agent {', '.join(sorted(unknown))}, expected one of {', '.join(AGENT_ROLES)}")
+    models = {role: (agent_models or {}).get(role) or model for role in AGENT_ROLES}
+    return builders[topology](models, batched_tools, state_snapshot)
+
+
+def agent_models_from_env() -> Dict[str, str]:
+    """
+    Per-agent models: SUBAGENT_MODEL for all four specialists, then ORDER_AGENT_MODEL,
+    PRODUCT_AGENT_MODEL, CART_AGENT_MODEL and CHECKOUT_AGENT_MODEL for one of them.
+    Unset agents use MODEL_CHOICE.
+    """
+    models = {}
+    for role in AGENT_ROLES[1:]:
+        model = os.getenv(f"{role.upper()}_AGENT_MODEL") or os.getenv("SUBAGENT_MODEL")
+        if model:
+            models[role] = model
+    return models
+
+
+def shoe_store_agent_from_env() -> Agent[UserContext]:
+    """
+    Builds the agent graph from MODEL_CHOICE, AGENT_TOPOLOGY ("flat", "nested" or "handoff"),
+    BATCHED_TOOLS (default true; false restores the one-item-per-call tools), STATE_SNAPSHOT
+    (default true; false leaves the cart and orders out of the instructions) and the
+    per-agent models of agent_models_from_env().
+    """
+    return build_shoe_store_agent(
+        os.getenv("AGENT_TOPOLOGY", "nested"),
+        os.getenv("MODEL_CHOICE", "gpt-4o-mini"),
+        batched_tools=os.getenv("BATCHED_TOOLS", "true").lower() in ("1", "true", "yes"),
+        agent_models=agent_models_from_env(),
+        state_snapshot=os.getenv("STATE_SNAPSHOT", "true").lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,216 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+ORDER_PREFIX = "ORD"
+FIRST_ORDER_NUMBER = 1001
+
+Order = Dict[str, Any]
+
+
+def order_number(order_id: str) -> Optional[int]:
+    order_id = order_id.strip().upper()
+    if order_id.startswith(ORDER_PREFIX) and order_id[len(ORDER_PREFIX):].isdigit():
+        return int(order_id[len(ORDER_PREFIX):])
+    return None
+
+
+class OrderStore(ABC):
+    """
+    Orders keyed by order ID ("ORD1001"), with order numbers allocated atomically from a
+    monotonic counter and secondary indexes by customer (user_id / email) and by status.
+    """
+
+    @abstractmethod
+    def create(self, items: List[dict], user_id: Optional[str] = None, email: Optional[str] = None,
+               status: str = "Processing") -> str:
+        """Allocates the next order ID, saves the order and returns the ID."""
+
+    @abstractmethod
+    def add(self, order_id: str, items: List[dict], status: str, user_id: Optional[str] = None,
+            email: Optional[str] = None):
+        """Saves an order under an existing ID (used to seed the store)."""
+
+    @abstractmethod
+    def get(self, order_id: str) -> Optional[Order]:
+        ...
+
+    @abstractmethod
+    def update_status(self, order_id: str, status: str) -> bool:
+        ...
+
+    @abstractmethod
+    def for_customer(self, user_id: Optional[str] = None, email: Optional[str] = None,
+                     limit: int = 5) -> List[Tuple[str, Order]]:
+        """The customer's most recent orders, newest first, matched by user_id or email."""
+
+    @abstractmethod
+    def with_status(self, status: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, order_id: str) -> bool:
+        return self.get(order_id) is not None
+
+
+class InMemoryOrderStore(OrderStore):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders: Dict[str, Order] = {}
+        self._by_user: Dict[str, List[str]] = defaultdict(list)
+        self._by_email: Dict[str, List[str]] = defaultdict(list)
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._next_number = FIRST_ORDER_NUMBER
+
+    def _insert(self, number: int, items: List[dict], user_id: Optional[str], email: Optional[str], status: str) -> str:
+        order_id = f"{ORDER_PREFIX}{number}"
+        self._orders[order_id] = {
+            "items": items,
+            "status": status,
+            "user_id": user_id,
+            "email": email,
+            "created_at": time.time(),
+        }
+        if user_id:
+            self._by_user[user_id].append(order_id)
+        if email:
+            self._by_email[email.lower()].append(order_id)
+        self._by_status[status].add(order_id)
+        self._next_number = max(self._next_number, number + 1)
+        return order_id
+
+    def add(self, order_id, items, status, user_id=None, email=None):
+        with self._lock:
+            self._insert(order_number(order_id), items, user_id, email, status)
+
+    def create(self, items, user_id=None, email=None, status="Processing") -> str:
+        with self._lock:
+            return self._insert(self._next_number, items, user_id, email, status)
+
+    def get(self, order_id: str) -> Optional[Order]:
+        return self._orders.get(order_id.strip().upper())
+
+    def update_status(self, order_id: str, status: str) -> bool:
+        order_id = order_id.strip().upper()
+        with self._lock:
+            order = self._orders.get(order_id)
+            if order is None:
+                return False
+            self._by_status[order["status"]].discard(order_id)
+            self._by_status[status].add(order_id)
+            order["status"] = status
+            return True
+
+    def for_customer(self, user_id=None, email=None, limit=5) -> List[Tuple[str, Order]]:
+        # Each index list is in creation order, so only the tails need to be merged
+        candidates = set(self._by_user.get(user_id, [])[-limit:]) if user_id else set()
+        if email:
+            candidates.update(self._by_email.get(email.lower(), [])[-limit:])
+        recent = sorted(candidates, key=order_number, reverse=True)[:limit]
+        return [(order_id, self._orders[order_id]) for order_id in recent]
+
+    def with_status(self, status: str) -> List[str]:
+        return sorted(self._by_status.get(status, ()), key=order_number)
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._orders))
+
+
+class SQLiteOrderStore(OrderStore):
+    """
+    Orders in a SQLite database (WAL mode). The order number is an AUTOINCREMENT key, so IDs
+    are allocated atomically by SQLite, and customer/status lookups are served by indexes,
+    keeping checkout and lookup flat as the table grows.
+    """
+
+    def __init__(self, path: str = "orders.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS orders (
+                number INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                email TEXT COLLATE NOCASE,
+                status TEXT NOT NULL,
+                items TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, number);
+            CREATE INDEX IF NOT EXISTS orders_email ON orders (email, number);
+            CREATE INDEX IF NOT EXISTS orders_status ON orders (status, number);
+        """)
+
+    @staticmethod
+    def _order(row) -> Order:
+        user_id, email, status, items, created_at = row
+        return {"items": json.loads(items), "status": status, "user_id": user_id, "email": email, "created_at": created_at}
+
+    def add(self, order_id, items, status, user_id=None, email=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO orders (number, user_id, email, status, items, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (order_number(order_id), user_id, email, status, json.dumps(items), time.time()))
+
+    def create(self, items, user_id=None, email=None, status="Processing") -> str:
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO orders (user_id, email, status, items, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, email, status, json.dumps(items), time.time()))
+            return f"{ORDER_PREFIX}{cursor.lastrowid}"
+
+    def get(self, order_id: str) -> Optional[Order]:
+        number = order_number(order_id)
+        if number is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT user_id, email, status, items, created_at FROM orders WHERE number = ?", (number,)).fetchone()
+        return self._order(row) if row else None
+
+    def update_status(self, order_id: str, status: str) -> bool:
+        number = order_number(order_id)
+        with self._lock:
+            return self._db.execute("UPDATE orders SET status = ? WHERE number = ?", (status, number)).rowcount > 0
+
+    def for_customer(self, user_id=None, email=None, limit=5) -> List[Tuple[str, Order]]:
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT number, user_id, email, status, items, created_at FROM (
+                    SELECT * FROM (SELECT * FROM orders WHERE user_id = ? ORDER BY number DESC LIMIT ?)
+                    UNION
+                    SELECT * FROM (SELECT * FROM orders WHERE email = ? ORDER BY number DESC LIMIT ?)
+                ) ORDER BY number DESC LIMIT ?
+            """, (user_id, limit, email, limit, limit)).fetchall()
+        return [(f"{ORDER_PREFIX}{row[0]}", self._order(row[1:])) for row in rows]
+
+    def with_status(self, status: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT number FROM orders WHERE status = ? ORDER BY number", (status,)).fetchall()
+        return [f"{ORDER_PREFIX}{number}" for (number,) in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+def order_store_from_env() -> OrderStore:
+    """Builds the store selected by ORDER_STORE ("memory" or "sqlite", with ORDER_DB_PATH)."""
+    backend = os.getenv("ORDER_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteOrderStore(os.getenv("ORDER_DB_PATH", "orders.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown ORDER_STORE: {backend}")
+    return InMemoryOrderStore()
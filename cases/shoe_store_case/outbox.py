@@ -0,0 +1,364 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingEmail:
+    recipient: str
+    subject: str
+    body: str
+    id: int = 0
+    attempts: int = 0
+    next_attempt: float = field(default_factory=time.time)
+
+
+@dataclass
+class SMTPConfig:
+    host: str = "smtp.ethereal.email"
+    port: int = 587
+    user: Optional[str] = None
+    password: Optional[str] = None
+    sender: Optional[str] = None
+    starttls: bool = True
+    timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "SMTPConfig":
+        """
+        Reads SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM (default SMTP_USER) and
+        SMTP_STARTTLS. There are no default credentials: see .env.example.
+        """
+        user = os.getenv("SMTP_USER") or None
+        return cls(
+            host=os.getenv("SMTP_HOST", cls.host),
+            port=int(os.getenv("SMTP_PORT", str(cls.port))),
+            user=user,
+            password=os.getenv("SMTP_PASSWORD") or None,
+            sender=os.getenv("SMTP_FROM") or user,
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+        )
+
+
+class Outbox(ABC):
+    """Queue of emails waiting to be sent. Safe to use from tool threads and the worker thread."""
+
+    @abstractmethod
+    def put(self, recipient: str, subject: str, body: str) -> OutgoingEmail:
+        ...
+
+    @abstractmethod
+    def due(self, limit: int) -> List[OutgoingEmail]:
+        """Takes up to `limit` emails whose next attempt is due, oldest first."""
+
+    @abstractmethod
+    def mark_sent(self, email: OutgoingEmail):
+        ...
+
+    @abstractmethod
+    def retry_later(self, email: OutgoingEmail, error: str, delay: float):
+        ...
+
+    @abstractmethod
+    def give_up(self, email: OutgoingEmail, error: str):
+        ...
+
+    @abstractmethod
+    def pending(self) -> int:
+        ...
+
+
+class InMemoryOutbox(Outbox):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: List[tuple] = []
+        self._ids = itertools.count(1)
+        self.failed: List[OutgoingEmail] = []
+
+    def _push(self, email: OutgoingEmail):
+        heapq.heappush(self._queue, (email.next_attempt, email.id, email))
+
+    def put(self, recipient, subject, body) -> OutgoingEmail:
+        with self._lock:
+            email = OutgoingEmail(recipient, subject, body, id=next(self._ids))
+            self._push(email)
+            return email
+
+    def due(self, limit) -> List[OutgoingEmail]:
+        now = time.time()
+        batch = []
+        with self._lock:
+            while self._queue and len(batch) < limit and self._queue[0][0] <= now:
+                batch.append(heapq.heappop(self._queue)[2])
+        return batch
+
+    def mark_sent(self, email):
+        pass
+
+    def retry_later(self, email, error, delay):
+        email.attempts += 1
+        email.next_attempt = time.time() + delay
+        with self._lock:
+            self._push(email)
+
+    def give_up(self, email, error):
+        email.attempts += 1
+        with self._lock:
+            self.failed.append(email)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+
+class SQLiteOutbox(Outbox):
+    """
+    Durable outbox: queued receipts survive restarts and are sent by the next worker.
+
+    Several API worker processes can share one database: `due` claims emails with a single
+    UPDATE ... RETURNING, so each one is handed to exactly one sender, and the claim is a
+    lease (`next_attempt` moves `lease` seconds ahead). If a process dies mid-send, the email
+    becomes due again once the lease runs out.
+    """
+
+    def __init__(self, path: str = "outbox.db", lease: float = 600.0):
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt);
+        """)
+
+    def put(self, recipient, subject, body) -> OutgoingEmail:
+        email = OutgoingEmail(recipient, subject, body)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (recipient, subject, body, next_attempt) VALUES (?, ?, ?, ?)",
+                (recipient, subject, body, email.next_attempt))
+        email.id = cursor.lastrowid
+        return email
+
+    def due(self, limit) -> List[OutgoingEmail]:
+        now = time.time()
+        with self._lock:
+            # Pending emails and expired claims ('sending' past their lease) are claimed in one statement
+            rows = self._db.execute(
+                "UPDATE outbox SET state = 'sending', next_attempt = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE state IN ('pending', 'sending') AND next_attempt <= ? "
+                "ORDER BY next_attempt LIMIT ?) RETURNING id, recipient, subject, body, attempts",
+                (now + self.lease, now, limit)).fetchall()
+        return [OutgoingEmail(recipient, subject, body, id=id, attempts=attempts, next_attempt=now)
+                for id, recipient, subject, body, attempts in sorted(rows)]
+
+    def mark_sent(self, email):
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (email.id,))
+
+    def retry_later(self, email, error, delay):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET state = 'pending', attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, email.id))
+
+    def give_up(self, email, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET state = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (error, email.id))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE state != 'failed'").fetchone()[0]
+
+
+class EmailWorker:
+    """
+    Background sender for the outbox.
+
+    Runs as an asyncio task; each batch is sent from a worker thread over one pooled SMTP
+    connection that is reused across batches (checked with NOOP after `idle_timeout` seconds
+    and reopened when the server drops it). Failed emails are retried with exponential
+    backoff and given up after `max_attempts`.
+
+    Without a sender address (SMTP_FROM or SMTP_USER) nothing is sent: receipts stay queued
+    and a warning is logged when the worker starts.
+    """
+
+    def __init__(self, outbox: Outbox, config: SMTPConfig, batch_size: int = 20, poll_interval: float = 1.0,
+                 max_attempts: int = 5, backoff: float = 2.0, idle_timeout: float = 30.0):
+        self.outbox = outbox
+        self.config = config
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self):
+        """Starts the worker on the running event loop (no-op if it is already running)."""
+        if self._task is not None and not self._task.done():
+            return
+        if not self.config.sender:
+            logger.warning("SMTP_FROM / SMTP_USER are not set: receipt emails are queued but not sent")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain: bool = True):
+        """Stops the worker, first sending whatever is already due when `drain` is set."""
+        if self._task is None:
+            return
+        self._stopping = True
+        if not drain:
+            self._task.cancel()
+        self._wakeup.set()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self._close)
+
+    def notify(self):
+        """Wakes the worker up; safe to call from any thread."""
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def enqueue(self, recipient: str, subject: str, body: str) -> OutgoingEmail:
+        email = self.outbox.put(recipient, subject, body)
+        self.notify()
+        return email
+
+    async def _run(self):
+        while True:
+            batch = self.outbox.due(self.batch_size) if self.config.sender else []
+            if batch:
+                await asyncio.to_thread(self._send_batch, batch)
+                continue
+            if self._stopping:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.config.host, self.config.port, timeout=self.config.timeout)
+        if self.config.starttls:
+            connection.starttls()
+        if self.config.user and self.config.password:
+            connection.login(self.config.user, self.config.password)
+        self.connections_opened += 1
+        return connection
+
+    def _get_connection(self) -> smtplib.SMTP:
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            try:
+                self._connection.noop()
+            except smtplib.SMTPException:
+                self._close()
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._connection = None
+
+    def _send(self, email: OutgoingEmail):
+        msg = MIMEText(email.body)
+        msg["Subject"] = email.subject
+        msg["From"] = self.config.sender
+        msg["To"] = email.recipient
+        try:
+            self._get_connection().sendmail(self.config.sender, [email.recipient], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The pooled connection went stale; reconnect once and resend
+            self._close()
+            self._get_connection().sendmail(self.config.sender, [email.recipient], msg.as_string())
+        self._last_used = time.monotonic()
+
+    def _send_batch(self, batch: List[OutgoingEmail]):
+        for email in batch:
+            try:
+                self._send(email)
+            except (smtplib.SMTPException, OSError) as e:
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self._close()
+                if email.attempts + 1 >= self.max_attempts:
+                    self.outbox.give_up(email, str(e))
+                    self.failed += 1
+                else:
+                    self.outbox.retry_later(email, str(e), self.backoff * 2 ** email.attempts)
+                    self.retried += 1
+                continue
+            except Exception as e:
+                # A malformed message (no recipient, bad header) fails the same way every time;
+                # give up on it rather than let it stop the worker
+                logger.exception("Receipt email %s could not be sent", email.id)
+                self.outbox.give_up(email, repr(e))
+                self.failed += 1
+                continue
+            self.outbox.mark_sent(email)
+            self.sent += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.outbox.pending(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "connections_opened": self.connections_opened,
+            "running": self._task is not None and not self._task.done(),
+            "configured": bool(self.config.sender),
+        }
+
+
+def outbox_from_env() -> Outbox:
+    """Builds the outbox selected by EMAIL_OUTBOX ("memory" or "sqlite", with EMAIL_OUTBOX_DB_PATH)."""
+    backend = os.getenv("EMAIL_OUTBOX", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteOutbox(os.getenv("EMAIL_OUTBOX_DB_PATH", "outbox.db"))
+    if backend != "memory":
+        raise ValueError(f"Unknown EMAIL_OUTBOX: {backend}")
+    return InMemoryOutbox()
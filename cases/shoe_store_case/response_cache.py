@@ -0,0 +1,131 @@
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+from .catalog import Catalog
+from .router import normalize
+
+# Tools whose output only depends on the catalog; a run that used anything else is never cached
+STATELESS_TOOLS = {"get_product_info", "transfer_to_product_agent", "transfer_to_shoestoreagent"}
+
+# Questions mentioning the cart, its total, orders or the customer, or pointing back at earlier turns, depend on state
+STATEFUL_WORDS = re.compile(
+    r"\b(?:cart|basket|bag|total|subtotal|sum|owe|orders?|ord\d+|checkout|check out|receipt|buy|add|remove|"
+    r"change|my|mine|me|i|it|its|they|them|those|that|these|this|ones?)\b")
+
+# Answers that speak about the customer's own cart or orders drew on the state snapshot in the
+# instructions, even when the only tool they called was catalog-only
+PERSONAL_ANSWER = re.compile(
+    r"\b(?:your (?:cart|basket|bag|total|subtotal|orders?|receipt)|in your|you (?:have|already|ordered)|ord\d+)\b",
+    re.IGNORECASE)
+
+
+def cache_key(message: str) -> Optional[str]:
+    """The normalized question, or None when its answer may depend on the cart, orders or history."""
+    text = normalize(message)
+    text = re.sub(r"^(?:please|can you|could you)\s+|\s+please$", "", text)
+    if not text or STATEFUL_WORDS.search(text):
+        return None
+    return text
+
+
+@dataclass
+class CachedResponse:
+    response: str
+    stored_at: float
+    agent_latency: float
+
+
+class ResponseCache:
+    """
+    LRU cache with TTL for answers to stateless questions ("what shoes do you sell").
+
+    Entries are keyed on the normalized question plus the catalog version, so a catalog
+    reload invalidates everything cached before it. The key is only the question, so turns
+    that follow earlier ones in their conversation ("yes", "large"), and questions that
+    mention the cart, its total, orders or earlier turns are never looked up or stored. An
+    agent run is only stored when it called at least one tool and every tool it called is
+    catalog-only (STATELESS_TOOLS): an answer given without tools may come from the
+    conversation or the customer state in the instructions. With STATE_SNAPSHOT on every
+    prompt carries that state, so answers mentioning the customer's cart or orders
+    (PERSONAL_ANSWER) are never stored either.
+    """
+
+    def __init__(self, catalog: Catalog, max_entries: int = 512, ttl: float = 300.0):
+        self.catalog = catalog
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, int], CachedResponse]" = OrderedDict()
+        self._version = catalog.version
+        self.lookups = 0
+        self.hits = 0
+        self.stored = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    def _check_version(self) -> int:
+        version = self.catalog.version
+        if version != self._version:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._version = version
+        return version
+
+    def get(self, message: str, has_history: bool = False) -> Optional[str]:
+        start = time.perf_counter()
+        text = None if has_history else cache_key(message)
+        if text is None:
+            return None
+        self.lookups += 1
+        key = (text, self._check_version())
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.latency_saved += max(0.0, entry.agent_latency - (time.perf_counter() - start))
+        return entry.response
+
+    def put(self, message: str, response: str, tools_called: Iterable[str], agent_latency: float,
+            has_history: bool = False) -> bool:
+        """Stores an agent answer to an opening question that only used stateless tools."""
+        tools_called = list(tools_called)
+        text = None if has_history else cache_key(message)
+        if text is None or not response or not tools_called or any(tool not in STATELESS_TOOLS for tool in tools_called):
+            return False
+        if PERSONAL_ANSWER.search(response):
+            return False
+        key = (text, self._check_version())
+        self._entries[key] = CachedResponse(response, time.time(), agent_latency)
+        self._entries.move_to_end(key)
+        self.stored += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "catalog_version": self._version,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            "stored": self.stored,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": self.latency_saved,
+        }
@@ -0,0 +1,108 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from .context import UserContext
+from .tools import describe_cart, describe_cart_total, order_store
+
+ORDER_ID = r"(ord\d+)"
+
+# Anchored patterns only: a message is routed locally when the whole message is one of these
+INTENT_PATTERNS: List[Tuple[str, Pattern]] = [
+    ("order_status", re.compile(
+        r"^(?:where(?:'s| is)|what(?:'s| is) the status of|status of|track|check(?: on)?|any update on)\s+"
+        r"(?:my\s+)?(?:order\s+)?(?:#\s*)?" + ORDER_ID + r"$")),
+    ("order_status", re.compile(r"^(?:order\s+)?" + ORDER_ID + r"\s+status$")),
+    ("cart_total", re.compile(r"^(?:what(?:'s| is)|tell me)\s+(?:my|the)\s+(?:cart\s+)?total$")),
+    ("cart_total", re.compile(r"^(?:how much is (?:in )?my cart|cart total)$")),
+    ("view_cart", re.compile(r"^(?:show|view|display|see)\s+(?:me\s+)?(?:my|the)\s+cart$")),
+    ("view_cart", re.compile(r"^what(?:'s| is) in my cart$")),
+]
+
+
+def normalize(message: str) -> str:
+    """Lowercases, unifies apostrophes and strips surrounding punctuation and extra whitespace."""
+    message = message.lower().replace("’", "'")
+    message = re.sub(r"^(?:hi|hey|hello)[,!.]?\s+", "", message.strip())
+    message = re.sub(r"\s+", " ", message)
+    return message.strip(" ?!.")
+
+
+def _order_status(context: UserContext, order_id: str) -> str:
+    order_id = order_id.upper()
+    order = order_store.get(order_id)
+    if not order:
+        return f"⚠️ Sorry, I couldn't find an order with the number {order_id}. Please check it and try again."
+    items = ", ".join(f"{item['quantity']}x {item['product']} ({item['size']})" for item in order["items"])
+    return f"Your order {order_id} ({items}) is currently {order['status']}."
+
+
+def _cart_total(context: UserContext) -> str:
+    return describe_cart_total(context.user_id)
+
+
+def _view_cart(context: UserContext) -> str:
+    return describe_cart(context.user_id)
+
+
+INTENT_HANDLERS: Dict[str, Callable[..., str]] = {
+    "order_status": _order_status,
+    "cart_total": _cart_total,
+    "view_cart": _view_cart,
+}
+
+
+@dataclass
+class RoutedReply:
+    intent: str
+    response: str
+
+
+class IntentRouter:
+    """
+    Deterministic fast path in front of ShoeStoreAgent.
+
+    Recognizes a few high-confidence intents (order status by ID, cart total, show cart) with
+    anchored patterns and answers them directly from the tool data with a templated reply,
+    skipping the model entirely. Anything else returns None and goes to the agent graph.
+
+    Latency saved is estimated per hit as the running average agent-path latency
+    (reported through `record_agent_latency`) minus the time the fast path took.
+    """
+
+    def __init__(self, default_agent_latency: float = 2.0):
+        self.requests = 0
+        self.hits: Dict[str, int] = {intent: 0 for intent in INTENT_HANDLERS}
+        self.latency_saved = 0.0
+        self._agent_latency = default_agent_latency
+        self._agent_runs = 0
+
+    def route(self, message: str, context: UserContext) -> Optional[RoutedReply]:
+        start = time.perf_counter()
+        self.requests += 1
+        text = normalize(message)
+        for intent, pattern in INTENT_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                response = INTENT_HANDLERS[intent](context, *match.groups())
+                self.hits[intent] += 1
+                self.latency_saved += max(0.0, self._agent_latency - (time.perf_counter() - start))
+                return RoutedReply(intent=intent, response=response)
+        return None
+
+    def record_agent_latency(self, seconds: float):
+        """Feeds the running average of agent-path latency used to estimate time saved."""
+        self._agent_runs += 1
+        self._agent_latency += (seconds - self._agent_latency) / min(self._agent_runs, 100)
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        return {
+            "requests": self.requests,
+            "hits": hits,
+            "hit_rate": hits / self.requests if self.requests else 0.0,
+            "hits_by_intent": dict(self.hits),
+            "average_agent_latency_seconds": self._agent_latency,
+            "latency_saved_seconds": self.latency_saved,
+        }
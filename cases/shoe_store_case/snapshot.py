@@ -0,0 +1,45 @@
+import hashlib
+from typing import Callable
+
+from agents import Agent, RunContextWrapper
+
+from .context import UserContext
+from .tool_output import SNAPSHOT_HEADER, ToolOutput
+from .tools import cart_store, order_store
+
+RECENT_ORDERS = 5
+
+STATE_INSTRUCTIONS = """
+        The customer's cart and recent orders as of this step are below. Answer questions about
+        them (what is in the cart, the total, the status of a listed order) from this snapshot
+        without calling a tool. Use the tools to change the cart, to check out and for orders
+        that are not listed.
+    """
+
+# The snapshot is always written compactly, whatever TOOL_OUTPUT_FORMAT says: it is in every prompt
+_compact = ToolOutput()
+
+
+def state_snapshot(context: UserContext) -> str:
+    """
+    The user's cart, total and recent orders in the compact tool output encoding, headed by a
+    version (a hash of the contents) that changes whenever any of it does.
+    """
+    lines = cart_store.lines(context.user_id)
+    recent = order_store.for_customer(context.user_id, context.email, limit=RECENT_ORDERS)
+    body = _compact.cart(lines, sum(line.line_total_cents for line in lines) if lines else None)
+    body += "\n" + (_compact.orders(dict(recent)) if recent else "orders: none yet")
+    version = hashlib.sha1(body.encode()).hexdigest()[:8]
+    return f"{SNAPSHOT_HEADER} (version {version}):\n{body}"
+
+
+def with_state_snapshot(instructions: str) -> Callable[[RunContextWrapper[UserContext], Agent], str]:
+    """
+    Dynamic instructions: `instructions` followed by the current state snapshot, rebuilt for
+    every model call so a cart change made by a tool shows up in the next step. The snapshot
+    comes last, so the static part stays a stable prompt prefix.
+    """
+    def instructions_with_state(context: RunContextWrapper[UserContext], agent: Agent) -> str:
+        return f"{instructions}{STATE_INSTRUCTIONS}\n{state_snapshot(context.context)}"
+
+    return instructions_with_state
@@ -0,0 +1,181 @@
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cart_store import CartLine, format_cents
+from .order_store import Order
+
+# Tool outputs are pasted into the prompt of every later step and turn, so they are written
+# for the model, not the customer: plain text, one record per line, "label: fields", no emoji,
+# prose or Python reprs. The model turns them into a conversational answer.
+#
+#   ORD1001: Shipped; 2x Running Shoes (Small) @ $59.99
+#   added: 2x Running (Small)
+#   not added: Walking Shoes (Large): only 1 left
+#   cart: 2x Running (Small) @ $89.99, 1x Walking (Large) @ $69.99
+#   total: $249.97
+#   Running Shoes: $89.99 USD; sizes Small/Medium/Large
+#   not found: sandals
+
+# Heads the customer state snapshot in agent instructions (see snapshot.py). It lives here,
+# away from the store instances in tools.py, so importing it opens no database.
+SNAPSHOT_HEADER = "Customer state"
+
+
+def _item(item: dict) -> str:
+    return f"{item['quantity']}x {item['product']} ({item['size']}) @ ${item['unit_price']:.2f}"
+
+
+def _line(line: CartLine) -> str:
+    return f"{line.quantity}x {line.product.title()} ({line.size.title()}) @ {format_cents(line.unit_price_cents)}"
+
+
+class ToolOutput:
+    """Compact tool output encoding (TOOL_OUTPUT_FORMAT=compact, the default)."""
+
+    def order(self, order_id: str, order: Optional[Order]) -> str:
+        if order is None:
+            return f"{order_id}: not found"
+        return f"{order_id}: {order['status']}; {', '.join(_item(item) for item in order['items'])}"
+
+    def orders(self, orders: Dict[str, Optional[Order]]) -> str:
+        return "\n".join(self.order(order_id, order) for order_id, order in orders.items())
+
+    def order_not_found(self, order_id: Optional[str] = None) -> str:
+        return self.order(order_id, None) if order_id else "orders: none found for this customer, ask for the order number"
+
+    def added(self, quantity: int, product: str, size: str) -> str:
+        return f"added: {quantity}x {product.title()} ({size.title()})"
+
+    def not_added(self, product: str, size: str, reason: str) -> str:
+        return f"not added: {product} ({size}): {reason}"
+
+    def unmatched(self, products: List[str]) -> str:
+        return f"not found: {', '.join(products)}; not in the catalog, nothing added for them"
+
+    def results(self, results: Iterable[str]) -> str:
+        return "\n".join(results) or "error: no items given"
+
+    def cart(self, lines: List[CartLine], total_cents: Optional[int] = None) -> str:
+        if not lines:
+            return "cart: empty"
+        cart = f"cart: {', '.join(_line(line) for line in lines)}"
+        return cart if total_cents is None else f"{cart}\n{self.total(total_cents)}"
+
+    def total(self, total_cents: int) -> str:
+        return f"total: {format_cents(total_cents)}"
+
+    def quantity_set(self, product: str, size: str, quantity: int) -> str:
+        if quantity > 0:
+            return f"updated: {product.title()} ({size.title()}) quantity {quantity}"
+        return f"removed: {product.title()} ({size.title()})"
+
+    def not_updated(self, product: str, size: str, reason: str) -> str:
+        return f"not updated: {product} ({size}): {reason}"
+
+    def not_in_cart(self, product: str, size: str) -> str:
+        return f"error: {product} ({size}) is not in the cart"
+
+    def checked_out(self, order_id: str, email: str, total_cents: int) -> str:
+        return f"checked out: order {order_id}; total {format_cents(total_cents)}; receipt emailed to {email}"
+
+    def empty_checkout(self) -> str:
+        return "error: the cart is empty, nothing to check out"
+
+    def no_email(self) -> str:
+        return "error: no email address for this customer, checkout needs one for the receipt; cart unchanged"
+
+    def products(self, products: List[Tuple[str, str, List[str]]], more: int = 0) -> str:
+        if not products:
+            return "products: none"
+        lines = [f"{name}: {price}; sizes {'/'.join(sizes)}" for name, price, sizes in products]
+        if more:
+            lines.append(f"+{more} more: ask for a style, use or size")
+        return "\n".join(lines)
+
+    def product_not_found(self, query: str, listing: str) -> str:
+        return f"not found: {query}\n{listing}"
+
+
+class VerboseToolOutput(ToolOutput):
+    """The previous customer-facing prose and dicts (TOOL_OUTPUT_FORMAT=verbose), kept for comparison."""
+
+    def order(self, order_id, order):
+        if order is None:
+            return "⚠️ Sorry, we couldn’t find any order with that number. Please check and try again."
+        return {"items": order["items"], "status": order["status"]}
+
+    def orders(self, orders):
+        return {order_id: self.order(order_id, order) if order else "⚠️ No order with this number."
+                for order_id, order in orders.items()}
+
+    def order_not_found(self, order_id=None):
+        if order_id:
+            return self.order(order_id, None)
+        return "⚠️ We couldn't find any orders for you. Please provide your order number."
+
+    def added(self, quantity, product, size):
+        return f"✅ {quantity}x {product.title()} ({size.title()}) added to your cart."
+
+    def not_added(self, product, size, reason):
+        return f"⚠️ Sorry, we couldn't add {product} ({size}) to your cart: {reason}."
+
+    def unmatched(self, products):
+        return f"⚠️ We don't carry {', '.join(products)}. Please pick from our catalog."
+
+    def results(self, results):
+        return "\n".join(results) or "⚠️ No items were given."
+
+    def cart(self, lines, total_cents=None):
+        if not lines:
+            return "🛒 Your cart is empty."
+        cart = ["🛒 Your cart contains:"]
+        for line in lines:
+            cart.append(f"- {line.quantity}x {line.product.title()} ({line.size.title()}) @ {format_cents(line.unit_price_cents)} each")
+        if total_cents is not None:
+            cart.append(self.total(total_cents))
+        return "\n".join(cart)
+
+    def total(self, total_cents):
+        return f"💵 Your current total is: {format_cents(total_cents)}"
+
+    def quantity_set(self, product, size, quantity):
+        if quantity > 0:
+            return f"🔄 Updated quantity of {product.title()} ({size.title()}) to {quantity}."
+        return f"🗑️ Removed {product.title()} ({size.title()}) from your cart."
+
+    def not_updated(self, product, size, reason):
+        return f"⚠️ Sorry, we couldn't update {product} ({size}) in your cart: {reason}."
+
+    def not_in_cart(self, product, size):
+        return "⚠️ Item not found in your cart."
+
+    def checked_out(self, order_id, email, total_cents):
+        return f"📩 Receipt for Order {order_id} is on its way to {email}! Total price {total_cents / 100:.2f}"
+
+    def empty_checkout(self):
+        return "🛍️ Your cart is empty. Add something before checking out."
+
+    def no_email(self):
+        return "⚠️ We need your email address to send the receipt. Please add it and try again."
+
+    def products(self, products, more=0):
+        if not products:
+            return "⚠️ Our catalog is empty right now."
+        lines = ["👟 Our products:"]
+        lines += [f"- {name}: {price}, sizes {'/'.join(sizes)}" for name, price, sizes in products]
+        if more:
+            lines.append(f"...and {more} more. Ask about a specific style, use or size.")
+        return "\n".join(lines)
+
+    def product_not_found(self, query, listing):
+        return f"⚠️ Sorry, we couldn't find a product matching \"{query}\".\n{listing}"
+
+
+def tool_output_from_env() -> ToolOutput:
+    """TOOL_OUTPUT_FORMAT=compact (default) or verbose, the older prose kept for comparisons."""
+    kind = os.getenv("TOOL_OUTPUT_FORMAT", "compact").lower()
+    if kind == "compact":
+        return ToolOutput()
+    if kind == "verbose":
+        return VerboseToolOutput()
+    raise ValueError(f"Unknown TOOL_OUTPUT_FORMAT: {kind}")
@@ -1,23 +1,17 @@
 from agents import RunContextWrapper, function_tool
+from .catalog import catalog_from_env
+from .cart_store import cart_store_from_env, format_cents
 from .context import UserContext
-import json
-
-products = {
-    "running": {
-        "description": "Lightweight and breathable shoes for runners.",
-        "sizes": ["Small", "Medium", "Large"],
-        "price": 89.99,
-        "currency": "USD"
-    },
-    "walking": {
-        "description": "Cushioned and flexible shoes for daily comfort.",
-        "sizes": ["Small", "Medium", "Large"],
-        "price": 69.99,
-        "currency": "USD"
-    }
-}
+from .order_store import order_store_from_env
+from .outbox import EmailWorker, SMTPConfig, outbox_from_env
+from .tool_output import tool_output_from_env
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
+
+# Products, variants and stock loaded from CATALOG_PATH, re-indexed when the file changes
+catalog = catalog_from_env()
 
-sample_orders = {
+SAMPLE_ORDERS = {
     "ORD1001": {
         "items": [
             {"product": "Running Shoes", "size": "Small", "quantity": 2, "unit_price": 59.99}
@@ -50,31 +44,63 @@ sample_orders = {
     }
 }
 
-user_carts = {}
+# Orders indexed by ID, customer and status; seeded with the sample orders
+order_store = order_store_from_env()
+for _order_id, _order in SAMPLE_ORDERS.items():
+    order_store.add(_order_id, _order["items"], _order["status"])
+
+# Carts keyed by user, with totals in cents and atomic checkout; CART_STORE=sqlite shares them across workers
+cart_store = cart_store_from_env()
+
+# Receipts are queued here and sent by a background worker over a pooled SMTP connection.
+# The API starts the worker on startup; scripts call `email_worker.start()` inside their event loop.
+email_worker = EmailWorker(outbox_from_env(), SMTPConfig.from_env())
+
+# How tool results are written into the prompt; compact by default, TOOL_OUTPUT_FORMAT=verbose for the old prose
+formatter = tool_output_from_env()
 
 @function_tool
-def lookup_order(order_id: str) -> str:
-    """Looks up the order status based on the order ID."""
-    order = sample_orders.get(order_id.upper())
-    if order:
-        return order
-        # return f"✅ Your order {order_id.upper()} for {order['product']} ({order['size']}) is currently {order['status']}."
-    return "⚠️ Sorry, we couldn’t find any order with that number. Please check and try again."
+def lookup_order(context: RunContextWrapper[UserContext], order_id: Optional[str] = None) -> str:
+    """
+    Looks up the order status based on the order ID, or lists the user's recent orders.
+
+    Args:
+        order_id (str): The order ID (e.g. "ORD1001"), or None to list the user's recent orders.
+    """
+    if not order_id:
+        recent = order_store.for_customer(context.context.user_id, context.context.email)
+        if not recent:
+            return formatter.order_not_found()
+        return formatter.orders(dict(recent))
+
+    order_id = order_id.strip().upper()
+    return formatter.order(order_id, order_store.get(order_id))
+
+@function_tool
+def lookup_orders(context: RunContextWrapper[UserContext], order_ids: List[str]) -> str:
+    """
+    Looks up the status of several orders at once, or lists the user's recent orders.
+
+    Args:
+        order_ids (list[str]): Every order ID the user asked about (e.g. ["ORD1001", "ORD1004"]), or an empty list to list the user's recent orders.
+    """
+    if not order_ids:
+        recent = order_store.for_customer(context.context.user_id, context.context.email)
+        if not recent:
+            return formatter.order_not_found()
+        return formatter.orders(dict(recent))
+
+    return formatter.orders({order_id: order_store.get(order_id)
+                             for order_id in dict.fromkeys(order_id.strip().upper() for order_id in order_ids)})
 
 @function_tool
 def get_product_info(product_type: str) -> str:
-    """Provides information about the product based on the type.
+    """Provides information about products matching a name, type or description.
     
     Args:
-        product_type (str): The type of product to get information about (Either "running" or "walking" or "None" to list all).
+        product_type (str): The product or what the user is looking for (e.g. "running", "trail runners size M"), or "None" to list all.
     """
-    product_type = product_type.lower()
-    if "running" in product_type:
-        return json.dumps(products["running"], indent=4)
-    elif "walking" in product_type:
-        return json.dumps(products["walking"], indent=4)
-    
-    return json.dumps(products, indent=4)
+    return catalog.describe(product_type, output=formatter)
 
 @function_tool
 def add_to_cart(context: RunContextWrapper[UserContext], product: str, size: str, quantity: int = 1) -> str:
@@ -82,31 +108,83 @@ def add_to_cart(context: RunContextWrapper[UserContext], product: str, size: str
     Adds a product to the user's cart.
     
     Args:
-        product (str): The product to add to the cart (Either "running" or "walking").
-        size (str): The size of the product (Either "small", medium", "large").
+        product (str): The product to add to the cart (e.g. "running" or "walking").
+        size (str): The size of the product (e.g. "small", medium", "large").
         quantity (int): The quantity of the product to add to the cart.
     """
-    if product.lower() in ["running", "walking"] and size.lower() in ["small", "medium", "large"]:
-        user_id = context.context.user_id
-        cart = user_carts.get(user_id, [])
-        
-        # Check if same product and size exists, update quantity, otherwise add new item
-        for item in cart:
-            if item["product"] == product and item["size"] == size:
-                item["quantity"] += quantity
-                break
+    item = catalog.find(product)
+    variant = item.variant(size) if item else None
+    if variant is None:
+        return formatter.not_added(product, size, "unknown product or size")
+    if quantity <= 0:
+        return formatter.not_added(item.name, variant.size, "quantity must be at least 1")
+
+    user_id = context.context.user_id
+    # Stock has to cover what is already in the cart as well
+    in_cart = _in_cart(user_id, item.key, variant.size) if variant.stock is not None else 0
+    if variant.stock is not None and variant.stock < in_cart + quantity:
+        return formatter.not_added(item.name, variant.size, _stock_problem(variant.stock, in_cart))
+
+    # Same product and size (in any case) merges into one line
+    cart_store.add(user_id, item.key, variant.size, quantity, variant.price_cents)
+    return formatter.added(quantity, item.key, variant.size)
+
+def _stock_problem(stock: int, in_cart: int = 0) -> str:
+    if stock <= 0:
+        return "out of stock"
+    return f"only {stock} left, {in_cart} already in the cart" if in_cart else f"only {stock} left"
+
+def _in_cart(user_id: str, product: str, size: str) -> int:
+    """Quantity of a product and size already in the user's cart."""
+    key = (product.lower(), size.lower())
+    return sum(line.quantity for line in cart_store.lines(user_id) if (line.product, line.size) == key)
+
+class CartItemRequest(BaseModel):
+    product: str
+    size: str
+    quantity: int = 1
+
+@function_tool
+def add_items_to_cart(context: RunContextWrapper[UserContext], items: List[CartItemRequest]) -> str:
+    """
+    Adds one or more products to the user's cart in a single call.
+
+    Args:
+        items (list): Every item the user asked for, each with product (e.g. "running" or "walking"), size (e.g. "small", "medium", "large") and quantity.
+    """
+    # Resolve (strictly, by name or a close typo) and check every item first, so stock is checked
+    # against the whole request (two lines of the same variant count together) before anything is added
+    resolved = []
+    requested: Dict[Tuple[str, str], int] = {}
+    for request in items:
+        item = catalog.find(request.product)
+        variant = item.variant(request.size) if item else None
+        resolved.append((request, item, variant))
+        if variant is not None and request.quantity > 0:
+            requested[item.key, variant.size] = requested.get((item.key, variant.size), 0) + request.quantity
+
+    user_id = context.context.user_id
+    in_cart = {variant_key: _in_cart(user_id, *variant_key) for variant_key in requested}
+    results = []
+    for request, item, variant in resolved:
+        if item is None:
+            results.append(formatter.not_added(request.product, request.size, "unknown product"))
+        elif variant is None:
+            results.append(formatter.not_added(item.name, request.size, "unknown size"))
+        elif request.quantity <= 0:
+            results.append(formatter.not_added(item.name, variant.size, "quantity must be at least 1"))
+        elif variant.stock is not None and variant.stock < in_cart[item.key, variant.size] + requested[item.key, variant.size]:
+            results.append(formatter.not_added(item.name, variant.size,
+                                               _stock_problem(variant.stock, in_cart[item.key, variant.size])))
         else:
-            cart.append({
-                "product": product,
-                "size": size,
-                "quantity": quantity,
-                "unit_price": products[product]["price"]
-            })
-
-        user_carts[user_id] = cart
-        return f"✅ {quantity}x {product.title()} ({size.title()}) added to your cart."
-    
-    return "⚠️ Sorry, we couldn't add that item to your cart. Please check the product and size."
+            cart_store.add(user_id, item.key, variant.size, request.quantity, variant.price_cents)
+            results.append(formatter.added(request.quantity, item.key, variant.size))
+    # Products are matched strictly (see Catalog.find); name the ones that weren't, so the
+    # model asks about them instead of guessing
+    unmatched = list(dict.fromkeys(request.product for request, item, _ in resolved if item is None))
+    if unmatched:
+        results.append(formatter.unmatched(unmatched))
+    return formatter.results(results)
 
 @function_tool
 def modify_cart_item(context: RunContextWrapper[UserContext], product: str, size: str, quantity: int) -> str:
@@ -120,45 +198,52 @@ def modify_cart_item(context: RunContextWrapper[UserContext], product: str, size
         quantity (int): New quantity (0 or less means removal).
     """
     user_id = context.context.user_id
-    cart = user_carts.get(user_id, [])
-    product = product.lower()
-    size = size.lower()
-
-    for i, item in enumerate(cart):
-        if item["product"] == product and item["size"] == size:
-            if quantity > 0:
-                item["quantity"] = quantity
-                return f"🔄 Updated quantity of {product.title()} ({size.title()}) to {quantity}."
-            else:
-                cart.pop(i)
-                user_carts[user_id] = cart
-                return f"🗑️ Removed {product.title()} ({size.title()}) from your cart."
-
-    return "⚠️ Item not found in your cart."
-
-
-@function_tool
-def view_cart(context: RunContextWrapper[UserContext]) -> str:
-    """Views the items in the user's cart."""
-    user_id = context.context.user_id
-    cart = user_carts.get(user_id, [])
+    # Cart lines use the catalog's product key and size, so resolve names like "Running Shoes" or "M"
+    item = catalog.find(product)
+    variant = item.variant(size) if item else None
+    if item is not None:
+        product = item.key
+    if variant is not None:
+        size = variant.size
+        # The new quantity replaces the line's, so it alone has to be in stock
+        if variant.stock is not None and quantity > variant.stock:
+            return formatter.not_updated(item.name, size, _stock_problem(variant.stock))
+    if cart_store.set_quantity(user_id, product, size, quantity) is None:
+        return formatter.not_in_cart(product, size)
+    return formatter.quantity_set(product, size, quantity)
+
+
+def describe_cart(user_id: str) -> str:
+    """Lists the items in a user's cart, worded for the customer (the fast-path router's reply)."""
+    cart = cart_store.lines(user_id)
 
     if not cart:
         return "🛒 Your cart is empty."
 
     lines = ["🛒 Your cart contains:"]
     for item in cart:
-        lines.append(f"- {item['quantity']}x {item['product'].title()} ({item['size'].title()}) @ ${item['unit_price']:.2f} each")
-    print("check", lines)
+        lines.append(f"- {item.quantity}x {item.product.title()} ({item.size.title()}) @ {format_cents(item.unit_price_cents)} each")
     return "\n".join(lines)
 
+def describe_cart_total(user_id: str) -> str:
+    """Total price of a user's cart, worded for the customer (the fast-path router's reply)."""
+    return f"💵 Your current total is: {format_cents(cart_store.total_cents(user_id))}"
+
+@function_tool
+def view_cart(context: RunContextWrapper[UserContext]) -> str:
+    """Views the items in the user's cart."""
+    return formatter.cart(cart_store.lines(context.context.user_id))
+
 @function_tool
 def get_cart_total(context: RunContextWrapper[UserContext]) -> str:
     """Returns the total price of the items in the cart."""
-    user_id = context.context.user_id
-    cart = user_carts.get(user_id, [])
-    total = sum(item["unit_price"] * item["quantity"] for item in cart)
-    return f"💵 Your current total is: ${total:.2f}"
+    return formatter.total(cart_store.total_cents(context.context.user_id))
+
+@function_tool
+def view_cart_and_total(context: RunContextWrapper[UserContext]) -> str:
+    """Views the items in the user's cart together with the total price."""
+    lines = cart_store.lines(context.context.user_id)
+    return formatter.cart(lines, sum(line.line_total_cents for line in lines))
 
 @function_tool
 def generate_receipt(context: RunContextWrapper[UserContext]) -> str:
@@ -166,75 +251,45 @@ def generate_receipt(context: RunContextWrapper[UserContext]) -> str:
     Generate a purchase receipt with order ID, email it to the user, and save the order details.
     Clears the cart after checkout.
     """
-    import smtplib
-    from email.mime.text import MIMEText
-
     user_id = context.context.user_id
-    email = context.context.email
-    cart = user_carts.get(user_id, [])
+    email = (context.context.email or "").strip()
+    if not email:
+        # Checked before checkout, so the cart stays as it is until there is somewhere to send the receipt
+        return formatter.no_email()
+    # Take the cart and empty it in one step, so concurrent tool calls can't change it mid-checkout
+    cart, total_cents = cart_store.checkout(user_id)
 
     if not cart:
-        return "🛍️ Your cart is empty. Add something before checking out."
+        return formatter.empty_checkout()
+
+    # --- Build order items ---
+    total_price = total_cents / 100
+    order_items = [{
+        "product": item.product.title(),
+        "size": item.size.title(),
+        "quantity": item.quantity,
+        "unit_price": item.unit_price_cents / 100
+    } for item in cart]
 
-    # --- Generate Order ID ---
-    order_number = max([int(order_id[3:]) for order_id in sample_orders.keys()] + [1000]) + 1
-    order_id = f"ORD{order_number}"
+    # --- Save full order; the store allocates the order ID atomically ---
+    order_id = order_store.create(order_items, user_id=user_id, email=email)
 
     # --- Build receipt ---
-    total_price = 0.0
     receipt_lines = [f"🧾 EOcean Shoe Store - Receipt\nOrder ID: {order_id}\n"]
-    order_items = []
-
-    for i, item in enumerate(cart, 1):
-        qty = item.get("quantity", 1)
-        unit_price = item.get("unit_price", 0.0)
-        line_total = qty * unit_price
-        total_price += line_total
 
+    for i, item in enumerate(order_items, 1):
+        line_total = item["quantity"] * item["unit_price"]
         receipt_lines.append(
-            f"{i}. {qty}x {item['product'].title()} ({item['size'].title()}) - "
-            f"${unit_price:.2f} each = ${line_total:.2f}"
+            f"{i}. {item['quantity']}x {item['product']} ({item['size']}) - "
+            f"${item['unit_price']:.2f} each = ${line_total:.2f}"
         )
 
-        # Add item to order list
-        order_items.append({
-            "product": item["product"].title(),
-            "size": item["size"].title(),
-            "quantity": qty,
-            "unit_price": unit_price
-        })
-
     receipt_lines.append(f"\n💵 Total: ${total_price:.2f}")
     receipt_lines.append("\n✅ Thank you for shopping at EOcean Shoe Store!")
 
     receipt_text = "\n".join(receipt_lines)
 
-    # --- Save full order to sample_orders ---
-    sample_orders[order_id] = {
-        "items": order_items,
-        "status": "Processing"
-    }
+    # --- Queue the receipt email; the background worker sends it ---
+    email_worker.enqueue(email, f"🧾 Your Receipt - Order {order_id}", receipt_text)
 
-    # --- Email configuration (Ethereal) ---
-    smtp_server = "smtp.ethereal.email"
-    smtp_port = 587
-    ethereal_user = "rick.hirthe@ethereal.email"
-    ethereal_pass = "DBVpbKKH4R2WvB96pd"
-
-    msg = MIMEText(receipt_text)
-    msg["Subject"] = f"🧾 Your Receipt - Order {order_id}"
-    msg["From"] = ethereal_user
-    msg["To"] = email
-
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(ethereal_user, ethereal_pass)
-            server.sendmail(ethereal_user, [email], msg.as_string())
-    except Exception as e:
-        return f"❌ Failed to send receipt email: {str(e)}"
-
-    # Clear the cart
-    user_carts[user_id] = []
-
-    return f"📩 Receipt for Order {order_id} sent to {email}! Total price {total_price}"
\ No newline at end of file
+    return formatter.checked_out(order_id, email, total_cents)
\ No newline at end of file
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional
+
+from agents.voice import STTModel, TTSModel, TTSModelSettings, VoiceModelProvider
+
+# Cached audio is replayed in chunks of this many bytes (100ms of 24kHz int16 PCM)
+REPLAY_CHUNK_BYTES = 4800
+
+
+class TTSCache:
+    """
+    Synthesized speech (raw PCM) keyed by the TTS model, text, voice, instructions and speed.
+
+    Entries live in an in-memory LRU bounded by `max_bytes`. With a `directory` they are
+    also written to disk, so recurring phrases ("Your cart is empty.") survive restarts and
+    are shared by every worker on the host. Only texts up to `max_text_chars` are stored:
+    long answers rarely repeat word for word.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 2**20, directory: Optional[str] = None, max_text_chars: int = 200):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_text_chars = max_text_chars
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.stored = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text.strip()) <= self.max_text_chars
+
+    @staticmethod
+    def key(model_name: str, text: str, settings: TTSModelSettings) -> str:
+        raw = json.dumps([model_name, text.strip(), settings.voice, settings.instructions, settings.speed])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def _remember(self, key: str, audio: bytes):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = audio
+            self._size += len(audio)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        self.lookups += 1
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+        if audio is None and self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                return None
+            self.disk_hits += 1
+            self._remember(key, audio)
+        if audio is not None:
+            self.bytes_served += len(audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+        self._remember(key, audio)
+        self.stored += 1
+        if self.directory:
+            # Write then rename, so another worker never reads a half-written entry
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, self._path(key))
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "lookups": self.lookups,
+            "hits": hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "stored": self.stored,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "memory_bytes": self._size,
+            "audio_seconds_served": self.bytes_served / 48000,  # 24kHz int16 mono
+            "directory": self.directory,
+        }
+
+
+class CachedTTSModel(TTSModel):
+    """Serves cached phrases without a TTS call; anything else streams through and is stored once complete."""
+
+    def __init__(self, model: TTSModel, cache: TTSCache):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def model_name(self) -> str:
+        return self.model.model_name
+
+    async def run(self, text: str, settings: TTSModelSettings) -> AsyncIterator[bytes]:
+        if not self.cache.cacheable(text):
+            async for chunk in self.model.run(text, settings):
+                yield chunk
+            return
+
+        key = self.cache.key(self.model_name, text, settings)
+        audio = self.cache.get(key)
+        if audio is not None:
+            for offset in range(0, len(audio), REPLAY_CHUNK_BYTES):
+                yield audio[offset:offset + REPLAY_CHUNK_BYTES]
+            return
+
+        chunks = []
+        async for chunk in self.model.run(text, settings):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached when synthesis finished: an interrupted phrase is never stored
+        self.cache.put(key, b"".join(chunks))
+
+
+class CachedVoiceModelProvider(VoiceModelProvider):
+    def __init__(self, provider: VoiceModelProvider, cache: TTSCache):
+        self.provider = provider
+        self.cache = cache
+        self._tts_models: Dict[Optional[str], CachedTTSModel] = {}
+
+    def get_stt_model(self, model_name: Optional[str]) -> STTModel:
+        return self.provider.get_stt_model(model_name)
+
+    def get_tts_model(self, model_name: Optional[str]) -> TTSModel:
+        if model_name not in self._tts_models:
+            self._tts_models[model_name] = CachedTTSModel(self.provider.get_tts_model(model_name), self.cache)
+        return self._tts_models[model_name]
+
+
+def tts_cache_from_env() -> Optional[TTSCache]:
+    """
+    TTS_CACHE=memory (default) keeps synthesized phrases in the worker, TTS_CACHE=disk also
+    stores them in TTS_CACHE_DIR, TTS_CACHE=off disables caching. TTS_CACHE_MAX_MB bounds the
+    in-memory part.
+    """
+    kind = os.getenv("TTS_CACHE", "memory").lower()
+    if kind in ("off", "false", "0", "none"):
+        return None
+    if kind not in ("memory", "disk"):
+        raise ValueError(f"Unknown TTS_CACHE: {kind}")
+    return TTSCache(
+        max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "32")) * 2**20),
+        directory=os.getenv("TTS_CACHE_DIR", ".tts_cache") if kind == "disk" else None,
+        max_text_chars=int(os.getenv("TTS_CACHE_MAX_CHARS", "200")),
+    )
@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Optional
+
+from agents import Agent
+from agents.voice import OpenAIVoiceModelProvider, SingleAgentVoiceWorkflow, TTSModelSettings, VoicePipeline, VoicePipelineConfig
+
+from .context import UserContext
+from .tts_cache import CachedVoiceModelProvider, TTSCache, tts_cache_from_env
+
+# Imported on first voice use only: this pulls in numpy and the agents.voice stack,
+# which text-only workers never need.
+
+
+@lru_cache(maxsize=None)
+def shoe_store_tts_settings() -> TTSModelSettings:
+    return TTSModelSettings(
+        voice="echo",
+        instructions=(
+            "Personality: friendly, helpful shoe store assistant.\\n"
+            "Tone: Warm, professional, and conversational, making customers feel welcome.\\n"
+            "Pronunciation: Clear and articulate, ensuring product names and prices are easily understood.\\n"
+            "Tempo: Natural conversational pace with brief pauses for clarity.\\n"
+            "Emotion: Enthusiastic about helping customers find the perfect shoes."
+        )
+    )
+
+
+@lru_cache(maxsize=None)
+def shoe_store_tts_cache() -> Optional[TTSCache]:
+    """The process-wide TTS cache configured by TTS_CACHE, shared by every voice pipeline."""
+    return tts_cache_from_env()
+
+
+def shoe_store_voice_config() -> VoicePipelineConfig:
+    cache = shoe_store_tts_cache()
+    if cache is None:
+        return VoicePipelineConfig(tts_settings=shoe_store_tts_settings())
+    return VoicePipelineConfig(model_provider=CachedVoiceModelProvider(OpenAIVoiceModelProvider(), cache),
+                               tts_settings=shoe_store_tts_settings())
+
+
+def build_voice_pipeline(agent: Agent[UserContext], config: VoicePipelineConfig = None) -> VoicePipeline:
+    """A single-agent voice pipeline (speech to text, the agent, text to speech) around `agent`."""
+    return VoicePipeline(workflow=SingleAgentVoiceWorkflow(agent), config=config or shoe_store_voice_config())